@@ -20,3 +20,4 @@ from modulos.medicos import calcular_medicos_por_mil
 from modulos.partos_cesareos import calcular_prop_partos_cesareos_multiplos_uf_anos
 from modulos.causas_mal_definidas import calcular_causas_mal_definidas
 from modulos.internacoes_cronicas import calcular_internacoes_cronicas_por_10mil
+from modulos.notificacoes_sinan import calcular_taxa_notificacao_sinan
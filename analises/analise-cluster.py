@@ -3,27 +3,23 @@ import pandas as pd
 import geopandas as gpd
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from scipy.spatial.distance import euclidean
 import os
 import numpy as np
 from pathlib import Path
+import sys
 
-def classificar_perfis_por_similaridade(perfil_df, arquétipos):
-    """
-    Classifica cada cluster encontrado medindo sua distância euclidiana
-    para um conjunto de arquétipos pré-definidos.
-    """
-    mapeamento = {}
-    for i, row in perfil_df.iterrows():
-        distancias = {
-            nome: euclidean(row.values, perfil)
-            for nome, perfil in arquétipos.items()
-        }
-        perfil_mais_proximo = min(distancias, key=distancias.get)
-        mapeamento[i] = perfil_mais_proximo
-    return mapeamento
+# permite importar utils/ ao rodar o script diretamente (python analises/analise-cluster.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from utils.geometrias import obter_geometrias
+from utils.municipios import codigo_6
+from analises.arquetipos import ARQUETIPOS, CORES_PERFIS, INDICADORES, atribuir_municipios, classificar_clusters
+from analises.kmeans_online import DECAIMENTO_PADRAO, ajustar_online
+from analises.modelo import DIRETORIO_PADRAO as MODELO_PADRAO, LIMIAR_DERIVA, ModeloPerfis
+from analises.clusterizacao import (
+    BACKEND_PADRAO, BACKENDS, KS_PADRAO, METODOS_K, SEMENTE_PADRAO, ajustar_grupos, relatorio_ajustes,
+    relatorio_selecao_k
+)
+from utils.painel import DIRETORIO_PADRAO as PAINEL_PADRAO, ler_painel
 
 def gerar_mapa_perfis_de_saude(
     shapefile_path: str,
@@ -47,14 +43,13 @@ def gerar_mapa_perfis_de_saude(
     import matplotlib.pyplot as plt
     import matplotlib.patches as mpatches
 
-    gdf_mun = gpd.read_file(shapefile_path)
-    gdf_uf = gdf_mun[gdf_mun["SIGLA_UF"] == uf_sigla].copy()
-    gdf_uf["CD_MUN"] = gdf_uf["CD_MUN"].astype(str).str[:6]
+    # geometrias da UF lidas do GeoParquet convertido a partir do shapefile
+    gdf_uf = obter_geometrias(uf_sigla, shapefile_path)
 
     df_mapa = df_analise[['cod_mun_ibge_6', 'cor', 'perfil']].copy()
-    df_mapa['cod_mun_ibge_6'] = df_mapa['cod_mun_ibge_6'].astype(str)
+    df_mapa['cod_mun_ibge_6'] = codigo_6(df_mapa['cod_mun_ibge_6'])
 
-    gdf_final = gdf_uf.merge(df_mapa, left_on='CD_MUN', right_on='cod_mun_ibge_6')
+    gdf_final = gdf_uf.merge(df_mapa, left_index=True, right_on='cod_mun_ibge_6')
 
     fig, ax = plt.subplots(1, 1, figsize=(12, 10))
     gdf_final.plot(color=gdf_final['cor'], linewidth=0.5, edgecolor="black", ax=ax)
@@ -65,88 +60,206 @@ def gerar_mapa_perfis_de_saude(
 
     ax.set_title(f'Mapa de Perfis de Saúde - {uf_sigla} {ano}', fontsize=16)
     ax.axis("off")
-    plt.tight_layout()
+    fig.tight_layout()
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    plt.savefig(output_path, dpi=300)
-    plt.close()
+    fig.savefig(output_path, dpi=300)
+    plt.close(fig)
     print(f"✔️ Mapa de Perfis para {uf_sigla}/{ano} salvo.")
 
 
-def analisar_clusters_com_arquétipos(df_painel):
+def analisar_clusters_com_arquétipos(df_painel, backend=BACKEND_PADRAO, n_inicios=10, semente=SEMENTE_PADRAO,
+                                     workers=1, k=None, ks=KS_PADRAO, metodo_k="silhueta", um_para_um=False,
+                                     atribuicao="cluster", modelo_dir=None, pontuar=False,
+                                     limiar_deriva=LIMIAR_DERIVA, online=False, decaimento=DECAIMENTO_PADRAO):
     """
     Executa a análise de cluster e classifica os clusters por similaridade a arquétipos definidos.
+
+    Parâmetros:
+    - df_painel (DataFrame): painel integrado (com 'MES', os grupos são UF/ano/mês)
+    - backend (str): 'kmeans++', 'kmeans', 'minibatch' ou 'semeadura' (ver analises/clusterizacao.py)
+    - n_inicios (int): número de reinícios de cada ajuste
+    - semente (int): semente global; cada UF/ano deriva a sua
+    - workers (int): processos usados nos ajustes (0 = todos os núcleos)
+    - k (int ou None): número de clusters fixo; None escolhe o K de cada UF/ano
+    - ks (iterable): valores de K testados na escolha automática
+    - metodo_k (str): critério da escolha: 'silhueta', 'cotovelo' ou 'gap'
+    - um_para_um (bool): atribui os perfis aos clusters sem repetição (algoritmo húngaro)
+    - atribuicao (str): 'cluster' (o município herda o perfil do seu cluster) ou
+      'municipio' (cada município vai direto para o arquétipo mais próximo)
+    - modelo_dir (str ou None): onde o modelo de perfis é salvo após os ajustes (None = não salva)
+    - pontuar (bool): pontua as UFs com o modelo salvo em vez de reajustá-las;
+      só as UFs cuja deriva passa de `limiar_deriva` são reajustadas
+    - limiar_deriva (float): razão máxima entre a inércia por município nos
+      dados novos e no treino (ver analises/modelo.py)
+    - online (bool): em vez de um ajuste por UF/período, atualiza os centroides de
+      cada UF período a período (k-means online, ver analises/kmeans_online.py)
+    - decaimento (float): peso dos períodos anteriores a cada período novo no modo online
     """
     output_dir = "resultados_analise_cluster"
     os.makedirs(output_dir, exist_ok=True)
 
-    cores_perfis = {
-        "Vulnerabilidade Crítica": "#d73027", "Sobrecarga Crônica": "#fc8d59",
-        "Desafio na Cobertura da APS": "#4575b4", "Eficiência na APS": "#1a9850"
-    }
+    cores_perfis = CORES_PERFIS
+    indicadores = INDICADORES
 
-    indicadores = ['TMI', 'COBERTURA_PRENATAL', 'TAXA_MEDICOS', 'PROP_CESAREOS', 'PROP_MAL_DEFINIDAS', 'DOENCAS_CRONICAS']
-
-    # --- PASSO 1: DEFINIR OS ARQUÉTIPOS DE REFERÊNCIA ---
-    arquétipos = {
-        "Vulnerabilidade Crítica": np.array([2.0, -0.5, 0.0, 0.5, 1.0, 0.5]),
-        "Sobrecarga Crônica":    np.array([-0.5, 0.0, 0.0, 0.0, 0.0, 2.0]),
-        "Eficiência na APS":       np.array([-0.5, 1.0, 0.5, -0.5, -0.5, -0.5]),
-        "Desafio na Cobertura da APS":  np.array([0.0, -1.0, -0.5, 0.0, 0.0, 0.0])
-    }
+    # --- PASSO 1: ARQUÉTIPOS DE REFERÊNCIA (analises/arquetipos.py) ---
+    arquétipos = ARQUETIPOS
     print("Arquétipos de saúde definidos.")
 
-    # --- PASSO 2: LOOP DE ANÁLISE E CLASSIFICAÇÃO ---
-    combinacoes = df_painel[['UF', 'ANO']].drop_duplicates()
-    for index, row in combinacoes.iterrows():
-        uf_sigla, ano = row['UF'], row['ANO']
+    # --- PASSO 2: PONTUAÇÃO COM O MODELO SALVO (UFs SEM DERIVA) ---
+    chaves = ['UF', 'ANO', 'MES'] if 'MES' in df_painel.columns else ['UF', 'ANO']
+    classificados = []  # (grupo, df_analise)
+    df_ajuste = df_painel
+    modelo = None
+    if modelo_dir is not None and pontuar:
+        try:
+            modelo = ModeloPerfis.carregar(modelo_dir)
+        except FileNotFoundError:
+            print(f"⚠️ Nenhum modelo salvo em '{modelo_dir}'; todos os grupos serão ajustados")
+    if modelo is not None:
+        deriva = modelo.deriva(df_painel, limiar=limiar_deriva)
+        deriva.to_csv(Path(output_dir) / "deriva.csv", sep=';')
+        estaveis = deriva.index[~deriva['reajustar']]
+        pontuados = modelo.predizer(df_painel[df_painel['UF'].isin(estaveis)], atribuicao=atribuicao)
+        for grupo, parte in pontuados.groupby(chaves, observed=True, sort=True):
+            classificados.append((grupo, parte))
+        df_ajuste = df_painel[~df_painel['UF'].isin(estaveis)]
+        print(f"🔁 Pontuadas com o modelo salvo (sem reajuste): {list(estaveis)}; "
+              f"reajustadas por deriva > {limiar_deriva}: {list(deriva.index[deriva['reajustar']])}")
 
-        print(f"\n====================================================")
-        print(f"📊 PROCESSANDO E CLASSIFICANDO: {uf_sigla} - {ano}")
-        print(f"====================================================")
+    # --- PASSO 3: AJUSTES DOS DEMAIS GRUPOS (EM PARALELO) ---
+    if not df_ajuste.empty:
+        if online:
+            if k is None:
+                print("⚠️ O modo online usa K fixo; usando K = 4 (altere com --k)")
+                k = 4
+            backend = 'online'
+            ajustes = ajustar_online(df_ajuste, indicadores, k=k, chaves_tempo=chaves[1:],
+                                     decaimento=decaimento, semente=semente)
+        else:
+            # com k=None o K de cada grupo é escolhido na mesma tarefa paralela que o ajusta
+            ajustes = ajustar_grupos(
+                df_ajuste, indicadores, k=k, chaves=chaves, backend=backend,
+                n_inicios=n_inicios, semente=semente, workers=workers,
+                selecao={'ks': ks, 'metodo': metodo_k}
+            )
+        relatorio = relatorio_ajustes(ajustes, chaves)
+        relatorio.to_csv(Path(output_dir) / "ajustes.csv", sep=';', index=False)
+        print(f"⏱️ {len(ajustes)} ajuste(s) ({backend}); soma dos tempos de ajuste: {relatorio['tempo_s'].sum():.2f} s")
+        if k is None:
+            selecao = relatorio_selecao_k(ajustes, chaves)
+            selecao.to_csv(Path(output_dir) / "selecao_k.csv", sep=';', index=False)
+            print(f"📋 K escolhido por '{metodo_k}' (diagnóstico em selecao_k.csv): "
+                  f"{relatorio['k'].value_counts().sort_index().to_dict()}")
 
-        df_analise = df_painel[(df_painel['UF'] == uf_sigla) & (df_painel['ANO'] == ano)].copy()
-        if df_analise.empty: continue
+        mapeamentos = {}
+        for grupo, ajuste in ajustes.items():
+            df_analise = df_ajuste.iloc[ajuste['posicoes']].copy()
+            mapeamento_nomes = classificar_clusters(ajuste['centroides'], arquétipos, um_para_um=um_para_um)
+            mapeamentos[grupo] = mapeamento_nomes
 
-        scaler = StandardScaler()
-        dados_escalados = scaler.fit_transform(df_analise[indicadores])
+            df_analise['cluster_num'] = ajuste['rotulos']
+            if atribuicao == 'municipio':
+                X = ajuste['scaler'].transform(df_analise[indicadores].to_numpy(dtype=float))
+                df_analise['perfil'], df_analise['distancia_perfil'] = atribuir_municipios(X, arquétipos)
+            else:
+                df_analise['perfil'] = df_analise['cluster_num'].map(mapeamento_nomes)
+            print(f" -> {'/'.join(map(str, grupo))}: K = {ajuste['k']}; inércia: {ajuste['inercia']:.2f} "
+                  f"({ajuste['tempo_s']:.3f} s); mapeamento: {mapeamento_nomes}")
+            classificados.append((grupo, df_analise))
 
-        K_OTIMO = 4
-        kmeans = KMeans(n_clusters=K_OTIMO, random_state=42, n_init=10).fit(dados_escalados)
+        if modelo_dir is not None and ajustes:
+            novo = ModeloPerfis.de_ajustes(
+                ajustes, mapeamentos, indicadores, chaves,
+                metadados={'backend': backend, 'n_inicios': n_inicios, 'semente': semente,
+                           'um_para_um': um_para_um, 'atribuicao': atribuicao}
+            )
+            if modelo is not None:
+                modelo.atualizar(novo)
+            else:
+                modelo = novo
+            modelo.salvar(modelo_dir)
+            print(f"💾 Modelo de perfis salvo em '{modelo_dir}' ({len(modelo.ufs)} UF(s))")
 
-        perfil_clusters_encontrados = pd.DataFrame(kmeans.cluster_centers_, columns=indicadores)
-        mapeamento_nomes = classificar_perfis_por_similaridade(perfil_clusters_encontrados, arquétipos)
+    # --- PASSO 4: MAPAS ---
+    for grupo, df_analise in classificados:
+        uf_sigla, ano = grupo[0], grupo[1]
+        periodo = f"{ano}/{grupo[2]:02d}" if len(grupo) > 2 and grupo[2] else f"{ano}"
 
-        df_analise['cluster_num'] = kmeans.labels_
-        df_analise['perfil'] = df_analise['cluster_num'].map(mapeamento_nomes)
+        print(f"\n====================================================")
+        print(f"📊 PERFIS DE SAÚDE: {uf_sigla} - {periodo}")
+        print(f"====================================================")
         df_analise['cor'] = df_analise['perfil'].map(cores_perfis)
-        print(f" -> Mapeamento para {uf_sigla}/{ano}: {mapeamento_nomes}")
 
-        # --- Visualização: Mapa de Perfis ---
         try:
             BASE_DIR = Path(__file__).resolve().parent.parent  # sobe 2 níveis (ajuste se precisar)
             shapefile_path = BASE_DIR / "shapefiles" / "BR_Municipios_2022.shp"
-            output_file = Path(output_dir) / f"mapa_perfis_{uf_sigla.lower()}_{ano}.png"
+            output_file = Path(output_dir) / f"mapa_perfis_{uf_sigla.lower()}_{periodo.replace('/', '_')}.png"
 
             gerar_mapa_perfis_de_saude(
                 shapefile_path=str(shapefile_path),
                 df_analise=df_analise,
                 uf_sigla=uf_sigla,
-                ano=ano,
+                ano=periodo,
                 cores_perfis=cores_perfis,
                 output_path=str(output_file)
             )
         except Exception as e:
-            print(f"⚠️ Erro ao gerar o mapa para {uf_sigla}/{ano}: {e}")
+            print(f"⚠️ Erro ao gerar o mapa para {uf_sigla}/{periodo}: {e}")
 
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Análise de cluster dos indicadores integrados.")
+    parser.add_argument("--painel", type=str, default=str(PAINEL_PADRAO),
+                        help="Diretório do painel em Parquet (ou o CSV antigo indicadores_integrados.csv)")
+    parser.add_argument("--ufs", nargs="+", default=None, help="UFs a analisar (padrão: todas do painel)")
+    parser.add_argument("--anos", nargs="+", type=int, default=None, help="Anos a analisar (padrão: todos do painel)")
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND_PADRAO, help="Algoritmo de clusterização")
+    parser.add_argument("--n-inicios", type=int, default=10, help="Número de reinícios de cada ajuste")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO, help="Semente global dos ajustes")
+    parser.add_argument("--k", type=int, default=None,
+                        help="Número de clusters fixo (padrão: escolhido por UF/ano)")
+    parser.add_argument("--ks", nargs=2, type=int, default=[KS_PADRAO[0], KS_PADRAO[-1]], metavar=("MIN", "MAX"),
+                        help="Faixa de K testada na escolha automática")
+    parser.add_argument("--metodo-k", choices=METODOS_K, default="silhueta", help="Critério da escolha de K")
+    parser.add_argument("--um-para-um", action="store_true",
+                        help="Não repete perfis entre os clusters (atribuição pelo algoritmo húngaro)")
+    parser.add_argument("--atribuicao", choices=["cluster", "municipio"], default="cluster",
+                        help="Perfil pelo cluster do município ou direto pelo arquétipo mais próximo")
+    parser.add_argument("--modelo", type=str, default=str(MODELO_PADRAO),
+                        help="Diretório do modelo de perfis salvo após os ajustes")
+    parser.add_argument("--pontuar", action="store_true",
+                        help="Pontua com o modelo salvo; reajusta só as UFs com deriva acima do limiar")
+    parser.add_argument("--limiar-deriva", type=float, default=LIMIAR_DERIVA,
+                        help="Razão máxima entre a inércia por município nos dados novos e no treino")
+    parser.add_argument("--online", action="store_true",
+                        help="K-means online: centroides de cada UF atualizados período a período")
+    parser.add_argument("--decaimento", type=float, default=DECAIMENTO_PADRAO,
+                        help="Peso dos períodos anteriores a cada período novo no modo online")
+    parser.add_argument("--workers", type=int, default=1, help="Número de processos em paralelo (0 = todos os núcleos)")
+    args = parser.parse_args()
+
     BASE_DIR = Path(__file__).resolve().parent.parent  # sobe 2 níveis (ajuste se precisar)
-    arquivo_painel = BASE_DIR / "indicadores_integrados.csv"
+    arquivo_painel = Path(args.painel)
+    if not arquivo_painel.exists() and (BASE_DIR / "indicadores_integrados.csv").exists():
+        # painel gerado antes do armazenamento em Parquet
+        arquivo_painel = BASE_DIR / "indicadores_integrados.csv"
 
     try:
-        df_painel_completo = pd.read_csv(str(arquivo_painel), sep=';')
-        analisar_clusters_com_arquétipos(df_painel_completo)
+        if not arquivo_painel.exists():
+            raise FileNotFoundError(arquivo_painel)
+        # só as partições das UFs/anos pedidos são lidas
+        df_painel_completo = ler_painel(arquivo_painel, ufs=args.ufs, anos=args.anos)
+        analisar_clusters_com_arquétipos(
+            df_painel_completo, backend=args.backend, n_inicios=args.n_inicios,
+            semente=args.semente, workers=args.workers, k=args.k,
+            ks=range(args.ks[0], args.ks[1] + 1), metodo_k=args.metodo_k,
+            um_para_um=args.um_para_um, atribuicao=args.atribuicao,
+            modelo_dir=args.modelo, pontuar=args.pontuar, limiar_deriva=args.limiar_deriva,
+            online=args.online, decaimento=args.decaimento
+        )
         print("\n✅ Análise de cluster concluída para todas as combinações de UF/Ano.")
     except FileNotFoundError:
         print(f"❌ ERRO: Arquivo de painel '{arquivo_painel}' não encontrado.")
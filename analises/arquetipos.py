@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Arquétipos de saúde e classificação vetorizada por similaridade.
+
+Os clusters (ou os próprios municípios) são comparados aos arquétipos pela
+matriz completa de distâncias euclidianas (`cdist`), em uma única operação.
+Na classificação dos clusters, a atribuição pode ser um-para-um (algoritmo
+húngaro, `linear_sum_assignment`), para que dois clusters não recebam o mesmo
+perfil.
+"""
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial.distance import cdist
+
+INDICADORES = ['TMI', 'COBERTURA_PRENATAL', 'TAXA_MEDICOS', 'PROP_CESAREOS', 'PROP_MAL_DEFINIDAS', 'DOENCAS_CRONICAS']
+
+# perfis de referência no espaço padronizado dos INDICADORES (z-scores)
+ARQUETIPOS = {
+    "Vulnerabilidade Crítica": np.array([2.0, -0.5, 0.0, 0.5, 1.0, 0.5]),
+    "Sobrecarga Crônica": np.array([-0.5, 0.0, 0.0, 0.0, 0.0, 2.0]),
+    "Eficiência na APS": np.array([-0.5, 1.0, 0.5, -0.5, -0.5, -0.5]),
+    "Desafio na Cobertura da APS": np.array([0.0, -1.0, -0.5, 0.0, 0.0, 0.0]),
+}
+
+CORES_PERFIS = {
+    "Vulnerabilidade Crítica": "#d73027", "Sobrecarga Crônica": "#fc8d59",
+    "Desafio na Cobertura da APS": "#4575b4", "Eficiência na APS": "#1a9850",
+}
+
+
+def _matriz_arquetipos(arquetipos):
+    nomes = list(arquetipos)
+    return nomes, np.vstack([np.asarray(arquetipos[n], dtype=float) for n in nomes])
+
+
+def distancias_arquetipos(pontos, arquetipos=ARQUETIPOS):
+    """
+    Matriz de distâncias euclidianas pontos × arquétipos.
+
+    Parâmetros:
+    - pontos (array n × p): centroides ou municípios, já padronizados
+    - arquetipos (dict): nome -> vetor de p valores
+
+    Retorna:
+    - (lista de nomes dos arquétipos, array n × n_arquetipos)
+    """
+    nomes, matriz = _matriz_arquetipos(arquetipos)
+    return nomes, cdist(np.asarray(pontos, dtype=float), matriz)
+
+
+def classificar_clusters(centroides, arquetipos=ARQUETIPOS, um_para_um=False):
+    """
+    Dá a cada cluster o nome do arquétipo mais próximo do seu centroide.
+
+    Parâmetros:
+    - centroides (array k × p): centroides padronizados
+    - arquetipos (dict): nome -> vetor de p valores
+    - um_para_um (bool): se True, resolve a atribuição pelo algoritmo húngaro
+      (soma mínima das distâncias, sem perfis repetidos); com mais clusters do
+      que arquétipos, os clusters que sobram recebem o arquétipo mais próximo
+
+    Retorna:
+    - dict número do cluster -> nome do perfil
+    """
+    nomes, distancias = distancias_arquetipos(centroides, arquetipos)
+    escolhas = distancias.argmin(axis=1)
+    if um_para_um:
+        linhas, colunas = linear_sum_assignment(distancias)
+        escolhas[linhas] = colunas
+    return {i: nomes[j] for i, j in enumerate(escolhas)}
+
+
+def atribuir_municipios(X, arquetipos=ARQUETIPOS):
+    """
+    Atribui cada município (linha de X, padronizada) ao arquétipo mais próximo, em lote.
+
+    Retorna:
+    - (array de nomes dos perfis, array das distâncias ao perfil escolhido)
+    """
+    nomes, distancias = distancias_arquetipos(X, arquetipos)
+    escolhas = distancias.argmin(axis=1)
+    return np.asarray(nomes, dtype=object)[escolhas], distancias[np.arange(len(escolhas)), escolhas]
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de clusterização da análise de perfis de saúde.
+
+Cada grupo do painel (UF/ano, ou UF/ano/mês nos painéis mensais) é padronizado
+e agrupado por um dos backends:
+- 'kmeans++': KMeans completo (Lloyd) com semeadura k-means++ e `n_inicios`
+  reinícios (o padrão; o KMeans do scikit-learn)
+- 'kmeans': KMeans completo (Lloyd) com centros iniciais sorteados entre os pontos
+- 'minibatch': MiniBatchKMeans, para grupos grandes (ex: o país inteiro)
+- 'semeadura': apenas a semeadura k-means++, com `n_inicios` sorteios e o de
+  menor inércia escolhido (sem iterações de Lloyd; o mais barato)
+
+O número de clusters pode ser fixo ou escolhido por grupo (`selecionar_k`),
+pelo cotovelo da inércia, pela silhueta (calculada em uma amostra nos grupos
+grandes, para não custar O(n²)) ou pela estatística gap.
+
+Os grupos são ajustados em paralelo em um pool de processos. A semente de
+cada grupo vem de um `SeedSequence` derivado da semente global e da chave do
+grupo, de modo que o resultado de um grupo não depende da ordem de execução,
+do número de processos nem dos demais grupos do painel. Cada ajuste registra
+o tempo e a inércia.
+"""
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import cdist
+from sklearn.cluster import KMeans, MiniBatchKMeans, kmeans_plusplus
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+from utils.municipios import CODIGOS_UF
+from utils.paralelo import _contexto_processos
+
+BACKENDS = ("kmeans++", "kmeans", "minibatch", "semeadura")
+BACKEND_PADRAO = "kmeans++"
+METODOS_K = ("silhueta", "cotovelo", "gap")
+KS_PADRAO = tuple(range(2, 9))
+AMOSTRA_SILHUETA = 2000
+REFERENCIAS_GAP = 5
+SEMENTE_PADRAO = 42
+TAMANHO_LOTE_PADRAO = 1024
+
+
+def semente_grupo(semente, grupo):
+    """
+    SeedSequence de um grupo, derivada da semente global e da chave do grupo.
+
+    Parâmetros:
+    - semente (int): semente global da análise
+    - grupo (tuple): chave do grupo, ex: ('TO', 2022) ou ('TO', 2022, 3)
+
+    Retorna:
+    - np.random.SeedSequence
+    """
+    chave = []
+    for parte in grupo:
+        if isinstance(parte, str):
+            chave.append(CODIGOS_UF.get(parte, zlib.crc32(parte.encode())))
+        else:
+            chave.append(int(parte))
+    return np.random.SeedSequence(semente, spawn_key=tuple(chave))
+
+
+def _estado_aleatorio(sequencia):
+    """Inteiro de 32 bits para o `random_state` do scikit-learn."""
+    return int(sequencia.generate_state(1)[0])
+
+
+def _semeadura(X, k, n_inicios, sequencia):
+    melhor = None
+    for filha in sequencia.spawn(n_inicios):
+        centroides, _ = kmeans_plusplus(X, k, random_state=_estado_aleatorio(filha))
+        distancias = cdist(X, centroides, "sqeuclidean")
+        rotulos = distancias.argmin(axis=1)
+        inercia = float(distancias[np.arange(len(X)), rotulos].sum())
+        if melhor is None or inercia < melhor[2]:
+            melhor = (centroides, rotulos, inercia)
+    return melhor[0], melhor[1], melhor[2], 0
+
+
+def ajustar_kmeans(X, k, backend=BACKEND_PADRAO, n_inicios=10, semente=SEMENTE_PADRAO,
+                   tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Ajusta um backend de k-means a uma matriz já padronizada.
+
+    Parâmetros:
+    - X (array n × p): dados padronizados
+    - k (int): número de clusters
+    - backend (str): 'kmeans++', 'kmeans', 'minibatch' ou 'semeadura'
+    - n_inicios (int): número de reinícios (fica o de menor inércia)
+    - semente (int ou SeedSequence): semente do ajuste
+    - tamanho_lote (int): tamanho do lote do MiniBatchKMeans
+
+    Retorna:
+    - dict com 'backend', 'k', 'centroides', 'rotulos', 'inercia', 'n_iter' e 'tempo_s'
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {backend} (use {', '.join(BACKENDS)})")
+    sequencia = semente if isinstance(semente, np.random.SeedSequence) else np.random.SeedSequence(semente)
+
+    inicio = time.perf_counter()
+    if backend == "semeadura":
+        centroides, rotulos, inercia, n_iter = _semeadura(X, k, n_inicios, sequencia)
+    else:
+        if backend in ("kmeans++", "kmeans"):
+            modelo = KMeans(
+                n_clusters=k, init="k-means++" if backend == "kmeans++" else "random", n_init=n_inicios,
+                random_state=_estado_aleatorio(sequencia)
+            )
+        else:
+            modelo = MiniBatchKMeans(
+                n_clusters=k, n_init=n_inicios, batch_size=tamanho_lote, random_state=_estado_aleatorio(sequencia)
+            )
+        modelo.fit(X)
+        centroides, rotulos = modelo.cluster_centers_, modelo.labels_
+        inercia, n_iter = float(modelo.inertia_), int(modelo.n_iter_)
+
+    return {
+        "backend": backend,
+        "k": k,
+        "centroides": centroides,
+        "rotulos": rotulos,
+        "inercia": inercia,
+        "n_iter": n_iter,
+        "tempo_s": time.perf_counter() - inicio,
+    }
+
+
+def _cotovelo(ks, inercias):
+    """K no "joelho" da curva de inércia: o ponto mais distante da reta entre as pontas."""
+    ks = np.asarray(ks, dtype=float)
+    inercias = np.asarray(inercias, dtype=float)
+    if len(ks) < 3 or inercias[0] == inercias[-1]:
+        return int(ks[0])
+    x = (ks - ks[0]) / (ks[-1] - ks[0])
+    y = (inercias - inercias[-1]) / (inercias[0] - inercias[-1])
+    return int(ks[np.argmax((1 - x) - y)])
+
+
+def selecionar_k(X, ks=KS_PADRAO, metodo="silhueta", backend=BACKEND_PADRAO, n_inicios=10, semente=SEMENTE_PADRAO,
+                 tamanho_lote=TAMANHO_LOTE_PADRAO, amostra_silhueta=AMOSTRA_SILHUETA,
+                 referencias_gap=None):
+    """
+    Escolhe o número de clusters de uma matriz padronizada.
+
+    Para cada K são calculados a inércia (cotovelo) e a silhueta média (em uma
+    amostra de até `amostra_silhueta` linhas). A estatística gap (Tibshirani et
+    al., com `referencias_gap` conjuntos uniformes na caixa dos dados) custa
+    `referencias_gap` ajustes extras por K e só é calculada com metodo='gap' ou
+    quando `referencias_gap` é pedido explicitamente; senão as colunas do gap
+    ficam NaN.
+
+    Parâmetros:
+    - X (array n × p): dados padronizados
+    - ks (iterable): valores de K testados (os inviáveis para n linhas são descartados)
+    - metodo (str): critério de escolha: 'silhueta', 'cotovelo' ou 'gap'
+    - backend, n_inicios, semente, tamanho_lote: ver `ajustar_kmeans`
+    - amostra_silhueta (int): tamanho máximo da amostra da silhueta
+    - referencias_gap (int ou None): número de conjuntos de referência do gap;
+      None = REFERENCIAS_GAP com metodo='gap' e nenhum (sem gap) nos demais métodos
+
+    Retorna:
+    - (k escolhido, DataFrame de diagnóstico por K, dict K -> ajuste)
+    """
+    if metodo not in METODOS_K:
+        raise ValueError(f"Método desconhecido: {metodo} (use {', '.join(METODOS_K)})")
+    if referencias_gap is None:
+        referencias_gap = REFERENCIAS_GAP if metodo == "gap" else 0
+    if metodo == "gap" and referencias_gap < 1:
+        raise ValueError("O método 'gap' precisa de referencias_gap >= 1")
+    ks = [int(k) for k in ks if 2 <= int(k) < len(X)]
+    if not ks:
+        raise ValueError(f"Nenhum K viável para {len(X)} linha(s)")
+
+    sequencia = semente if isinstance(semente, np.random.SeedSequence) else np.random.SeedSequence(semente)
+    sementes_k = sequencia.spawn(len(ks))
+    rng = np.random.default_rng(sequencia.spawn(1)[0])
+    minimos, maximos = X.min(axis=0), X.max(axis=0)
+    referencias = [rng.uniform(minimos, maximos, size=X.shape) for _ in range(referencias_gap)]
+    amostra = min(amostra_silhueta, len(X))
+
+    ajustes, linhas = {}, []
+    for k, semente_k in zip(ks, sementes_k):
+        ajuste = ajustar_kmeans(X, k, backend, n_inicios, semente_k, tamanho_lote)
+        ajustes[k] = ajuste
+        rotulos = ajuste["rotulos"]
+        silhueta = (
+            float(silhouette_score(X, rotulos, sample_size=amostra, random_state=_estado_aleatorio(semente_k)))
+            if len(np.unique(rotulos)) > 1 else np.nan
+        )
+        gap = desvio_gap = np.nan
+        if referencias:
+            # as referências usam um único início: só o nível da inércia importa
+            log_w = np.log([
+                ajustar_kmeans(r, k, backend, 1, filha, tamanho_lote)["inercia"]
+                for r, filha in zip(referencias, semente_k.spawn(len(referencias)))
+            ])
+            gap = float(log_w.mean() - np.log(ajuste["inercia"]))
+            desvio_gap = float(log_w.std() * np.sqrt(1 + 1 / len(referencias)))
+        linhas.append({
+            "k": k, "inercia": ajuste["inercia"], "silhueta": silhueta,
+            "gap": gap, "desvio_gap": desvio_gap, "tempo_s": ajuste["tempo_s"],
+        })
+    diagnostico = pd.DataFrame(linhas)
+
+    if metodo == "silhueta":
+        k_escolhido = int(diagnostico.loc[diagnostico["silhueta"].idxmax(), "k"])
+    elif metodo == "cotovelo":
+        k_escolhido = _cotovelo(diagnostico["k"], diagnostico["inercia"])
+    else:
+        # menor K com gap(k) >= gap(k+1) - s(k+1)
+        gap, desvio = diagnostico["gap"].to_numpy(), diagnostico["desvio_gap"].to_numpy()
+        candidatos = [i for i in range(len(ks) - 1) if gap[i] >= gap[i + 1] - desvio[i + 1]]
+        k_escolhido = ks[candidatos[0]] if candidatos else ks[int(np.nanargmax(gap))]
+    diagnostico["escolhido"] = diagnostico["k"] == k_escolhido
+    return k_escolhido, diagnostico, ajustes
+
+
+def _ajustar_grupo(grupo, X, k, backend, n_inicios, semente, tamanho_lote, selecao=None, limitar_threads=False):
+    """Padroniza e agrupa um grupo; roda no processo atual ou em um processo do pool."""
+    if limitar_threads:
+        # um processo por grupo: evita que cada um abra todas as threads do BLAS/OpenMP
+        from threadpoolctl import threadpool_limits
+        with threadpool_limits(1):
+            return _ajustar_grupo(grupo, X, k, backend, n_inicios, semente, tamanho_lote, selecao)
+
+    scaler = StandardScaler().fit(X)
+    Xs = scaler.transform(X)
+    if k is None:
+        # K escolhido no próprio grupo; o ajuste final é o da seleção
+        k, diagnostico, ajustes = selecionar_k(
+            Xs, backend=backend, n_inicios=n_inicios, semente=semente_grupo(semente, grupo),
+            tamanho_lote=tamanho_lote, **(selecao or {})
+        )
+        ajuste = ajustes[k]
+        ajuste["diagnostico_k"] = diagnostico
+    else:
+        ajuste = ajustar_kmeans(Xs, k, backend, n_inicios, semente_grupo(semente, grupo), tamanho_lote)
+    ajuste["grupo"] = grupo
+    ajuste["scaler"] = scaler
+    return ajuste
+
+
+def ajustar_grupos(df, indicadores, k=4, chaves=("UF", "ANO"), backend=BACKEND_PADRAO, n_inicios=10,
+                   semente=SEMENTE_PADRAO, workers=1, tamanho_lote=TAMANHO_LOTE_PADRAO, selecao=None):
+    """
+    Ajusta um k-means por grupo do painel (ex: por UF/ano), em paralelo.
+
+    Parâmetros:
+    - df (DataFrame): painel com as colunas de `chaves` e `indicadores`
+    - indicadores (list): colunas usadas na clusterização
+    - k (int ou None): número de clusters; None escolhe o K de cada grupo (ver `selecionar_k`)
+    - chaves (tuple): colunas que definem os grupos (ex: ('UF', 'ANO', 'MES'))
+    - backend, n_inicios, tamanho_lote: ver `ajustar_kmeans`
+    - semente (int): semente global (cada grupo deriva a sua, ver `semente_grupo`)
+    - workers (int): número de processos (1 = neste processo; 0 ou None = todos os núcleos)
+    - selecao (dict ou None): argumentos de `selecionar_k` quando k=None
+      (ex: {'ks': range(2, 7), 'metodo': 'gap'})
+
+    Retorna:
+    - dict grupo -> ajuste (ver `ajustar_kmeans`), com também 'scaler' (StandardScaler
+      do grupo), 'posicoes' (linhas do grupo em `df`, por posição) e, com k=None,
+      'diagnostico_k' (ver `selecionar_k`), na ordem dos grupos
+    """
+    posicoes = df.groupby(list(chaves), sort=True, observed=True).indices
+    valores = df[indicadores].to_numpy(dtype=float)
+
+    tarefas = []
+    for grupo, linhas in posicoes.items():
+        grupo = grupo if isinstance(grupo, tuple) else (grupo,)
+        minimo = k if k is not None else 3
+        if len(linhas) < minimo:
+            print(f"⚠️ Grupo {'/'.join(map(str, grupo))} com {len(linhas)} município(s), menos que {minimo}; ignorado")
+            continue
+        tarefas.append((grupo, linhas))
+
+    if not workers:
+        workers = os.cpu_count() or 1
+    workers = min(int(workers), len(tarefas)) if tarefas else 1
+    argumentos = (k, backend, n_inicios, semente, tamanho_lote, selecao)
+
+    ajustes = {}
+    if workers <= 1:
+        for grupo, linhas in tarefas:
+            ajustes[grupo] = _ajustar_grupo(grupo, valores[linhas], *argumentos)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_contexto_processos()) as pool:
+            futuros = [
+                (grupo, pool.submit(_ajustar_grupo, grupo, valores[linhas], *argumentos, limitar_threads=True))
+                for grupo, linhas in tarefas
+            ]
+            for grupo, futuro in futuros:
+                try:
+                    ajustes[grupo] = futuro.result()
+                except Exception as e:
+                    print(f"❌ Erro ao agrupar {'/'.join(map(str, grupo))}: {e}")
+
+    for grupo, linhas in tarefas:
+        if grupo in ajustes:
+            ajustes[grupo]["posicoes"] = linhas
+    return ajustes
+
+
+def relatorio_ajustes(ajustes, chaves=("UF", "ANO")):
+    """
+    Tabela com o tempo e a inércia de cada ajuste.
+
+    Retorna:
+    - DataFrame com as colunas de `chaves`, 'backend', 'k', 'n_municipios',
+      'inercia', 'n_iter' e 'tempo_s'
+    """
+    linhas = []
+    for grupo, ajuste in ajustes.items():
+        linha = dict(zip(chaves, grupo))
+        linha.update({
+            "backend": ajuste["backend"],
+            "k": ajuste["k"],
+            "n_municipios": len(ajuste["rotulos"]),
+            "inercia": ajuste["inercia"],
+            "n_iter": ajuste["n_iter"],
+            "tempo_s": ajuste["tempo_s"],
+        })
+        linhas.append(linha)
+    return pd.DataFrame(linhas, columns=list(chaves) + ["backend", "k", "n_municipios", "inercia", "n_iter", "tempo_s"])
+
+
+def relatorio_selecao_k(ajustes, chaves=("UF", "ANO")):
+    """
+    Diagnóstico da escolha de K de todos os grupos (ajustes feitos com k=None).
+
+    Retorna:
+    - DataFrame com as colunas de `chaves` e as do diagnóstico de `selecionar_k`
+    """
+    partes = []
+    for grupo, ajuste in ajustes.items():
+        if "diagnostico_k" in ajuste:
+            parte = ajuste["diagnostico_k"].copy()
+            for coluna, valor in zip(chaves, grupo):
+                parte[coluna] = valor
+            partes.append(parte)
+    if not partes:
+        return pd.DataFrame()
+    diagnostico = pd.concat(partes, ignore_index=True)
+    return diagnostico[list(chaves) + [c for c in diagnostico.columns if c not in chaves]]
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+K-means online: centroides atualizados a cada período que chega, sem reagrupar o histórico.
+
+O modelo guarda apenas os K centroides, o peso acumulado de cada um e as somas
+(ponderadas) usadas na padronização, então a memória não cresce com o número
+de períodos. Cada período novo entra com `partial_fit`, em mini-lotes: cada
+centroide vira a média ponderada dos pontos que já recebeu. Antes de um
+período novo, os pesos antigos são multiplicados por `decaimento`, de modo que
+os meses recentes pesam mais (decaimento=1 trata todo o histórico igualmente).
+
+A distância é medida no espaço padronizado pela média/desvio acumulados; os
+centroides ficam na escala original dos indicadores.
+
+`verificar_convergencia` compara o resultado do modo online com o KMeans em
+lote sobre o mesmo histórico (ex: indicadores_integrados.csv):
+
+    python analises/kmeans_online.py --painel indicadores_integrados.csv
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial.distance import cdist
+from sklearn.cluster import KMeans, kmeans_plusplus
+from sklearn.metrics import adjusted_rand_score
+from sklearn.preprocessing import StandardScaler
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analises.clusterizacao import SEMENTE_PADRAO, _estado_aleatorio, semente_grupo
+
+DECAIMENTO_PADRAO = 0.9
+# um período de uma UF tem de dezenas a centenas de municípios: lotes pequenos dão mais atualizações
+TAMANHO_LOTE_ONLINE = 32
+
+
+class KMeansOnline:
+    """
+    K-means com atualização incremental por mini-lotes e esquecimento dos períodos antigos.
+
+    Parâmetros:
+    - k (int): número de clusters
+    - decaimento (float): fator (0, 1] aplicado aos pesos antigos a cada período novo
+    - tamanho_lote (int): linhas por mini-lote dentro de um período
+    - semente (int ou SeedSequence): semente da inicialização (k-means++) e da ordem dos lotes
+    """
+
+    def __init__(self, k, decaimento=DECAIMENTO_PADRAO, tamanho_lote=TAMANHO_LOTE_ONLINE, semente=SEMENTE_PADRAO):
+        if not 0 < decaimento <= 1:
+            raise ValueError(f"decaimento deve estar em (0, 1]: {decaimento}")
+        self.k = k
+        self.decaimento = decaimento
+        self.tamanho_lote = tamanho_lote
+        sequencia = semente if isinstance(semente, np.random.SeedSequence) else np.random.SeedSequence(semente)
+        self._rng = np.random.default_rng(sequencia)
+        self._semente_inicio = _estado_aleatorio(sequencia)
+        self.centroides = None
+        self.pesos = None
+        self.n_periodos = 0
+        self.n_lotes = 0
+        self._peso_total = 0.0
+        self._soma = None
+        self._soma_quadrados = None
+
+    @property
+    def media(self):
+        return self._soma / self._peso_total
+
+    @property
+    def escala(self):
+        variancia = np.maximum(self._soma_quadrados / self._peso_total - self.media ** 2, 0)
+        escala = np.sqrt(variancia)
+        return np.where(escala > 0, escala, 1.0)
+
+    def padronizar(self, X):
+        return (np.asarray(X, dtype=float) - self.media) / self.escala
+
+    @property
+    def centroides_padronizados(self):
+        return self.padronizar(self.centroides)
+
+    def scaler(self):
+        """StandardScaler equivalente à padronização atual (para os arquétipos e o modelo salvo)."""
+        scaler = StandardScaler()
+        scaler.mean_, scaler.scale_ = self.media.copy(), self.escala.copy()
+        scaler.var_ = scaler.scale_ ** 2
+        scaler.n_features_in_ = len(scaler.mean_)
+        scaler.n_samples_seen_ = int(round(self._peso_total))
+        return scaler
+
+    def _distancias(self, X):
+        return cdist(self.padronizar(X), self.centroides_padronizados, "sqeuclidean")
+
+    def predict(self, X):
+        """Rótulo do centroide mais próximo de cada linha."""
+        return self._distancias(X).argmin(axis=1)
+
+    def inercia(self, X):
+        """Soma das distâncias quadráticas (padronizadas) ao centroide mais próximo."""
+        return float(self._distancias(X).min(axis=1).sum())
+
+    def partial_fit(self, X, novo_periodo=True):
+        """
+        Incorpora um período (ou parte dele) ao modelo.
+
+        Parâmetros:
+        - X (array n × p): linhas do período, na escala original
+        - novo_periodo (bool): aplica o decaimento aos pesos acumulados antes de incorporar
+
+        Retorna:
+        - self
+        """
+        X = np.asarray(X, dtype=float)
+        if len(X) == 0:
+            return self
+        if novo_periodo and self.centroides is not None:
+            self.pesos *= self.decaimento
+            self._peso_total *= self.decaimento
+            self._soma *= self.decaimento
+            self._soma_quadrados *= self.decaimento
+        if self._soma is None:
+            self._soma = np.zeros(X.shape[1])
+            self._soma_quadrados = np.zeros(X.shape[1])
+        self._peso_total += len(X)
+        self._soma += X.sum(axis=0)
+        self._soma_quadrados += (X ** 2).sum(axis=0)
+
+        if self.centroides is None:
+            if len(X) < self.k:
+                raise ValueError(f"O primeiro período precisa de pelo menos k={self.k} linhas (tem {len(X)})")
+            sementes, _ = kmeans_plusplus(self.padronizar(X), self.k, random_state=self._semente_inicio)
+            self.centroides = sementes * self.escala + self.media
+            self.pesos = np.zeros(self.k)
+
+        ordem = self._rng.permutation(len(X))
+        for inicio in range(0, len(X), self.tamanho_lote):
+            lote = X[ordem[inicio:inicio + self.tamanho_lote]]
+            rotulos = self._distancias(lote).argmin(axis=1)
+            contagens = np.bincount(rotulos, minlength=self.k)
+            somas = np.zeros_like(self.centroides)
+            np.add.at(somas, rotulos, lote)
+            presentes = contagens > 0
+            self.pesos[presentes] += contagens[presentes]
+            # média ponderada: os pontos antigos entram com os pesos já decaídos
+            self.centroides[presentes] += (
+                somas[presentes] - contagens[presentes, None] * self.centroides[presentes]
+            ) / self.pesos[presentes, None]
+            self.n_lotes += 1
+        if novo_periodo:
+            self.n_periodos += 1
+        return self
+
+
+def _periodos(df, chaves_tempo):
+    chaves_tempo = [c for c in chaves_tempo if c in df.columns]
+    if not chaves_tempo:
+        return [((), np.arange(len(df)))]
+    indices = df.groupby(chaves_tempo, sort=True).indices
+    return [((p if isinstance(p, tuple) else (p,)), posicoes) for p, posicoes in indices.items()]
+
+
+def ajustar_online(df, indicadores, k=4, chave_grupo="UF", chaves_tempo=("ANO", "MES"),
+                   decaimento=DECAIMENTO_PADRAO, semente=SEMENTE_PADRAO, tamanho_lote=TAMANHO_LOTE_ONLINE):
+    """
+    Percorre os períodos de cada UF em ordem, atualizando um KMeansOnline por UF.
+
+    Depois de incorporar cada período, as linhas dele são rotuladas com os
+    centroides do momento. O formato de saída é o de `ajustar_grupos`, para que
+    a classificação por arquétipos e o modelo salvo funcionem igual.
+
+    Retorna:
+    - dict (UF, *período) -> ajuste com 'backend'='online', 'k', 'centroides'
+      (padronizados), 'rotulos', 'inercia', 'n_iter' (mini-lotes), 'tempo_s',
+      'scaler' e 'posicoes'
+    """
+    valores = df[indicadores].to_numpy(dtype=float)
+    ajustes = {}
+    for uf, linhas_uf in df.groupby(chave_grupo, sort=True, observed=True).indices.items():
+        modelo = KMeansOnline(k, decaimento, tamanho_lote, semente_grupo(semente, (uf,)))
+        for periodo, posicoes in _periodos(df.iloc[linhas_uf], chaves_tempo):
+            linhas = linhas_uf[posicoes]
+            grupo = (uf, *periodo)
+            if modelo.centroides is None and len(linhas) < k:
+                print(f"⚠️ Período {'/'.join(map(str, grupo))} com {len(linhas)} município(s), menos que K={k}; ignorado")
+                continue
+            inicio = time.perf_counter()
+            lotes_antes = modelo.n_lotes
+            modelo.partial_fit(valores[linhas])
+            distancias = modelo._distancias(valores[linhas])
+            rotulos = distancias.argmin(axis=1)
+            ajustes[grupo] = {
+                "backend": "online",
+                "k": k,
+                "centroides": modelo.centroides_padronizados,
+                "rotulos": rotulos,
+                "inercia": float(distancias[np.arange(len(rotulos)), rotulos].sum()),
+                "n_iter": modelo.n_lotes - lotes_antes,
+                "tempo_s": time.perf_counter() - inicio,
+                "scaler": modelo.scaler(),
+                "grupo": grupo,
+                "posicoes": linhas,
+            }
+    return ajustes
+
+
+def verificar_convergencia(df, indicadores, k=4, chave_grupo="UF", chaves_tempo=("ANO", "MES"),
+                           decaimento=1.0, n_passadas=10, semente=SEMENTE_PADRAO):
+    """
+    Compara, por UF, o KMeansOnline alimentado período a período com o KMeans em lote do mesmo histórico.
+
+    O histórico é passado `n_passadas` vezes (decaimento=1 torna o alvo o
+    mesmo do ajuste em lote). As duas soluções são medidas nos dados
+    padronizados pela média/desvio de todo o histórico.
+
+    Retorna:
+    - DataFrame por UF com 'inercia_online', 'inercia_lote', 'razao_inercia',
+      'distancia_centroides' (média, após parear os centroides pelo algoritmo
+      húngaro) e 'ari' (concordância dos rótulos, Adjusted Rand Index)
+
+    Como o próprio KMeans em lote varia alguns % de inércia entre sementes
+    (e bem mais no ARI), a medida principal é `razao_inercia`, que deve ficar
+    perto de 1.
+    """
+    valores = df[indicadores].to_numpy(dtype=float)
+    linhas = []
+    for uf, linhas_uf in df.groupby(chave_grupo, sort=True, observed=True).indices.items():
+        sequencia = semente_grupo(semente, (uf,))
+        modelo = KMeansOnline(k, decaimento, semente=sequencia)
+        periodos = _periodos(df.iloc[linhas_uf], chaves_tempo)
+        for passada in range(n_passadas):
+            for _, posicoes in periodos:
+                modelo.partial_fit(valores[linhas_uf[posicoes]], novo_periodo=passada == 0)
+
+        X = StandardScaler().fit_transform(valores[linhas_uf])
+        escala = valores[linhas_uf].std(axis=0)
+        escala = np.where(escala > 0, escala, 1.0)
+        online = (modelo.centroides - valores[linhas_uf].mean(axis=0)) / escala
+        lote = KMeans(n_clusters=k, n_init=10, random_state=_estado_aleatorio(sequencia)).fit(X)
+
+        distancias_online = cdist(X, online, "sqeuclidean")
+        rotulos_online = distancias_online.argmin(axis=1)
+        pares = cdist(online, lote.cluster_centers_)
+        i, j = linear_sum_assignment(pares)
+        inercia_online = float(distancias_online.min(axis=1).sum())
+        linhas.append({
+            chave_grupo: uf,
+            "n_municipios": len(X),
+            "n_periodos": len(periodos),
+            "inercia_online": inercia_online,
+            "inercia_lote": float(lote.inertia_),
+            "razao_inercia": inercia_online / lote.inertia_,
+            "distancia_centroides": float(pares[i, j].mean()),
+            "ari": float(adjusted_rand_score(lote.labels_, rotulos_online)),
+        })
+    return pd.DataFrame(linhas)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from analises.arquetipos import INDICADORES
+    from utils.painel import ler_painel
+
+    BASE_DIR = Path(__file__).resolve().parent.parent
+    parser = argparse.ArgumentParser(description="Compara o k-means online com o KMeans em lote.")
+    parser.add_argument("--painel", type=str, default=str(BASE_DIR / "indicadores_integrados.csv"),
+                        help="Painel (diretório Parquet ou CSV)")
+    parser.add_argument("--k", type=int, default=4, help="Número de clusters")
+    parser.add_argument("--passadas", type=int, default=10, help="Passadas pelo histórico no modo online")
+    args = parser.parse_args()
+
+    try:
+        painel = ler_painel(args.painel)
+        resultado = verificar_convergencia(painel, INDICADORES, k=args.k, n_passadas=args.passadas)
+        print(resultado.to_string(index=False))
+        print(f"\n✅ Razão de inércia online/lote: máx {resultado['razao_inercia'].max():.3f}; "
+              f"ARI mín {resultado['ari'].min():.3f}")
+    except FileNotFoundError:
+        print(f"❌ ERRO: Painel '{args.painel}' não encontrado.")
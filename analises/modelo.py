@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Modelo de perfis salvo em disco e pontuação rápida de novos períodos.
+
+Depois de uma análise de cluster, o ajuste mais recente de cada UF (média e
+escala do StandardScaler, centroides e o perfil de cada cluster) é gravado em
+um pacote de modelo. Um novo período do painel é então pontuado sem reajuste:
+as linhas de cada UF são padronizadas com os parâmetros salvos e vão para o
+centroide mais próximo (`cdist` + `argmin`, em lote).
+
+O reajuste só é necessário quando os dados novos se afastam do modelo. A
+deriva de cada UF é a razão entre a distância quadrática média ao centroide
+mais próximo nos dados novos e a mesma medida no treino (a inércia por
+município); acima de `LIMIAR_DERIVA` a UF é reajustada.
+
+Estrutura em disco:
+- modelo.json: indicadores, metadados e, por UF, o período de treino, os
+  perfis dos clusters e a inércia média
+- parametros.npz: média, escala e centroides de cada UF
+"""
+import json
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import cdist
+
+from analises.arquetipos import ARQUETIPOS, atribuir_municipios
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DIRETORIO_PADRAO = BASE_DIR / "dados" / "modelo_perfis"
+LIMIAR_DERIVA = 1.5
+
+
+class ModeloPerfis:
+    """
+    Pacote de modelo: um scaler, K centroides e os perfis dos clusters por UF.
+
+    Parâmetros:
+    - indicadores (list): colunas do painel usadas no ajuste, na ordem dos centroides
+    - ufs (dict): UF -> dict com 'media', 'escala', 'centroides' (arrays),
+      'perfis' (lista com o perfil de cada cluster), 'inercia_media',
+      'n_municipios' e 'periodo' (chave do grupo de treino)
+    - metadados (dict): informações do treino (backend, semente, data...)
+    """
+
+    def __init__(self, indicadores, ufs, metadados=None):
+        self.indicadores = list(indicadores)
+        self.ufs = ufs
+        self.metadados = metadados or {}
+
+    @classmethod
+    def de_ajustes(cls, ajustes, mapeamentos, indicadores, chaves=("UF", "ANO"), metadados=None):
+        """
+        Monta o modelo a partir dos ajustes de `ajustar_grupos`, ficando com o período mais recente de cada UF.
+
+        Parâmetros:
+        - ajustes (dict): grupo -> ajuste (com 'scaler', 'centroides', 'rotulos', 'inercia')
+        - mapeamentos (dict): grupo -> {número do cluster: perfil}
+        - indicadores (list): colunas usadas no ajuste
+        - chaves (tuple): colunas dos grupos; a primeira é a UF
+        - metadados (dict): informações extras do treino
+        """
+        ufs = {}
+        for grupo in sorted(ajustes):
+            ajuste = ajustes[grupo]
+            ufs[grupo[0]] = {
+                "media": ajuste["scaler"].mean_,
+                "escala": ajuste["scaler"].scale_,
+                "centroides": np.asarray(ajuste["centroides"]),
+                "perfis": [mapeamentos[grupo][i] for i in range(len(ajuste["centroides"]))],
+                "inercia_media": ajuste["inercia"] / len(ajuste["rotulos"]),
+                "n_municipios": len(ajuste["rotulos"]),
+                "periodo": [int(parte) for parte in grupo[1:]],
+            }
+        metadados = dict(metadados or {})
+        metadados.setdefault("chaves", list(chaves))
+        metadados.setdefault("treinado_em", datetime.now().isoformat(timespec="seconds"))
+        return cls(indicadores, ufs, metadados)
+
+    def atualizar(self, outro):
+        """Substitui as UFs reajustadas em `outro` (ex: após deriva); as demais ficam como estão."""
+        self.ufs.update(outro.ufs)
+        self.metadados.update(outro.metadados)
+
+    def salvar(self, diretorio=None):
+        """Grava o pacote (parametros.npz e depois modelo.json, cada um com troca atômica)."""
+        diretorio = Path(diretorio or DIRETORIO_PADRAO)
+        diretorio.mkdir(parents=True, exist_ok=True)
+
+        arrays = {
+            f"{uf}__{nome}": dados[nome]
+            for uf, dados in self.ufs.items() for nome in ("media", "escala", "centroides")
+        }
+        fd, tmp = tempfile.mkstemp(dir=diretorio, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, diretorio / "parametros.npz")
+
+        conteudo = {
+            "indicadores": self.indicadores,
+            "metadados": self.metadados,
+            "ufs": {
+                uf: {nome: valor for nome, valor in dados.items() if nome not in ("media", "escala", "centroides")}
+                for uf, dados in self.ufs.items()
+            },
+        }
+        fd, tmp = tempfile.mkstemp(dir=diretorio, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(conteudo, f, indent=1, ensure_ascii=False, default=str)
+        os.replace(tmp, diretorio / "modelo.json")
+        return diretorio
+
+    @classmethod
+    def carregar(cls, diretorio=None):
+        """Lê um pacote gravado por `salvar`; FileNotFoundError se não houver modelo."""
+        diretorio = Path(diretorio or DIRETORIO_PADRAO)
+        with open(diretorio / "modelo.json", encoding="utf-8") as f:
+            conteudo = json.load(f)
+        with np.load(diretorio / "parametros.npz") as arrays:
+            ufs = {}
+            for uf, dados in conteudo["ufs"].items():
+                ufs[uf] = dict(dados)
+                for nome in ("media", "escala", "centroides"):
+                    ufs[uf][nome] = arrays[f"{uf}__{nome}"]
+        return cls(conteudo["indicadores"], ufs, conteudo["metadados"])
+
+    def _distancias(self, df):
+        """Gera (UF, posições das linhas, X padronizado, distâncias quadráticas aos centroides) por UF do modelo."""
+        valores = df[self.indicadores].to_numpy(dtype=float)
+        for uf, posicoes in df.groupby("UF", observed=True).indices.items():
+            if uf not in self.ufs:
+                continue
+            dados = self.ufs[uf]
+            X = (valores[posicoes] - dados["media"]) / dados["escala"]
+            yield uf, posicoes, X, cdist(X, dados["centroides"], "sqeuclidean")
+
+    def predizer(self, df, atribuicao="cluster", arquetipos=ARQUETIPOS):
+        """
+        Atribui cluster e perfil a linhas novas do painel, sem reajustar.
+
+        Parâmetros:
+        - df (DataFrame): linhas do painel com 'UF' e os indicadores do modelo
+        - atribuicao (str): 'cluster' (perfil do centroide mais próximo) ou
+          'municipio' (arquétipo mais próximo da linha padronizada)
+        - arquetipos (dict): usados com atribuicao='municipio'
+
+        Retorna:
+        - cópia das linhas das UFs presentes no modelo, com 'cluster_num',
+          'perfil' e 'distancia_centroide'
+        """
+        partes = []
+        for uf, posicoes, X, distancias in self._distancias(df):
+            rotulos = distancias.argmin(axis=1)
+            parte = df.iloc[posicoes].copy()
+            parte["cluster_num"] = rotulos
+            if atribuicao == "municipio":
+                parte["perfil"], _ = atribuir_municipios(X, arquetipos)
+            else:
+                parte["perfil"] = np.asarray(self.ufs[uf]["perfis"], dtype=object)[rotulos]
+            parte["distancia_centroide"] = np.sqrt(distancias[np.arange(len(rotulos)), rotulos])
+            partes.append(parte)
+        if not partes:
+            return df.iloc[:0].assign(cluster_num=pd.Series(dtype=int), perfil=pd.Series(dtype=object),
+                                      distancia_centroide=pd.Series(dtype=float))
+        return pd.concat(partes)
+
+    def deriva(self, df, limiar=LIMIAR_DERIVA):
+        """
+        Mede a deriva dos dados novos em relação ao treino, por UF.
+
+        Retorna:
+        - DataFrame indexado pela UF com 'n_municipios', 'inercia_media',
+          'inercia_treino', 'razao' e 'reajustar' (razao > limiar ou UF fora do modelo)
+        """
+        linhas = {}
+        for uf, posicoes, _, distancias in self._distancias(df):
+            inercia = float(distancias.min(axis=1).mean())
+            treino = self.ufs[uf]["inercia_media"]
+            linhas[uf] = {
+                "n_municipios": len(posicoes),
+                "inercia_media": inercia,
+                "inercia_treino": treino,
+                "razao": inercia / treino if treino > 0 else np.inf,
+            }
+        for uf in df["UF"].unique():
+            if uf not in linhas:
+                linhas[uf] = {"n_municipios": int((df["UF"] == uf).sum()), "inercia_media": np.nan,
+                              "inercia_treino": np.nan, "razao": np.inf}
+        resultado = pd.DataFrame.from_dict(
+            linhas, orient="index", columns=["n_municipios", "inercia_media", "inercia_treino", "razao"]
+        ).rename_axis("UF")
+        resultado["reajustar"] = resultado["razao"] > limiar
+        return resultado.sort_index()
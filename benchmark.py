@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark dos módulos de indicadores com microdados sintéticos, sem acesso à rede.
+
+Os arquivos do DATASUS são gerados por `utils.sinteticos.FonteSintetica`,
+injetada como fonte de download de um cache temporário. Cada módulo roda em
+um processo novo (com o cache em modo offline), e o benchmark mede:
+- o tempo total (wall time) do módulo;
+- o pico de memória (RSS máximo do processo e dos seus workers);
+- as linhas lidas por segundo (registros dos arquivos de entrada / tempo).
+
+Exemplos:
+    python benchmark.py --ufs TO --anos 2022
+    python benchmark.py --ufs todas --anos 2022 --meses 1 --escala 0.1 --workers 0
+"""
+import importlib
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR))
+from utils.cache_datasus import CacheDATASUS, definir_cache, obter_arquivos
+from utils.municipios import CODIGOS_UF
+from utils.paralelo import _contexto_processos, baixar_em_paralelo
+from utils.sinteticos import FonteSintetica
+
+POP_FILE = BASE_DIR / "populacao_brasil_censo_2022_com_estado.csv"
+
+# módulo -> (módulo python, função de cálculo, função dos arquivos da célula, célula mensal?)
+MODULOS = {
+    "mortalidade_infantil": ("modulos.mortalidade_infantil", "calcular_tmi_multiplos_uf_anos", "_arquivos_uf_ano", False),
+    "pre_natal": ("modulos.pre_natal", "calcular_cobertura_prenatal_multiplos_uf_anos", "_arquivos_uf_ano", False),
+    "partos_cesareos": (
+        "modulos.partos_cesareos", "calcular_prop_partos_cesareos_multiplos_uf_anos", "_arquivos_uf_ano", False
+    ),
+    "causas_mal_definidas": ("modulos.causas_mal_definidas", "calcular_causas_mal_definidas", "_arquivos_uf_ano", False),
+    "medicos": ("modulos.medicos", "calcular_medicos_por_mil", "_arquivos_uf_ano_mes", True),
+    "internacoes_cronicas": (
+        "modulos.internacoes_cronicas", "calcular_internacoes_cronicas_por_10mil", "_arquivos_uf_ano_mes", True
+    ),
+    "dengue": ("dengue", "calcular_taxa_notificacao_dengue", "_arquivos_uf_ano", False),
+    "notificacoes_sinan": (
+        "modulos.notificacoes_sinan", "calcular_taxa_notificacao_sinan", "_arquivos_uf_ano", False
+    ),
+}
+
+
+def _chaves(nome, ufs, anos, meses):
+    """Chaves do cache lidas por um módulo na grade pedida."""
+    modulo, _, arquivos, mensal = MODULOS[nome]
+    funcao = getattr(importlib.import_module(modulo), arquivos)
+    if mensal:
+        return [k for uf in ufs for ano in anos for mes in (meses or [None]) for k in funcao(uf, ano, mes)]
+    return [k for uf in ufs for ano in anos for k in funcao(uf, ano)]
+
+
+def _pico_rss_mb():
+    """Maior RSS do processo e dos filhos já encerrados (ru_maxrss é em KB no Linux)."""
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(proprio, filhos) / 1024
+
+
+def _executar_modulo(nome, ufs, anos, meses, workers, diretorio_cache):
+    """Roda um módulo em um processo novo e devolve (tempo, pico de RSS em MB, linhas de saída)."""
+    # o módulo e os seus workers abrem o cache padrão: o do benchmark, sem rede
+    os.environ["DATASUS_CACHE_DIR"] = str(diretorio_cache)
+    os.environ["DATASUS_OFFLINE"] = "1"
+    definir_cache(None)
+
+    modulo, funcao, _, mensal = MODULOS[nome]
+    calcular = getattr(importlib.import_module(modulo), funcao)
+    argumentos = {"ufs": ufs, "anos": anos, "arquivo_populacao": str(POP_FILE), "workers": workers}
+    if mensal:
+        argumentos["meses"] = meses
+
+    inicio = time.perf_counter()
+    resultado = calcular(**argumentos)
+    tempo = time.perf_counter() - inicio
+    return tempo, _pico_rss_mb(), 0 if resultado is None else len(resultado)
+
+
+def executar_benchmark(ufs, anos, meses=None, modulos=None, escala=1.0, workers=1, diretorio=None, semente=0):
+    """
+    Gera os dados sintéticos e mede cada módulo.
+
+    Parâmetros:
+    - ufs (list), anos (list), meses (list ou None): grade dos módulos
+    - modulos (list ou None): nomes de `MODULOS` (None = todos)
+    - escala (float): fração do volume real do DATASUS
+    - workers (int): processos de cada módulo (0 = todos os núcleos)
+    - diretorio (str ou None): onde ficam a fonte e o cache (None = temporário, apagado no fim)
+    - semente (int): semente dos dados sintéticos
+
+    Retorna:
+    - DataFrame com uma linha por módulo: 'modulo', 'arquivos', 'linhas_entrada',
+      'linhas_saida', 'tempo_s', 'pico_rss_mb', 'linhas_por_s'
+    """
+    modulos = list(modulos or MODULOS)
+    temporario = diretorio is None
+    diretorio = Path(diretorio or tempfile.mkdtemp(prefix="benchmark_datasus_"))
+    try:
+        fonte = FonteSintetica(diretorio / "fonte", escala=escala, semente=semente, arquivo_populacao=POP_FILE)
+        definir_cache(CacheDATASUS(diretorio / "cache", baixar=fonte, remover_origem=True))
+
+        chaves = {nome: _chaves(nome, ufs, anos, meses) for nome in modulos}
+        inicio = time.perf_counter()
+        baixar_em_paralelo([k for lista in chaves.values() for k in lista])
+        print(f"⏱️ Dados sintéticos gerados em {time.perf_counter() - inicio:.1f} s")
+
+        linhas = []
+        for nome in modulos:
+            entrada = sum(
+                pq.ParquetFile(arquivo).metadata.num_rows
+                for chave in dict.fromkeys(chaves[nome]) for arquivo in obter_arquivos(*chave)
+            )
+            print(f"\n=== Benchmark: {nome} ({entrada:,} registros de entrada) ===")
+            # processo novo por módulo: o pico de memória medido é só o dele
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=_contexto_processos()) as pool:
+                    tempo, pico, saida = pool.submit(
+                        _executar_modulo, nome, ufs, anos, meses, workers, diretorio / "cache"
+                    ).result()
+            except Exception as e:
+                print(f"❌ Erro no benchmark de {nome}: {e}")
+                continue
+            linhas.append({
+                "modulo": nome,
+                "arquivos": len(set(chaves[nome])),
+                "linhas_entrada": entrada,
+                "linhas_saida": saida,
+                "tempo_s": tempo,
+                "pico_rss_mb": pico,
+                "linhas_por_s": entrada / tempo if tempo > 0 else float("nan"),
+            })
+    finally:
+        definir_cache(None)
+        if temporario:
+            shutil.rmtree(diretorio, ignore_errors=True)
+    return pd.DataFrame(linhas)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark dos módulos de indicadores com dados sintéticos.")
+    parser.add_argument("--ufs", nargs="+", default=["TO"], help="UFs da grade ('todas' = as 27)")
+    parser.add_argument("--anos", nargs="+", type=int, default=[2022], help="Anos da grade")
+    parser.add_argument("--meses", nargs="+", type=int, default=None,
+                        help="Meses dos módulos mensais (padrão: ano inteiro)")
+    parser.add_argument("--modulos", nargs="+", choices=list(MODULOS), default=None, help="Módulos medidos (padrão: todos)")
+    parser.add_argument("--escala", type=float, default=1.0, help="Fração do volume real do DATASUS")
+    parser.add_argument("--workers", type=int, default=1, help="Processos de cada módulo (0 = todos os núcleos)")
+    parser.add_argument("--diretorio", type=str, default=None,
+                        help="Onde gerar a fonte e o cache (padrão: temporário, apagado no fim)")
+    parser.add_argument("--saida", type=str, default=None, help="CSV com o resultado")
+    args = parser.parse_args()
+
+    ufs = list(CODIGOS_UF) if args.ufs == ["todas"] else args.ufs
+    resultado = executar_benchmark(
+        ufs, args.anos, args.meses, args.modulos, escala=args.escala, workers=args.workers, diretorio=args.diretorio
+    )
+    print("\n📋 Resultado do benchmark:")
+    print(resultado.to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    if args.saida:
+        resultado.to_csv(args.saida, sep=';', encoding='utf-8-sig', index=False)
+        print(f"\n📄 CSV salvo: '{args.saida}'")
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
-from functools import reduce
+from functools import partial
 
 # Supondo que todos os scripts de indicadores foram refatorados para serem funções modulares
 from modulos.mortalidade_infantil import calcular_tmi_multiplos_uf_anos
@@ -9,96 +9,271 @@ from modulos.medicos import calcular_medicos_por_mil
 from modulos.partos_cesareos import calcular_prop_partos_cesareos_multiplos_uf_anos
 from modulos.causas_mal_definidas import calcular_causas_mal_definidas
 from modulos.internacoes_cronicas import calcular_internacoes_cronicas_por_10mil
+from modulos import (
+    mortalidade_infantil, pre_natal, medicos, partos_cesareos, causas_mal_definidas, internacoes_cronicas
+)
+from utils import leitura, populacao, sih, sim, sinasc, taxas
+from utils.cache_datasus import chave_download
+from utils.integracao import integrar_painel, resumo_cobertura
+from utils.incremental import ManifestoPainel, atualizar_indicador, celulas_pendentes, versao_codigo
+from utils.mapas import lote_mapas
+from utils.orquestracao import GrafoTarefas
+from utils.painel import DIRETORIO_PADRAO as PAINEL_PADRAO, gravar_painel
+from utils.paralelo import baixar_em_paralelo
+from utils.populacao import carregar_registro
+from utils.sim import agregar_sim_celulas, agregar_sim_varios
+from utils.sinasc import agregar_sinasc_celulas, agregar_sinasc_varios
+
+# indicadores da reconstrução incremental:
+# nó -> (módulo, função da célula, arquivos da célula, célula mensal?, fontes agregadas usadas)
+INDICADORES_INCREMENTAIS = {
+    "tmi": (mortalidade_infantil, "_calcular_tmi_uf_ano", "_arquivos_uf_ano", False, ("SIM", "SINASC")),
+    "prenatal": (pre_natal, "_calcular_cobertura_uf_ano", "_arquivos_uf_ano", False, ("SINASC",)),
+    "cesareos": (partos_cesareos, "_calcular_cesareos_uf_ano", "_arquivos_uf_ano", False, ("SINASC",)),
+    "mal_definidas": (causas_mal_definidas, "_calcular_mal_definidas_uf_ano", "_arquivos_uf_ano", False, ("SIM",)),
+    "medicos": (medicos, "_calcular_medicos_uf_ano_mes", "_arquivos_uf_ano_mes", True, ()),
+    "internacoes_cronicas": (
+        internacoes_cronicas, "_calcular_internacoes_uf_ano_mes", "_arquivos_uf_ano_mes", True, ()
+    ),
+}
+
+# fonte agregada -> (função de agregação das células, argumento das funções dos indicadores)
+AGREGADORES = {
+    "SIM": (agregar_sim_celulas, "agregados_sim"),
+    "SINASC": (agregar_sinasc_celulas, "agregados_sinasc"),
+}
+
+
+def _carregar_populacao(arquivo_populacao):
+    """Lê e indexa a base populacional uma única vez para todos os indicadores."""
+    return carregar_registro(arquivo_populacao)
+
+
+def _baixar_fonte(chaves):
+    """Traz para o cache local todos os arquivos de uma fonte do DATASUS."""
+    baixar_em_paralelo(chaves)
+    return chaves
+
+
+def _preparar_sinasc(ufs, anos, workers=1):
+    """Baixa e agrega o SINASC uma única vez para TMI, pré-natal e cesáreos."""
+    return agregar_sinasc_varios(ufs, anos, workers=workers)
+
+
+def _preparar_sim(ufs, anos, workers=1):
+    """Agrega o SIM uma única vez para TMI e causas mal definidas."""
+    return agregar_sim_varios(ufs, anos, workers=workers)
+
+
+def _impressao_populacao(registro):
+    """Impressão da base populacional (vale para CSV, dict de CSVs ou DataFrame)."""
+    return str(pd.util.hash_pandas_object(registro.tabela).sum())
+
+
+def _celulas(nome, ufs, anos):
+    mensal = INDICADORES_INCREMENTAIS[nome][3]
+    return [(uf, ano, None) if mensal else (uf, ano) for uf in ufs for ano in anos]
+
+
+def _versao(nome):
+    """Versão do código de um indicador: o módulo e os utilitários de cálculo."""
+    return versao_codigo(INDICADORES_INCREMENTAIS[nome][0], leitura, populacao, sih, sim, sinasc, taxas)
+
+
+def _preparar_agregados_incremental(fonte, manifesto, ufs, anos, registro, workers=1):
+    """Agrega uma fonte (SIM ou SINASC) só das UF/anos pendentes nos indicadores que a usam."""
+    extras = _impressao_populacao(registro)
+    celulas = set()
+    for nome, (modulo, _, arquivos, _, fontes) in INDICADORES_INCREMENTAIS.items():
+        if fonte in fontes:
+            _, pendentes = celulas_pendentes(
+                manifesto, nome, _celulas(nome, ufs, anos), getattr(modulo, arquivos), _versao(nome), extras
+            )
+            celulas.update(pendentes)
+    return AGREGADORES[fonte][0](sorted(celulas), workers=workers)
+
+
+def _atualizar_incremental(indicador, manifesto, ufs, anos, arquivo_populacao, workers=1, **agregados):
+    """Atualiza um indicador recalculando só as células com entradas novas."""
+    modulo, calcular, arquivos, _, _ = INDICADORES_INCREMENTAIS[indicador]
+    argumentos = {"arquivo_populacao": arquivo_populacao, **agregados}
+    return atualizar_indicador(
+        manifesto, indicador, partial(getattr(modulo, calcular), **argumentos), _celulas(indicador, ufs, anos),
+        getattr(modulo, arquivos), _versao(indicador), extras=_impressao_populacao(arquivo_populacao),
+        workers=workers, gerar_mapa=modulo._gerar_mapa
+    )
+
+
+def montar_grafo(ufs, anos, arquivo_populacao, workers=1, manifesto=None):
+    """
+    Monta o grafo de tarefas da integração.
+
+    Cada fonte (população, SIM, SINASC, SIH, CNES) é um nó carregado uma única vez
+    e repassado aos indicadores que dependem dela; o SIM e o SINASC são também
+    agregados uma vez (nós 'SIM_agregado' e 'SINASC') para todos os indicadores. Os nós independentes rodam
+    ao mesmo tempo, de modo que o tempo total se aproxima da fonte mais lenta.
+
+    Parâmetros:
+    - ufs (list): siglas das UFs
+    - anos (list): anos de referência
+    - arquivo_populacao (str, DataFrame ou RegistroPopulacao): base populacional
+    - workers (int): processos usados por cada indicador
+    - manifesto (ManifestoPainel ou None): com manifesto, a reconstrução é
+      incremental: só as células cujas entradas (arquivos do DATASUS, base
+      populacional, código) mudaram são recalculadas, e as demais são lidas do disco
+
+    Retorna:
+    - GrafoTarefas com os nós 'tmi', 'prenatal', 'medicos', 'cesareos',
+      'mal_definidas' e 'internacoes_cronicas'
+    """
+    grafo = GrafoTarefas()
+    comuns = dict(ufs=ufs, anos=anos, workers=workers)
+
+    # --- Fontes ---
+    grafo.adicionar("populacao", _carregar_populacao, arquivo_populacao=arquivo_populacao)
+    grafo.adicionar("SIM", _baixar_fonte, chaves=[chave_download("SIM", "CID10", uf, ano) for uf in ufs for ano in anos])
+    if manifesto is None:
+        grafo.adicionar("SINASC", _preparar_sinasc, ufs=ufs, anos=anos, workers=workers)
+        grafo.adicionar("SIM_agregado", _preparar_sim, apos=["SIM"], ufs=ufs, anos=anos, workers=workers)
+    else:
+        # as impressões dependem dos objetos no cache: o SIM precisa estar baixado
+        for nome, fonte in (("SINASC", "SINASC"), ("SIM_agregado", "SIM")):
+            grafo.adicionar(
+                nome, _preparar_agregados_incremental, dependencias={"registro": "populacao"}, apos=["SIM"],
+                fonte=fonte, manifesto=manifesto, ufs=ufs, anos=anos, workers=workers
+            )
+    grafo.adicionar("SIH", _baixar_fonte, chaves=[
+        chave_download("SIH", "RD", uf, ano, mes) for uf in ufs for ano in anos for mes in range(1, 13)
+    ])
+    grafo.adicionar("CNES", _baixar_fonte, chaves=[
+        chave_download("CNES", "PF", uf, ano, mes) for uf in ufs for ano in anos for mes in range(1, 13)
+    ])
+
+    # --- Indicadores ---
+    if manifesto is not None:
+        apos = {"tmi": ["SIM"], "mal_definidas": ["SIM"], "medicos": ["CNES"], "internacoes_cronicas": ["SIH"]}
+        nos_agregados = {"SIM": "SIM_agregado", "SINASC": "SINASC"}
+        for nome, (_, _, _, _, fontes) in INDICADORES_INCREMENTAIS.items():
+            dependencias = {"arquivo_populacao": "populacao"}
+            for fonte in fontes:
+                dependencias[AGREGADORES[fonte][1]] = nos_agregados[fonte]
+            grafo.adicionar(
+                nome, _atualizar_incremental, dependencias=dependencias, apos=apos.get(nome, []),
+                indicador=nome, manifesto=manifesto, **comuns
+            )
+        return grafo
+
+    grafo.adicionar(
+        "tmi", calcular_tmi_multiplos_uf_anos,
+        dependencias={"arquivo_populacao": "populacao", "agregados_sinasc": "SINASC", "agregados_sim": "SIM_agregado"},
+        **comuns
+    )
+    grafo.adicionar(
+        "prenatal", calcular_cobertura_prenatal_multiplos_uf_anos,
+        dependencias={"arquivo_populacao": "populacao", "agregados_sinasc": "SINASC"},
+        **comuns
+    )
+    grafo.adicionar(
+        "cesareos", calcular_prop_partos_cesareos_multiplos_uf_anos,
+        dependencias={"arquivo_populacao": "populacao", "agregados_sinasc": "SINASC"},
+        **comuns
+    )
+    grafo.adicionar(
+        "mal_definidas", calcular_causas_mal_definidas,
+        dependencias={"arquivo_populacao": "populacao", "agregados_sim": "SIM_agregado"},
+        **comuns
+    )
+    grafo.adicionar(
+        "medicos", calcular_medicos_por_mil,
+        dependencias={"arquivo_populacao": "populacao"}, apos=["CNES"],
+        meses=None, **comuns
+    )
+    grafo.adicionar(
+        "internacoes_cronicas", calcular_internacoes_cronicas_por_10mil,
+        dependencias={"arquivo_populacao": "populacao"}, apos=["SIH"],
+        meses=None, **comuns
+    )
+    return grafo
+
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Calcula e integra todos os indicadores por município.")
+    parser.add_argument("--completo", action="store_true",
+                        help="Recalcula todas as células, ignorando o manifesto da reconstrução incremental")
+    parser.add_argument("--csv", action="store_true",
+                        help="Também exporta o painel como indicadores_integrados.csv")
+    parser.add_argument("--workers", type=int, default=1, help="Número de processos em paralelo por indicador (0 = todos os núcleos)")
+    parser.add_argument("--mapas", action="store_true", help="Gera os mapas (PNG) de cada indicador, UF e ano")
+    args = parser.parse_args()
+
     # --- Configurações da Análise ---
     UFS  = ['TO', 'GO']
     ANOS = [2021, 2022]
     POP_FILE = "populacao_brasil_censo_2022_com_estado.csv"
+    WORKERS = args.workers
 
     print("📊 Iniciando orquestrador para múltiplos UF/anos...\n")
 
-    # --- Execução dos Módulos ---
-    # --- Execução dos Módulos ---
-    df_tmi = calcular_tmi_multiplos_uf_anos(
-        ufs=UFS,
-        anos=ANOS,
-        arquivo_populacao=POP_FILE
-    )
-
-    df_prenatal = calcular_cobertura_prenatal_multiplos_uf_anos(
-        ufs=UFS,
-        anos=ANOS,
-        arquivo_populacao=POP_FILE
-    )
+    # --- Execução dos Módulos (fontes e indicadores em grafo, com fontes compartilhadas) ---
+    # por padrão só as células com entradas novas são recalculadas (ver utils/incremental.py)
+    manifesto = None if args.completo else ManifestoPainel()
+    grafo = montar_grafo(UFS, ANOS, POP_FILE, workers=WORKERS, manifesto=manifesto)
+    # os mapas de todos os indicadores são renderizados juntos, depois dos cálculos
+    with lote_mapas(workers=WORKERS, ativo=args.mapas):
+        saidas = grafo.executar()
+    grafo.imprimir_relatorio()
 
-    df_medicos = calcular_medicos_por_mil(
-        ufs=UFS,
-        anos=ANOS,
-        meses=None,
-        arquivo_populacao=POP_FILE
-    )
+    def _saida(nome):
+        df = saidas.get(nome)
+        return df if df is not None else pd.DataFrame()
 
-    df_partos = calcular_prop_partos_cesareos_multiplos_uf_anos(
-        ufs=UFS,
-        anos=ANOS,
-        arquivo_populacao=POP_FILE
-    )
+    df_tmi      = _saida("tmi")
+    df_prenatal = _saida("prenatal")
+    df_medicos  = _saida("medicos")
+    df_partos   = _saida("cesareos")
+    df_mal_def  = _saida("mal_definidas")
+    df_intern   = _saida("internacoes_cronicas")
 
-    df_mal_def = calcular_causas_mal_definidas(
-        ufs=UFS,
-        anos=ANOS,
-        arquivo_populacao=POP_FILE
-    )
+    print("\n🔄 Todos os cálculos foram concluídos. Integrando os resultados...")
 
-    df_intern = calcular_internacoes_cronicas_por_10mil(
-        ufs=UFS,
-        anos=ANOS,
-        meses=None,
-        arquivo_populacao=POP_FILE
-    )
+    # --- Consolidação Vetorizada ---
+    # cada indicador é posicionado em um índice único (município, ano, mês) e o
+    # painel é montado de uma vez, junto com o relatório de cobertura
+    colunas_painel = {
+        "tmi": ["TMI"],
+        "prenatal": ["COBERTURA_PRENATAL"],
+        "medicos": ["TAXA_MEDICOS"],
+        "cesareos": ["PROP_CESAREOS"],
+        "mal_definidas": ["PROP_MAL_DEFINIDAS"],
+        "internacoes_cronicas": ["DOENCAS_CRONICAS"],
+    }
+    indicadores = {
+        "tmi": df_tmi, "prenatal": df_prenatal, "medicos": df_medicos,
+        "cesareos": df_partos, "mal_definidas": df_mal_def, "internacoes_cronicas": df_intern,
+    }
+    df_final, cobertura = integrar_painel(indicadores, colunas_painel)
 
-    print("\n🔄 Todos os cálculos foram concluídos. Integrando os resultados...")
+    if not df_final.empty:
+        presentes = [nome for nome, df in indicadores.items() if not df.empty]
+        print("\n📋 Cobertura dos indicadores (células município/ano):")
+        print(resumo_cobertura(df_final, cobertura, presentes).round(1))
+        if not cobertura.empty:
+            cobertura.to_csv("cobertura_indicadores.csv", sep=';', encoding='utf-8-sig', index=False)
+            print("📄 Células faltantes por indicador salvas em 'cobertura_indicadores.csv'")
 
-    # --- Consolidação Robusta ---
-
-    # 1. Cria uma lista dos DataFrames de indicadores, selecionando apenas o essencial
-    # A chave de junção é ['cod_mun_ibge_6', 'ANO']
-    lista_dfs = []
-    if not df_tmi.empty:
-        lista_dfs.append(df_tmi[['cod_mun_ibge_6', 'ANO', 'UF', 'municipio', 'populacao', 'TMI']])
-    if not df_prenatal.empty:
-        lista_dfs.append(df_prenatal[['cod_mun_ibge_6', 'ANO', 'COBERTURA_PRENATAL']])
-    if not df_medicos.empty:
-        lista_dfs.append(df_medicos[['cod_mun_ibge_6', 'ANO', 'TAXA_MEDICOS']])
-    if not df_partos.empty:
-        lista_dfs.append(df_partos[['cod_mun_ibge_6', 'ANO', 'PROP_CESAREOS']])
-    if not df_mal_def.empty:
-        lista_dfs.append(df_mal_def[['cod_mun_ibge_6', 'ANO', 'PROP_MAL_DEFINIDAS']])
-    if not df_intern.empty:
-        lista_dfs.append(df_intern[['cod_mun_ibge_6', 'ANO', 'DOENCAS_CRONICAS']])
-
-    # 2. Usa a função 'reduce' para aplicar o merge sequencialmente
-    if lista_dfs:
-        df_final = reduce(
-            lambda left, right: pd.merge(
-                left,
-                right,
-                on=['cod_mun_ibge_6', 'ANO'], # Chave de junção
-                how='outer' # 'outer' garante que nenhuma linha seja perdida
-            ),
-            lista_dfs
-        )
-
-        # 3. Limpeza final
+        # Limpeza final
         df_final.fillna(0, inplace=True)
 
-        # --- Salvamento do Resultado ---
-        output_filename = f"indicadores_integrados.csv"
-        df_final.to_csv(output_filename, sep=';', encoding='utf-8-sig', index=False)
+        # --- Salvamento do Resultado (Parquet particionado por UF/ano; CSV opcional) ---
+        output_filename = "indicadores_integrados.csv" if args.csv else None
+        destino = gravar_painel(df_final, PAINEL_PADRAO, csv=output_filename)
 
         print("\n✅ Indicadores integrados com sucesso!")
-        print(f"📁 Arquivo consolidado e sem duplicatas salvo como: '{output_filename}'")
+        print(f"📁 Painel consolidado e sem duplicatas salvo em: '{destino}'")
+        if output_filename:
+            print(f"📄 CSV exportado: '{output_filename}'")
         print("\n--- Amostra do Painel de Dados Final ---")
         print(df_final.head())
     else:
@@ -2,15 +2,115 @@
 import pandas as pd
 import geopandas as gpd
 import matplotlib.pyplot as plt
-from pysus.online_data.SIH import SIH
-from utils.mapas import gerar_mapa_indicador
+from functools import partial
+from utils.sih import GRUPOS_CID, agregar_sih, arquivos_sih
+from utils.paralelo import executar_grade
+from utils.populacao import populacao_uf_ano
+from utils.taxas import calcular_taxa
+from utils.painel import salvar_saida
+from utils.mapas import gerar_mapa_indicador, lote_mapas
 import argparse
 
+DOENCAS_CID10 = [cid for cids in GRUPOS_CID.values() for cid in cids]
+
+
+def _arquivos_uf_ano_mes(uf, ano, mes):
+    """Arquivos do DATASUS lidos por uma célula UF/ano/mês (mês None = ano inteiro)."""
+    return arquivos_sih(uf, ano, None if mes is None else [mes])
+
+
+def _arquivos_uf_ano(uf, ano, meses=(None,)):
+    """Arquivos do DATASUS lidos por uma UF/ano com todos os meses pedidos (None na lista = ano inteiro)."""
+    return arquivos_sih(uf, ano, None if None in meses else meses)
+
+
+def _calcular_internacoes_uf_ano(uf, ano, meses, arquivo_populacao):
+    """
+    Calcula as internações por doenças crônicas de uma UF/ano em cada mês pedido.
+
+    O SIH da UF/ano e a população são lidos uma única vez; cada mês (ou o ano
+    inteiro, mês None) é uma soma sobre o tensor de `utils.sih.agregar_sih`.
+
+    Parâmetros:
+    - meses (list): meses das saídas; None na lista = ano inteiro (MES 0)
+
+    Retorna:
+    - DataFrame com as linhas de todos os meses, ou None
+    """
+    descricao = "ano inteiro" if None in meses else f"meses {', '.join(f'{m:02d}' for m in meses)}"
+    print(f"\n=== Processando {uf} / {ano} ({descricao}) ===")
+
+    # Carrega população e filtra UF (e ano, se disponível)
+    try:
+        df_pop = populacao_uf_ano(arquivo_populacao, uf, ano)
+    except Exception as e:
+        print(f"Erro ao carregar população para {uf}/{ano}: {e}")
+        return None
+
+    # Lê o SIH uma vez: tensor município × mês × grupo de CID-3
+    try:
+        tensor = agregar_sih(uf, ano, None if None in meses else meses)
+        if tensor is None:
+            print(f"Nenhum arquivo SIH encontrado para {uf}/{ano} ({descricao})")
+            return None
+    except Exception as e:
+        print(f"Erro ao carregar dados do SIH para {uf}/{ano} ({descricao}): {e}")
+        return None
+
+    saidas = []
+    for mes in meses:
+        # Internações por grupo de doença crônica no mês (ou no ano)
+        por_grupo = tensor.por_grupo(None if mes is None else [mes])[list(GRUPOS_CID)]
+        internacoes = por_grupo.add_prefix("n_").assign(n_internacoes=por_grupo.sum(axis=1))
+
+        # Junta os dados de internações com a base populacional
+        df_base = df_pop.join(internacoes, how="left")
+        for coluna in internacoes.columns:
+            df_base[coluna] = df_base[coluna].fillna(0).astype(int)
+
+        # Calcula o indicador por 10 mil habitantes
+        df_base["DOENCAS_CRONICAS"] = calcular_taxa(df_base["n_internacoes"], df_base["populacao"], 10000)
+
+        df_base["UF"] = uf
+        df_base["ANO"] = ano
+        df_base["MES"] = mes if mes is not None else 0
+        saidas.append(df_base.reset_index())
+    return pd.concat(saidas, ignore_index=True)
+
+
+def _calcular_internacoes_uf_ano_mes(uf, ano, mes, arquivo_populacao):
+    """Calcula as internações por doenças crônicas de uma UF/ano/mês. Retorna o DataFrame da célula ou None."""
+    return _calcular_internacoes_uf_ano(uf, ano, [mes], arquivo_populacao)
+
+
+def _gerar_mapa(df):
+    """Gera o mapa de uma célula (DataFrame devolvido por `_calcular_internacoes_uf_ano_mes`)."""
+    if df.empty:
+        return
+    uf, ano = df['UF'].iat[0], int(df['ANO'].iat[0])
+    mes = int(df['MES'].iat[0]) or None
+    try:
+        sufixo = f"_{mes:02d}" if mes is not None else "_ano_inteiro"
+        gerar_mapa_indicador(
+            df=df.set_index('cod_mun_ibge_6'),
+            uf=uf,
+            ano=ano,
+            coluna_valor='DOENCAS_CRONICAS',
+            legenda='Internações por Doenças Crônicas (por 10 mil Hab.)',
+            cmap='OrRd',
+            nome_arquivo=f'internacoes_cronicas_{uf}_{ano}{sufixo}',
+            title=f'{uf} - Internações por Doenças Crônicas ({ano}{"" if mes is None else f"-{mes:02d}"})'
+        )
+    except Exception as e:
+        print(f"Erro ao gerar mapa para {uf}/{ano}{'' if mes is None else f'/{mes:02d}'}: {e}")
+
+
 def calcular_internacoes_cronicas_por_10mil(
     ufs=['TO'],
     anos=[2022],
     meses=None,  # pode ser None ou lista vazia
-    arquivo_populacao="populacao_brasil_censo_2022_com_estado.csv"
+    arquivo_populacao="populacao_brasil_censo_2022_com_estado.csv",
+    workers=1
 ):
     """
     Calcula o indicador de internações por doenças crônicas para múltiplas UFs, anos e meses.
@@ -20,113 +120,30 @@ def calcular_internacoes_cronicas_por_10mil(
     - anos (list): Lista de anos.
     - meses (list ou None): Lista de meses a serem processados. Se None ou vazio, processa o ano inteiro.
     - arquivo_populacao (str): Caminho para o CSV com dados populacionais.
+    - workers (int): Número de processos para a grade UF × ano × mês (1 = sequencial).
 
     Retorna:
-    - DataFrame combinado com os indicadores calculados.
+    - DataFrame combinado com os indicadores calculados: 'n_internacoes' (soma
+      dos grupos), 'n_hipertensao', 'n_diabetes', 'n_asma' e 'DOENCAS_CRONICAS'.
     """
-    DOENCAS_CID10 = ["I10", "I11", "I12", "I13", "I15", "E10", "E11", "E12", "E13", "E14", "J45", "J46"]
-    df_resultados = []
-
     # Se meses for None ou vazio, processa o ano inteiro como um único grupo
     processar_por_mes = bool(meses) and len(meses) > 0
+    meses_iterar = list(meses) if processar_por_mes else [None]
+
+    # uma célula por UF/ano: o SIH e a população são lidos uma vez para todos os meses
+    df_resultados = executar_grade(
+        partial(_calcular_internacoes_uf_ano, meses=meses_iterar, arquivo_populacao=arquivo_populacao),
+        [(uf, ano) for uf in ufs for ano in anos],
+        workers=workers,
+        downloads=partial(_arquivos_uf_ano, meses=meses_iterar),
+    )
+    df_resultados = [r for r in df_resultados if r is not None]
 
-    for uf in ufs:
-        for ano in anos:
-            meses_iterar = meses if processar_por_mes else [None]
-
-            for mes in meses_iterar:
-                if mes is None:
-                    print(f"\n=== Processando {uf} / {ano} (ano inteiro) ===")
-                else:
-                    print(f"\n=== Processando {uf} / {ano} (mês {mes:02d}) ===")
-
-                # Carrega população e filtra UF (e ano, se disponível)
-                try:
-                    if isinstance(arquivo_populacao, str):
-                        df_pop = pd.read_csv(arquivo_populacao, sep=';', dtype={'cod_mun_ibge_6': str})
-                        if 'ANO' in df_pop.columns:
-                            df_pop_ano = df_pop[(df_pop['UF'] == uf) & (df_pop['ANO'] == ano)].copy()
-                        else:
-                            df_pop_ano = df_pop[df_pop['UF'] == uf].copy()
-                    elif isinstance(arquivo_populacao, dict):
-                        df_pop_ano = pd.read_csv(arquivo_populacao[ano], sep=';', dtype={'cod_mun_ibge_6': str})
-                        df_pop_ano = df_pop_ano[df_pop_ano['UF'] == uf].copy()
-                    elif isinstance(arquivo_populacao, pd.DataFrame):
-                        if 'ANO' in arquivo_populacao.columns:
-                            df_pop_ano = arquivo_populacao[(arquivo_populacao['UF'] == uf) & (arquivo_populacao['ANO'] == ano)].copy()
-                        else:
-                            df_pop_ano = arquivo_populacao[arquivo_populacao['UF'] == uf].copy()
-                    else:
-                        raise ValueError("Parâmetro 'arquivo_populacao' inválido")
-
-                    df_base = df_pop_ano.set_index('cod_mun_ibge_6')
-                except Exception as e:
-                    print(f"Erro ao carregar população para {uf}/{ano}: {e}")
-                    continue
-
-                # Carrega dados do SIH para o mês e ano especificados
-                try:
-                    sih = SIH()
-                    sih.load()
-                    files = sih.get_files(group='RD', uf=uf, year=ano, month=mes)
-                    if not files:
-                        if mes is None:
-                            print(f"Nenhum arquivo SIH encontrado para {uf}/{ano} (ano inteiro)")
-                        else:
-                            print(f"Nenhum arquivo SIH encontrado para {uf}/{ano}/{mes:02d}")
-                        continue
-
-                    parquet_set = sih.download(files)
-                    df_sih = pd.concat([p.to_dataframe() for p in parquet_set], ignore_index=True)
-                except Exception as e:
-                    if mes is None:
-                        print(f"Erro ao carregar dados do SIH para {uf}/{ano} (ano inteiro): {e}")
-                    else:
-                        print(f"Erro ao carregar dados do SIH para {uf}/{ano}/{mes:02d}: {e}")
-                    continue
-
-                # Verifica coluna DIAG_PRINC
-                if "DIAG_PRINC" not in df_sih.columns:
-                    print("Coluna DIAG_PRINC não encontrada no SIH.")
-                    continue
-
-                # Filtra internações por doenças crônicas
-                df_cronicas = df_sih[df_sih["DIAG_PRINC"].astype(str).str[:3].isin([cid[:3] for cid in DOENCAS_CID10])].copy()
-
-                # Agrupa por município
-                df_cronicas["MUNIC_RES"] = df_cronicas["MUNIC_RES"].astype(str).str.zfill(6)
-                internacoes = df_cronicas.groupby("MUNIC_RES").size().to_frame("n_internacoes")
-
-                # Junta os dados de internações com a base populacional
-                df_base = df_base.join(internacoes, how="left")
-                df_base["n_internacoes"] = df_base["n_internacoes"].fillna(0).astype(int)
-
-                # Calcula o indicador por 10 mil habitantes
-                df_base["DOENCAS_CRONICAS"] = df_base.apply(
-                    lambda row: (row["n_internacoes"] / row["populacao"]) * 10000 if row["populacao"] > 0 else 0,
-                    axis=1
-                )
-
-                df_base["UF"] = uf
-                df_base["ANO"] = ano
-                df_base["MES"] = mes if mes is not None else 0
-                df_resultados.append(df_base.reset_index())
-
-                # Gera o mapa
-                try:
-                    sufixo = f"_{mes:02d}" if mes is not None else "_ano_inteiro"
-                    gerar_mapa_indicador(
-                        df=df_base,
-                        uf=uf,
-                        ano=ano,
-                        coluna_valor='DOENCAS_CRONICAS',
-                        legenda='Internações por Doenças Crônicas (por 10 mil Hab.)',
-                        cmap='OrRd',
-                        nome_arquivo=f'internacoes_cronicas_{uf}_{ano}{sufixo}',
-                        title=f'{uf} - Internações por Doenças Crônicas ({ano}{"" if mes is None else f"-{mes:02d}"})'
-                    )
-                except Exception as e:
-                    print(f"Erro ao gerar mapa para {uf}/{ano}{'' if mes is None else f'/{mes:02d}'}: {e}")
+    # mapas renderizados depois dos cálculos, em lote
+    with lote_mapas(workers=workers):
+        for r in df_resultados:
+            for _, df_mes in r.groupby("MES", sort=False):
+                _gerar_mapa(df_mes)
 
     if df_resultados:
         return pd.concat(df_resultados, ignore_index=True)
@@ -140,21 +157,25 @@ if __name__ == "__main__":
     parser.add_argument("--anos", nargs="+", type=int, default=[2022], help="Lista de anos (ex: 2021 2022)")
     parser.add_argument("--meses", nargs="*", type=int, default=None, help="Lista de meses (ex: 1 2 12). Se não informado, processa o ano inteiro")
     parser.add_argument("--pop", type=str, default="populacao_brasil_censo_2022_com_estado.csv", help="Arquivo CSV com dados populacionais")
-    parser.add_argument("--saida", type=str, default="internacoes_cronicas_resultado.csv", help="Arquivo CSV de saída")
+    parser.add_argument("--saida", type=str, default="dados/indicadores/internacoes_cronicas_resultado", help="Diretório Parquet (particionado por UF/ano) ou arquivo .csv de saída")
+    parser.add_argument("--workers", type=int, default=1, help="Número de processos em paralelo (0 = todos os núcleos)")
+    parser.add_argument("--mapas", action="store_true", help="Gera os mapas (PNG) de cada UF/ano")
 
     args = parser.parse_args()
 
-    df_resultado = calcular_internacoes_cronicas_por_10mil(
-        ufs=args.ufs,
-        anos=args.anos,
-        meses=args.meses,
-        arquivo_populacao=args.pop
-    )
+    # mapas renderizados em lote no final, só com --mapas
+    with lote_mapas(workers=args.workers, ativo=args.mapas):
+        df_resultado = calcular_internacoes_cronicas_por_10mil(
+            ufs=args.ufs,
+            anos=args.anos,
+            meses=args.meses,
+            arquivo_populacao=args.pop,
+            workers=args.workers
+        )
 
     if not df_resultado.empty:
         print("\n✅ Indicador calculado com sucesso.")
         print(df_resultado[['UF', 'ANO', 'MES', 'municipio', 'populacao', 'n_internacoes', 'DOENCAS_CRONICAS']].head())
-        df_resultado.to_csv(args.saida, index=False, sep=';')
-        print(f"\n📄 Resultado salvo como '{args.saida}'")
+        salvar_saida(df_resultado, args.saida)
     else:
         print("⚠️ Nenhum dado foi retornado.")
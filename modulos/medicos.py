@@ -2,12 +2,116 @@
 import pandas as pd
 import geopandas as gpd
 import matplotlib.pyplot as plt
-from pysus.online_data.CNES import CNES
-from utils.mapas import gerar_mapa_indicador
+from functools import partial
+from utils.cache_datasus import chave_download
+from utils.distintos import MODOS, ContadorDistintos
+from utils.leitura import iterar_lotes
+from utils.municipios import codigo_6
+from utils.paralelo import MAX_THREADS_DOWNLOAD, executar_grade, obter_a_medida
+from utils.populacao import populacao_uf_ano
+from utils.taxas import calcular_taxa
+from utils.painel import salvar_saida
+from utils.mapas import gerar_mapa_indicador, lote_mapas
 import argparse
+import os
+
+
+def _arquivos_uf_ano_mes(uf, ano, mes):
+    """Arquivos do DATASUS lidos por uma célula UF/ano/mês (mês None = ano inteiro)."""
+    meses_validos = list(range(1, 13)) if mes is None else [mes]
+    return [chave_download("CNES", "PF", uf, ano, m) for m in meses_validos]
+
+
+def _adicionar_medicos(contador, arquivos):
+    """Adiciona ao contador os médicos (CBO 225) de um mês do CNES, lote a lote."""
+    for lote in iterar_lotes(arquivos, ["CODUFMUN", "CPFUNICO", "CBO"], dicionario=["CODUFMUN"]):
+        lote = lote[lote["CBO"].astype(str).str.startswith("225")]
+        contador.adicionar(codigo_6(lote["CODUFMUN"]), lote["CPFUNICO"])
+
+
+def _calcular_medicos_uf_ano_mes(uf, ano, mes, arquivo_populacao, conexoes=MAX_THREADS_DOWNLOAD, distintos="exato"):
+    """
+    Calcula a taxa de médicos de uma UF/ano/mês. Retorna o DataFrame da célula ou None.
+
+    No ano inteiro, os 12 meses do CNES são obtidos em paralelo (no máximo
+    `conexoes` downloads simultâneos) e cada mês entra no contador de médicos
+    distintos (CPFUNICO) por município assim que chega, enquanto os demais
+    ainda estão sendo baixados. `distintos` é o modo do `ContadorDistintos`
+    ('exato' ou 'hll').
+    """
+    if mes is None:
+        print(f"\n=== Processando {uf} / {ano} (ano inteiro) ===")
+    else:
+        print(f"\n=== Processando {uf} / {ano} (mês {mes}) ===")
+
+    # só a estrutura de contagem fica em memória: cada lote é adicionado e descartado
+    contador = ContadorDistintos(distintos)
+    lidos = 0
+    for (_, _, _, _, m), arquivos, erro in obter_a_medida(_arquivos_uf_ano_mes(uf, ano, mes), conexoes):
+        try:
+            if erro is not None:
+                raise erro
+            if not arquivos:
+                print(f"⚠️ Nenhum arquivo CNES encontrado para {uf}/{ano}/{m:02d}")
+                continue
+            _adicionar_medicos(contador, arquivos)
+            lidos += 1
+        except Exception as e:
+            print(f"⚠️ Erro CNES {uf}/{ano}/{m}: {e}")
+            continue
+
+    if lidos == 0:
+        return None
+
+    # Carrega população e filtra UF
+    try:
+        df_base = populacao_uf_ano(arquivo_populacao, uf, ano)
+    except Exception as e:
+        print(f"Erro ao carregar população para {uf}/{ano}: {e}")
+        return None
+
+    # médicos distintos (CPFUNICO) por município
+    contagem = contador.contar().rename('n_medicos')
+
+    df = (
+        df_base
+        .join(contagem, how='left')
+        .fillna({'n_medicos': 0})
+    )
+    df['n_medicos'] = df['n_medicos'].astype(int)
+    df['TAXA_MEDICOS'] = calcular_taxa(df['n_medicos'], df['populacao'], 1000)
+
+    df['UF'], df['ANO'] = uf, ano
+    df['MES'] = mes if mes is not None else 0
+
+    return df.reset_index()
+
+
+def _gerar_mapa(df):
+    """Gera o mapa de uma célula (DataFrame devolvido por `_calcular_medicos_uf_ano_mes`)."""
+    if df.empty:
+        return
+    uf, ano = df['UF'].iat[0], int(df['ANO'].iat[0])
+    mes = int(df['MES'].iat[0]) or None
+    try:
+        sufixo = f"_{mes:02d}" if mes is not None else "_ano_inteiro"
+        gerar_mapa_indicador(
+            df=df.set_index('cod_mun_ibge_6'),
+            uf=uf,
+            ano=ano,
+            coluna_valor="TAXA_MEDICOS",
+            legenda="Médicos por 1.000 hab.",
+            cmap="Reds",
+            nome_arquivo=f"taxa_medicos_{uf}_{ano}{sufixo}",
+            title=f"{uf} – Médicos/1 000 hab. ({ano}{'' if mes is None else f'-{mes}'})"
+        )
+    except Exception as e:
+        print(f"Erro ao gerar mapa para {uf}/{ano}{'' if mes is None else f'/{mes}'}: {e}")
+
 
 def calcular_medicos_por_mil(ufs=['TO'], anos=[2022], meses=None,
-                             arquivo_populacao="populacao_brasil_censo_2022_com_estado.csv"):
+                             arquivo_populacao="populacao_brasil_censo_2022_com_estado.csv", workers=1,
+                             distintos="exato"):
     """
     Calcula a taxa de médicos por 1.000 habitantes para múltiplas UFs, anos e meses,
     gerando também mapas por UF/ano/mês.
@@ -17,6 +121,9 @@ def calcular_medicos_por_mil(ufs=['TO'], anos=[2022], meses=None,
     - anos (list): Lista de anos (ex: [2021, 2022])
     - meses (list): Lista de meses (1–12). Se None ou vazio, usa ano inteiro.
     - arquivo_populacao (str): Caminho para o CSV com população municipal
+    - workers (int): Número de processos para a grade UF × ano × mês (1 = sequencial)
+    - distintos (str): Contagem de médicos distintos: 'exato' ou 'hll' (HyperLogLog,
+      memória fixa por município e erro padrão de ~1,6%)
 
     Retorna:
     - DataFrame com colunas: [
@@ -24,107 +131,25 @@ def calcular_medicos_por_mil(ufs=['TO'], anos=[2022], meses=None,
         'n_medicos','TAXA_MEDICOS'
       ]
     """
-    resultados = []
-    cnes_db = CNES()
-    cnes_db.load()
-
     processar_por_mes = bool(meses) and len(meses) > 0
-
-    for uf in ufs:
-        for ano in anos:
-            meses_iterar = meses if processar_por_mes else [None]
-
-            for mes in meses_iterar:
-                if mes is None:
-                    print(f"\n=== Processando {uf} / {ano} (ano inteiro) ===")
-                    meses_validos = list(range(1, 13))
-                else:
-                    print(f"\n=== Processando {uf} / {ano} (mês {mes}) ===")
-                    meses_validos = [mes]
-
-                dfs_cnes_mes = []
-
-                for m in meses_validos:
-                    try:
-                        files = cnes_db.get_files(group='PF', uf=uf, year=ano, month=m)
-                        if not files:
-                            print(f"⚠️ Nenhum arquivo CNES encontrado para {uf}/{ano}/{m:02d}")
-                            continue
-                        df_mes = cnes_db.download(files).to_dataframe()
-                        dfs_cnes_mes.append(df_mes)
-                    except Exception as e:
-                        print(f"⚠️ Erro CNES {uf}/{ano}/{m}: {e}")
-                        continue
-
-                if not dfs_cnes_mes:
-                    continue
-
-                df_cnes = pd.concat(dfs_cnes_mes, ignore_index=True)
-
-                # Carrega população e filtra UF
-                try:
-                    if isinstance(arquivo_populacao, str):
-                        df_pop = pd.read_csv(arquivo_populacao, sep=';', dtype={'cod_mun_ibge_6': str})
-                        df_pop_ano = df_pop[df_pop['UF'] == uf].copy()
-                    elif isinstance(arquivo_populacao, dict):
-                        df_pop_ano = pd.read_csv(arquivo_populacao[ano], sep=';', dtype={'cod_mun_ibge_6': str})
-                        df_pop_ano = df_pop_ano[df_pop_ano['UF'] == uf].copy()
-                    elif isinstance(arquivo_populacao, pd.DataFrame):
-                        if 'ANO' in arquivo_populacao.columns:
-                            df_pop_ano = arquivo_populacao[(arquivo_populacao['UF'] == uf) & (arquivo_populacao['ANO'] == ano)].copy()
-                        else:
-                            df_pop_ano = arquivo_populacao[arquivo_populacao['UF'] == uf].copy()
-                    else:
-                        raise ValueError("Parâmetro 'arquivo_populacao' inválido")
-
-                    df_base = df_pop_ano.set_index('cod_mun_ibge_6')
-                except Exception as e:
-                    print(f"Erro ao carregar população para {uf}/{ano}: {e}")
-                    continue
-
-                if 'CBO' not in df_cnes.columns or 'CPFUNICO' not in df_cnes.columns:
-                    print("⚠️ Colunas CBO ou CPFUNICO ausentes.")
-                    continue
-
-                # filtra médicos (CBO 225)
-                df_med = df_cnes[df_cnes['CBO'].astype(str).str.startswith('225')]
-                contagem = (
-                    df_med.groupby('CODUFMUN')['CPFUNICO']
-                    .nunique()
-                    .rename('n_medicos')
-                )
-                contagem.index = contagem.index.astype(str)
-
-                df = (
-                    df_base
-                    .join(contagem, how='left')
-                    .fillna({'n_medicos': 0})
-                )
-                df['n_medicos'] = df['n_medicos'].astype(int)
-                df['TAXA_MEDICOS'] = df.apply(
-                    lambda r: (r['n_medicos'] / r['populacao']) * 1000 if r['populacao'] > 0 else 0,
-                    axis=1
-                )
-
-                df['UF'], df['ANO'] = uf, ano
-                df['MES'] = mes if mes is not None else 0
-
-                resultados.append(df.reset_index())
-
-                try:
-                    sufixo = f"_{mes:02d}" if mes is not None else "_ano_inteiro"
-                    gerar_mapa_indicador(
-                        df=df,
-                        uf=uf,
-                        ano=ano,
-                        coluna_valor="TAXA_MEDICOS",
-                        legenda="Médicos por 1.000 hab.",
-                        cmap="Reds",
-                        nome_arquivo=f"taxa_medicos_{uf}_{ano}{sufixo}",
-                        title=f"{uf} – Médicos/1 000 hab. ({ano}{'' if mes is None else f'-{mes}'})"
-                    )
-                except Exception as e:
-                    print(f"Erro ao gerar mapa para {uf}/{ano}{'' if mes is None else f'/{mes}'}: {e}")
+    meses_iterar = meses if processar_por_mes else [None]
+
+    # cada célula baixa os seus meses e os reduz conforme chegam; as conexões são
+    # divididas entre as células em paralelo para o total ficar em MAX_THREADS_DOWNLOAD
+    celulas = [(uf, ano, mes) for uf in ufs for ano in anos for mes in meses_iterar]
+    em_paralelo = min(workers or os.cpu_count() or 1, len(celulas)) if celulas else 1
+    resultados = executar_grade(
+        partial(_calcular_medicos_uf_ano_mes, arquivo_populacao=arquivo_populacao,
+                conexoes=max(1, MAX_THREADS_DOWNLOAD // em_paralelo), distintos=distintos),
+        celulas,
+        workers=workers,
+    )
+    resultados = [r for r in resultados if r is not None]
+
+    # mapas renderizados depois dos cálculos, em lote
+    with lote_mapas(workers=workers):
+        for r in resultados:
+            _gerar_mapa(r)
 
     if resultados:
         df_final = pd.concat(resultados, ignore_index=True)
@@ -140,14 +165,19 @@ if __name__ == "__main__":
     parser.add_argument("--anos", nargs="+", type=int, default=[2021, 2022], help="Lista de anos")
     parser.add_argument("--meses", nargs="*", type=int, default=None, help="Lista de meses (1–12). Se não informado, agrega o ano inteiro")
     parser.add_argument("--pop", type=str, default="populacao_brasil_censo_2022_com_estado.csv", help="Arquivo CSV com população municipal")
-    parser.add_argument("--saida", type=str, default="medicos_por_mil_multiplos_estados_anos.csv", help="Arquivo CSV de saída")
+    parser.add_argument("--saida", type=str, default="dados/indicadores/medicos_por_mil_multiplos_estados_anos", help="Diretório Parquet (particionado por UF/ano) ou arquivo .csv de saída")
+    parser.add_argument("--workers", type=int, default=1, help="Número de processos em paralelo (0 = todos os núcleos)")
+    parser.add_argument("--mapas", action="store_true", help="Gera os mapas (PNG) de cada UF/ano")
+    parser.add_argument("--distintos", choices=MODOS, default="exato", help="Contagem de médicos distintos: exata ou HyperLogLog")
 
     args = parser.parse_args()
 
-    df_med = calcular_medicos_por_mil(args.ufs, args.anos, args.meses, args.pop)
+    # mapas renderizados em lote no final, só com --mapas
+    with lote_mapas(workers=args.workers, ativo=args.mapas):
+        df_med = calcular_medicos_por_mil(args.ufs, args.anos, args.meses, args.pop, workers=args.workers,
+                                          distintos=args.distintos)
 
     if not df_med.empty:
-        df_med.to_csv(args.saida, sep=';', index=False)
-        print(f"\n📄 CSV salvo: '{args.saida}'")
+        salvar_saida(df_med, args.saida)
     else:
         print("⚠️ Nenhum resultado para salvar.")
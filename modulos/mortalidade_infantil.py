@@ -1,13 +1,81 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
 import numpy as np
-from pysus.online_data.SIM import download as download_sim
-from pysus.online_data.SINASC import download as download_sinasc
+from functools import partial
+from utils.cache_datasus import chave_download
+from utils.paralelo import executar_grade
+from utils.populacao import populacao_uf_ano
+from utils.taxas import calcular_taxa
+from utils.painel import salvar_saida
+from utils.sim import agregar_sim_varios, obter_agregado_sim
+from utils.sinasc import agregar_sinasc_varios, obter_agregado_sinasc
 import geopandas as gpd
 import matplotlib.pyplot as plt
-from utils.mapas import gerar_mapa_indicador
-
-def calcular_tmi_multiplos_uf_anos(ufs=['TO'], anos=[2022], arquivo_populacao="populacao_brasil_censo_2022_com_estado.csv"):
+from utils.mapas import gerar_mapa_indicador, lote_mapas
+
+
+def _arquivos_uf_ano(uf, ano):
+    """Arquivos do DATASUS de que depende uma célula UF/ano (lidos antes, na agregação)."""
+    return [chave_download("SIM", "CID10", uf, ano), chave_download("SINASC", "DN", uf, ano)]
+
+
+def _calcular_tmi_uf_ano(uf, ano, arquivo_populacao, agregados_sinasc=None, agregados_sim=None):
+    """Calcula a TMI de uma UF/ano. Retorna o DataFrame da célula ou None."""
+    print(f"\n=== Processando {uf} / {ano} ===")
+
+    # carrega população e filtra UF
+    try:
+        df_base = populacao_uf_ano(arquivo_populacao, uf, ano)
+    except Exception as e:
+        print(f"Erro ao carregar população para {uf}/{ano}: {e}")
+        return None
+
+    # --- SIM: óbitos infantis ---
+    try:
+        obitos = obter_agregado_sim(uf, ano, agregados_sim)["obitos_infantis"]
+    except Exception as e:
+        print(f"⚠️ Erro SIM {uf}/{ano}: {e}")
+        obitos = pd.Series(dtype=int, name="obitos_infantis")
+
+    # --- SINASC: nascidos vivos ---
+    try:
+        nascidos = obter_agregado_sinasc(uf, ano, agregados_sinasc)["nascidos_vivos"]
+    except Exception as e:
+        print(f"⚠️ Erro SINASC {uf}/{ano}: {e}")
+        nascidos = pd.Series(dtype=int, name="nascidos_vivos")
+
+    # junta e calcula TMI
+    df_base = df_base.join(obitos, how="left") \
+                     .join(nascidos, how="left") \
+                     .fillna(0)
+    df_base['obitos_infantis'] = df_base['obitos_infantis'].astype(int)
+    df_base['nascidos_vivos']   = df_base['nascidos_vivos'].astype(int)
+    df_base['TMI'] = calcular_taxa(df_base['obitos_infantis'], df_base['nascidos_vivos'], 1000)
+
+    df_base['UF']  = uf
+    df_base['ANO'] = ano
+
+    return df_base.reset_index()
+
+
+
+def _gerar_mapa(df):
+    """Gera o mapa de uma célula (DataFrame devolvido por `_calcular_tmi_uf_ano`)."""
+    if df.empty:
+        return
+    uf, ano = df['UF'].iat[0], int(df['ANO'].iat[0])
+    gerar_mapa_indicador(
+        df=df.set_index('cod_mun_ibge_6'),
+        uf=uf,
+        ano=ano,
+        coluna_valor="TMI",
+        legenda="TMI (por mil nascidos vivos)",
+        cmap="Reds",
+        nome_arquivo="tmi"
+    )
+
+
+def calcular_tmi_multiplos_uf_anos(ufs=['TO'], anos=[2022], arquivo_populacao="populacao_brasil_censo_2022_com_estado.csv", workers=1, agregados_sinasc=None, agregados_sim=None):
     """
     Calcula a Taxa de Mortalidade Infantil (TMI) para múltiplos estados e anos,
     gerando também mapas por UF/ano.
@@ -16,90 +84,33 @@ def calcular_tmi_multiplos_uf_anos(ufs=['TO'], anos=[2022], arquivo_populacao="p
     - ufs (list): Lista de siglas de UFs (ex: ['TO', 'MG'])
     - anos (list): Lista de anos (ex: [2021, 2022])
     - arquivo_populacao (str): Caminho para o CSV com população municipal
+    - workers (int): Número de processos para a grade UF × ano (1 = sequencial)
+    - agregados_sinasc (dict ou None): dict (uf, ano) -> contadores do SINASC já agregados
+      (ver utils.sinasc.agregar_sinasc_varios); se None, o SINASC é agregado aqui
+    - agregados_sim (dict ou None): dict (uf, ano) -> contadores do SIM já agregados
+      (ver utils.sim.agregar_sim_varios); se None, o SIM é agregado aqui
 
     Retorna:
     - DataFrame com colunas: ['UF','ANO','cod_mun_ibge_6','municipio','populacao','obitos_infantis','nascidos_vivos','TMI']
     """
-    resultados = []
-    for uf in ufs:
-        for ano in anos:
-            print(f"\n=== Processando {uf} / {ano} ===")
-
-            # carrega população e filtra UF
-            try:
-                if isinstance(arquivo_populacao, str):
-                    df_pop = pd.read_csv(arquivo_populacao, sep=';', dtype={'cod_mun_ibge_6': str})
-                    # Remova o filtro por ano se seu CSV não tem essa coluna
-                    df_pop_ano = df_pop[df_pop['UF'] == uf].copy()
-                elif isinstance(arquivo_populacao, dict):
-                    df_pop_ano = pd.read_csv(arquivo_populacao[ano], sep=';', dtype={'cod_mun_ibge_6': str})
-                    df_pop_ano = df_pop_ano[df_pop_ano['UF'] == uf].copy()
-                elif isinstance(arquivo_populacao, pd.DataFrame):
-                    # Se sua DataFrame tem ANO, filtra, senão filtra só por UF
-                    if 'ANO' in arquivo_populacao.columns:
-                        df_pop_ano = arquivo_populacao[(arquivo_populacao['UF'] == uf) & (arquivo_populacao['ANO'] == ano)].copy()
-                    else:
-                        df_pop_ano = arquivo_populacao[arquivo_populacao['UF'] == uf].copy()
-                else:
-                    raise ValueError("Parâmetro 'arquivo_populacao' inválido")
-
-                df_base = df_pop_ano.set_index('cod_mun_ibge_6')
-            except Exception as e:
-                print(f"Erro ao carregar população para {uf}/{ano}: {e}")
-                continue
-
-            # --- SIM: óbitos infantis ---
-            try:
-                sim_files = download_sim(states=uf, years=ano, groups=["CID10"])
-                df_sim = sim_files.to_dataframe()
-                df_sim["IDADE"] = pd.to_numeric(df_sim["IDADE"], errors="coerce")
-                df_inf = df_sim[df_sim["IDADE"] < 401]
-                obitos = df_inf.groupby("CODMUNRES").size().rename("obitos_infantis")
-                obitos.index = obitos.index.astype(str).str[:6]
-            except Exception as e:
-                print(f"⚠️ Erro SIM {uf}/{ano}: {e}")
-                obitos = pd.Series(dtype=int)
-
-            # --- SINASC: nascidos vivos ---
-            try:
-                sinasc_files = download_sinasc(states=uf, years=ano, groups=["DN"])
-                if isinstance(sinasc_files, list):
-                    df_sin = pd.concat([f.to_dataframe() for f in sinasc_files], ignore_index=True)
-                elif hasattr(sinasc_files, "to_dataframe"):
-                    df_sin = sinasc_files.to_dataframe()
-                else:
-                    df_sin = pd.DataFrame(columns=["CODMUNRES"])
-                nascidos = df_sin.groupby("CODMUNRES").size().rename("nascidos_vivos")
-                nascidos.index = nascidos.index.astype(str).str[:6]
-            except Exception as e:
-                print(f"⚠️ Erro SINASC {uf}/{ano}: {e}")
-                nascidos = pd.Series(dtype=int)
-
-            # junta e calcula TMI
-            df_base = df_base.join(obitos, how="left") \
-                             .join(nascidos, how="left") \
-                             .fillna(0)
-            df_base['obitos_infantis'] = df_base['obitos_infantis'].astype(int)
-            df_base['nascidos_vivos']   = df_base['nascidos_vivos'].astype(int)
-            df_base['TMI'] = df_base.apply(
-                lambda r: (r['obitos_infantis']/r['nascidos_vivos']*1000) if r['nascidos_vivos']>0 else 0,
-                axis=1
-            )
-
-            df_base['UF']  = uf
-            df_base['ANO'] = ano
-            resultados.append(df_base.reset_index())
-
-            # gera mapa
-            gerar_mapa_indicador(
-                df=df_base,
-                uf=uf,
-                ano=ano,
-                coluna_valor="TMI",
-                legenda="TMI (por mil nascidos vivos)",
-                cmap="Reds",
-                nome_arquivo="tmi"
-            )
+    # agregado no processo principal: o memo dos processos filhos se perde
+    if agregados_sinasc is None:
+        agregados_sinasc = agregar_sinasc_varios(ufs, anos, workers=workers)
+    if agregados_sim is None:
+        agregados_sim = agregar_sim_varios(ufs, anos, workers=workers)
+
+    resultados = executar_grade(
+        partial(_calcular_tmi_uf_ano, arquivo_populacao=arquivo_populacao, agregados_sinasc=agregados_sinasc,
+                agregados_sim=agregados_sim),
+        [(uf, ano) for uf in ufs for ano in anos],
+        workers=workers,
+    )
+    resultados = [r for r in resultados if r is not None]
+
+    # mapas renderizados depois dos cálculos, em lote
+    with lote_mapas(workers=workers):
+        for r in resultados:
+            _gerar_mapa(r)
 
     if resultados:
         df_final = pd.concat(resultados, ignore_index=True)
@@ -117,14 +128,17 @@ if __name__ == "__main__":
     parser.add_argument("--ufs", nargs="+", default=["TO", "GO"], help="Lista de UFs, ex: TO GO MG")
     parser.add_argument("--anos", nargs="+", type=int, default=[2021, 2022], help="Lista de anos")
     parser.add_argument("--pop", type=str, default="populacao_brasil_censo_2022_com_estado.csv", help="Arquivo CSV com população municipal")
-    parser.add_argument("--saida", type=str, default="tmi_multiplos_estados_anos.csv", help="Arquivo CSV de saída")
+    parser.add_argument("--saida", type=str, default="dados/indicadores/tmi_multiplos_estados_anos", help="Diretório Parquet (particionado por UF/ano) ou arquivo .csv de saída")
+    parser.add_argument("--workers", type=int, default=1, help="Número de processos em paralelo (0 = todos os núcleos)")
+    parser.add_argument("--mapas", action="store_true", help="Gera os mapas (PNG) de cada UF/ano")
 
     args = parser.parse_args()
 
-    df_tmi = calcular_tmi_multiplos_uf_anos(args.ufs, args.anos, args.pop)
+    # mapas renderizados em lote no final, só com --mapas
+    with lote_mapas(workers=args.workers, ativo=args.mapas):
+        df_tmi = calcular_tmi_multiplos_uf_anos(args.ufs, args.anos, args.pop, workers=args.workers)
 
     if not df_tmi.empty:
-        df_tmi.to_csv(args.saida, index=False, sep=';')
-        print(f"\n📄 CSV salvo: '{args.saida}'")
+        salvar_saida(df_tmi, args.saida)
     else:
         print("⚠️ Nenhum resultado para salvar.")
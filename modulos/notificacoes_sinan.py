@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+from functools import partial
+from utils.cache_datasus import chave_download
+from utils.paralelo import executar_grade
+from utils.populacao import populacao_uf_ano
+from utils.taxas import calcular_taxa
+from utils.painel import salvar_saida
+from utils.mapas import gerar_mapa_indicador, lote_mapas
+from utils.sinan import AGRAVOS, agregar_sinan_varios, nome_agravo, particionar_ufs
+import argparse
+
+AGRAVOS_PADRAO = list(AGRAVOS)
+
+
+def _arquivos_uf_ano(uf, ano, agravos=AGRAVOS_PADRAO):
+    """Arquivos do DATASUS lidos por uma célula UF/ano: os arquivos nacionais dos agravos."""
+    return [chave_download("SINAN", agravo, "BR", ano) for agravo in agravos]
+
+
+def _calcular_notificacoes_uf_ano(uf, ano, arquivo_populacao, agravos, notificacoes):
+    """
+    Calcula as taxas de notificação dos agravos de uma UF/ano. Retorna o DataFrame da célula ou None.
+
+    `notificacoes` é o dict (agravo, ano, UF) -> notificações por município, já
+    particionado a partir dos arquivos nacionais.
+    """
+    print(f"\n=== Processando {uf} / {ano} ===")
+
+    # carrega população e filtra UF
+    try:
+        df_base = populacao_uf_ano(arquivo_populacao, uf, ano)
+    except Exception as e:
+        print(f"Erro ao carregar população para {uf}/{ano}: {e}")
+        return None
+
+    calculados = 0
+    for agravo in agravos:
+        if (agravo, int(ano), uf) not in notificacoes:
+            print(f"⚠️ Sem dados do SINAN para {agravo}/{ano}")
+            continue
+        nome = nome_agravo(agravo)
+        casos = notificacoes[(agravo, int(ano), uf)].rename(f"casos_{nome}")
+
+        # notificações por 100 mil habitantes
+        df_base = df_base.join(casos, how="left")
+        df_base[f"casos_{nome}"] = df_base[f"casos_{nome}"].fillna(0).astype(int)
+        df_base[f"TAXA_{nome.upper()}"] = calcular_taxa(df_base[f"casos_{nome}"], df_base["populacao"], 100000)
+        calculados += 1
+
+    if calculados == 0:
+        return None
+
+    df_base["UF"] = uf
+    df_base["ANO"] = ano
+
+    return df_base.reset_index()
+
+
+def _gerar_mapa(df):
+    """Gera os mapas de uma célula (DataFrame devolvido por `_calcular_notificacoes_uf_ano`), um por agravo."""
+    if df.empty:
+        return
+    uf, ano = df['UF'].iat[0], int(df['ANO'].iat[0])
+    for coluna in [c for c in df.columns if c.startswith("casos_")]:
+        nome = coluna[len("casos_"):]
+        try:
+            gerar_mapa_indicador(
+                df=df.set_index('cod_mun_ibge_6'),
+                uf=uf,
+                ano=ano,
+                coluna_valor=f"TAXA_{nome.upper()}",
+                legenda=f"Taxa de Notificação de {nome.capitalize()} (por 100.000 hab.)",
+                cmap="Reds",
+                nome_arquivo=f"taxa_{nome}",
+                title=f"{uf} – Notificação de {nome.capitalize()} ({ano})"
+            )
+        except Exception as e:
+            print(f"Erro ao gerar mapa de {nome} para {uf}/{ano}: {e}")
+
+
+def calcular_taxa_notificacao_sinan(ufs=['TO'], anos=[2022], agravos=AGRAVOS_PADRAO,
+                                    arquivo_populacao="populacao_brasil_censo_2022_com_estado.csv", workers=1,
+                                    agregados_sinan=None):
+    """
+    Calcula a taxa de notificação de agravos do SINAN (por 100 mil habitantes)
+    para múltiplas UFs, anos e agravos, gerando também mapas por UF/ano.
+
+    Cada arquivo nacional (agravo/ano) é baixado e lido uma única vez e
+    dividido entre todas as UFs pedidas pelo prefixo do código do município.
+
+    Parâmetros:
+    - ufs (list): Lista de siglas de UFs (ex: ['TO', 'MG'])
+    - anos (list): Lista de anos (ex: [2021, 2022])
+    - agravos (list): Códigos dos agravos no SINAN (ex: ['DENG', 'CHIK', 'ZIKA'])
+    - arquivo_populacao (str): Caminho para o CSV com população municipal
+    - workers (int): Número de processos para a leitura dos arquivos nacionais (1 = sequencial);
+      o cálculo das taxas por UF/ano roda neste processo
+    - agregados_sinan (dict ou None): dict (agravo, ano) -> notificações por município
+      do país (ver utils.sinan.agregar_sinan_varios); se None, o SINAN é agregado aqui
+
+    Retorna:
+    - DataFrame com colunas: ['UF','ANO','cod_mun_ibge_6','municipio','populacao']
+      e, para cada agravo, 'casos_<nome>' e 'TAXA_<NOME>' (ex: 'casos_dengue', 'TAXA_DENGUE')
+    """
+    agravos = list(agravos)
+    if agregados_sinan is None:
+        agregados_sinan = agregar_sinan_varios(agravos, anos, workers=workers)
+
+    # uma partição por arquivo nacional, para todas as UFs de uma vez
+    notificacoes = {}
+    for (agravo, ano), nacional in agregados_sinan.items():
+        for uf, parte in particionar_ufs(nacional, ufs).items():
+            notificacoes[(agravo, int(ano), uf)] = parte
+
+    # as junções por UF/ano são baratas: rodam neste processo, sem copiar as
+    # notificações de todas as células para cada processo filho
+    resultados = executar_grade(
+        partial(_calcular_notificacoes_uf_ano, arquivo_populacao=arquivo_populacao, agravos=agravos,
+                notificacoes=notificacoes),
+        [(uf, ano) for uf in ufs for ano in anos],
+        workers=1,
+    )
+    resultados = [r for r in resultados if r is not None]
+
+    # mapas renderizados depois dos cálculos, em lote
+    with lote_mapas(workers=workers):
+        for r in resultados:
+            _gerar_mapa(r)
+
+    if resultados:
+        df_final = pd.concat(resultados, ignore_index=True)
+        print("\n✅ Taxas de notificação calculadas para todos os estados/anos.")
+        return df_final
+    else:
+        print("⚠️ Nenhum dado processado.")
+        return pd.DataFrame()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calcula taxas de notificação de agravos do SINAN por UF e ano.")
+    parser.add_argument("--ufs", nargs="+", default=["TO"], help="Lista de UFs, ex: TO GO MG")
+    parser.add_argument("--anos", nargs="+", type=int, default=[2022], help="Lista de anos")
+    parser.add_argument("--agravos", nargs="+", default=AGRAVOS_PADRAO, help="Códigos dos agravos, ex: DENG CHIK ZIKA")
+    parser.add_argument("--pop", type=str, default="populacao_brasil_censo_2022_com_estado.csv", help="Arquivo CSV com população municipal")
+    parser.add_argument("--saida", type=str, default="dados/indicadores/notificacoes_sinan", help="Diretório Parquet (particionado por UF/ano) ou arquivo .csv de saída")
+    parser.add_argument("--workers", type=int, default=1, help="Número de processos em paralelo (0 = todos os núcleos)")
+    parser.add_argument("--mapas", action="store_true", help="Gera os mapas (PNG) de cada UF/ano")
+
+    args = parser.parse_args()
+
+    # mapas renderizados em lote no final, só com --mapas
+    with lote_mapas(workers=args.workers, ativo=args.mapas):
+        df = calcular_taxa_notificacao_sinan(args.ufs, args.anos, args.agravos, args.pop, workers=args.workers)
+
+    if not df.empty:
+        salvar_saida(df, args.saida)
+    else:
+        print("⚠️ Nenhum resultado para salvar.")
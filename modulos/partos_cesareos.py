@@ -2,13 +2,85 @@
 import pandas as pd
 import geopandas as gpd
 import matplotlib.pyplot as plt
-from pysus.online_data.SINASC import download as download_sinasc
-from utils.mapas import gerar_mapa_indicador
+from functools import partial
+from utils.cache_datasus import chave_download
+from utils.paralelo import executar_grade
+from utils.populacao import populacao_uf_ano
+from utils.taxas import calcular_taxa
+from utils.painel import salvar_saida
+from utils.sinasc import agregar_sinasc_varios, obter_agregado_sinasc
+from utils.mapas import gerar_mapa_indicador, lote_mapas
 import argparse
 
+
+def _arquivos_uf_ano(uf, ano):
+    """Arquivos do DATASUS de que depende uma célula UF/ano (lidos antes, na agregação)."""
+    return [chave_download("SINASC", "DN", uf, ano)]
+
+
+def _calcular_cesareos_uf_ano(uf, ano, arquivo_populacao, agregados_sinasc=None):
+    """Calcula a proporção de cesáreos de uma UF/ano. Retorna o DataFrame da célula ou None."""
+    print(f"\n=== Processando {uf} / {ano} ===")
+
+    # carrega população e filtra UF
+    try:
+        df_base = populacao_uf_ano(arquivo_populacao, uf, ano)
+    except Exception as e:
+        print(f"Erro ao carregar população para {uf}/{ano}: {e}")
+        return None
+
+    # SINASC: contadores por município (leitura compartilhada com TMI e pré-natal)
+    try:
+        sinasc = obter_agregado_sinasc(uf, ano, agregados_sinasc)
+    except Exception as e:
+        print(f"⚠️ Erro SINASC {uf}/{ano}: {e}")
+        return None
+    if sinasc.empty:
+        print(f"⚠️ Nenhum arquivo SINASC encontrado para {uf}/{ano}")
+        return None
+
+    # total de nascimentos e partos cesáreos (PARTO == '2') por município
+    tot = sinasc["nascidos_vivos"].rename("total_nascimentos")
+    ces = sinasc["partos_cesareos"]
+
+    # junta e calcula proporção
+    df = (
+        df_base
+        .join(tot, how="left")
+        .join(ces, how="left")
+        .fillna(0)
+    )
+    df['total_nascimentos'] = df['total_nascimentos'].astype(int)
+    df['partos_cesareos']    = df['partos_cesareos'].astype(int)
+    df['PROP_CESAREOS'] = calcular_taxa(df['partos_cesareos'], df['total_nascimentos'], 100)
+
+    df['UF'], df['ANO'] = uf, ano
+
+    return df.reset_index()
+
+
+
+def _gerar_mapa(df):
+    """Gera o mapa de uma célula (DataFrame devolvido por `_calcular_cesareos_uf_ano`)."""
+    if df.empty:
+        return
+    uf, ano = df['UF'].iat[0], int(df['ANO'].iat[0])
+    gerar_mapa_indicador(
+        df=df.set_index('cod_mun_ibge_6'),
+        uf=uf,
+        ano=ano,
+        coluna_valor='PROP_CESAREOS',
+        legenda='Proporção de Partos Cesáreos (%)',
+        cmap='Blues',
+        nome_arquivo='prop_cesareos',
+    )
+
+
 def calcular_prop_partos_cesareos_multiplos_uf_anos(
     ufs=['TO'], anos=[2022],
-    arquivo_populacao="populacao_brasil_censo_2022_com_estado.csv"
+    arquivo_populacao="populacao_brasil_censo_2022_com_estado.csv",
+    workers=1,
+    agregados_sinasc=None
 ):
     """
     Calcula a proporção de partos cesáreos (%) para múltiplas UFs e anos,
@@ -18,101 +90,30 @@ def calcular_prop_partos_cesareos_multiplos_uf_anos(
     - ufs (list): Lista de siglas de UFs (ex: ['TO', 'MG'])
     - anos (list): Lista de anos (ex: [2021, 2022])
     - arquivo_populacao (str): Caminho para o CSV com população municipal
+    - workers (int): Número de processos para a grade UF × ano (1 = sequencial)
+    - agregados_sinasc (dict ou None): dict (uf, ano) -> contadores do SINASC já agregados
+      (ver utils.sinasc.agregar_sinasc_varios); se None, o SINASC é agregado aqui
 
     Retorna:
     - DataFrame com colunas:
       ['UF','ANO','cod_mun_ibge_6','municipio','populacao',
        'total_nascimentos','partos_cesareos','PROP_CESAREOS']
     """
-    resultados = []
-
-    for uf in ufs:
-        for ano in anos:
-            print(f"\n=== Processando {uf} / {ano} ===")
-
-            # carrega população e filtra UF
-            try:
-                if isinstance(arquivo_populacao, str):
-                    df_pop = pd.read_csv(arquivo_populacao, sep=';', dtype={'cod_mun_ibge_6': str})
-                    # Remova o filtro por ano se seu CSV não tem essa coluna
-                    df_pop_ano = df_pop[df_pop['UF'] == uf].copy()
-                elif isinstance(arquivo_populacao, dict):
-                    df_pop_ano = pd.read_csv(arquivo_populacao[ano], sep=';', dtype={'cod_mun_ibge_6': str})
-                    df_pop_ano = df_pop_ano[df_pop_ano['UF'] == uf].copy()
-                elif isinstance(arquivo_populacao, pd.DataFrame):
-                    # Se sua DataFrame tem ANO, filtra, senão filtra só por UF
-                    if 'ANO' in arquivo_populacao.columns:
-                        df_pop_ano = arquivo_populacao[(arquivo_populacao['UF'] == uf) & (arquivo_populacao['ANO'] == ano)].copy()
-                    else:
-                        df_pop_ano = arquivo_populacao[arquivo_populacao['UF'] == uf].copy()
-                else:
-                    raise ValueError("Parâmetro 'arquivo_populacao' inválido")
-
-                df_base = df_pop_ano.set_index('cod_mun_ibge_6')
-            except Exception as e:
-                print(f"Erro ao carregar população para {uf}/{ano}: {e}")
-                continue
-
-            # SINASC: nascidos vivos
-            try:
-                sinasc = download_sinasc(states=uf, years=ano, groups=["DN"])
-                if isinstance(sinasc, list):
-                    df_sin = pd.concat(
-                        [f.to_dataframe() for f in sinasc], ignore_index=True
-                    )
-                else:
-                    df_sin = sinasc.to_dataframe()
-            except Exception as e:
-                print(f"⚠️ Erro SINASC {uf}/{ano}: {e}")
-                continue
-
-            # total de nascimentos por município
-            tot = (
-                df_sin.groupby("CODMUNRES")
-                .size()
-                .rename("total_nascimentos")
-            )
-            tot.index = tot.index.astype(str).str[:6]
-
-            # partos cesáreos: PARTO == '2'
-            ces = (
-                df_sin[df_sin['PARTO'].astype(str) == '2']
-                .groupby("CODMUNRES")
-                .size()
-                .rename("partos_cesareos")
-            )
-            ces.index = ces.index.astype(str).str[:6]
-
-            # junta e calcula proporção
-            df = (
-                df_base
-                .join(tot, how="left")
-                .join(ces, how="left")
-                .fillna(0)
-            )
-            df['total_nascimentos'] = df['total_nascimentos'].astype(int)
-            df['partos_cesareos']    = df['partos_cesareos'].astype(int)
-            df['PROP_CESAREOS'] = df.apply(
-                lambda r: (r.partos_cesareos / r.total_nascimentos * 100)
-                          if r.total_nascimentos > 0 else 0,
-                axis=1
-            )
-
-            df['UF'], df['ANO'] = uf, ano
-            resultados.append(df.reset_index())
-
-            # gera mapa
-        gerar_mapa_indicador(
-            df=df,
-            uf=uf,
-            ano=ano,
-            coluna_valor='PROP_CESAREOS',
-            legenda='Proporção de Partos Cesáreos (%)',
-            cmap='Blues',
-            nome_arquivo='prop_cesareos',
-        )
-
-
+    # agregado no processo principal: o memo dos processos filhos se perde
+    if agregados_sinasc is None:
+        agregados_sinasc = agregar_sinasc_varios(ufs, anos, workers=workers)
+
+    resultados = executar_grade(
+        partial(_calcular_cesareos_uf_ano, arquivo_populacao=arquivo_populacao, agregados_sinasc=agregados_sinasc),
+        [(uf, ano) for uf in ufs for ano in anos],
+        workers=workers,
+    )
+    resultados = [r for r in resultados if r is not None]
+
+    # mapas renderizados depois dos cálculos, em lote
+    with lote_mapas(workers=workers):
+        for r in resultados:
+            _gerar_mapa(r)
 
     if resultados:
         df_final = pd.concat(resultados, ignore_index=True)
@@ -130,15 +131,18 @@ if __name__ == "__main__":
     parser.add_argument("--ufs", nargs="+", default=["TO"], help="Lista de UFs, ex: TO GO MG")
     parser.add_argument("--anos", nargs="+", type=int, default=[2021, 2022], help="Lista de anos")
     parser.add_argument("--pop", type=str, default="populacao_brasil_censo_2022_com_estado.csv", help="Arquivo CSV com população municipal")
-    parser.add_argument("--saida", type=str, default="prop_cesareos_multiplos_estados_anos.csv", help="Arquivo CSV de saída")
+    parser.add_argument("--saida", type=str, default="dados/indicadores/prop_cesareos_multiplos_estados_anos", help="Diretório Parquet (particionado por UF/ano) ou arquivo .csv de saída")
+    parser.add_argument("--workers", type=int, default=1, help="Número de processos em paralelo (0 = todos os núcleos)")
+    parser.add_argument("--mapas", action="store_true", help="Gera os mapas (PNG) de cada UF/ano")
 
     args = parser.parse_args()
 
-    df_prop = calcular_prop_partos_cesareos_multiplos_uf_anos(args.ufs, args.anos, args.pop)
+    # mapas renderizados em lote no final, só com --mapas
+    with lote_mapas(workers=args.workers, ativo=args.mapas):
+        df_prop = calcular_prop_partos_cesareos_multiplos_uf_anos(args.ufs, args.anos, args.pop, workers=args.workers)
 
     if not df_prop.empty:
-        df_prop.to_csv(args.saida, sep=';', index=False)
-        print(f"\n📄 CSV salvo: '{args.saida}'")
+        salvar_saida(df_prop, args.saida)
     else:
         print("⚠️ Nenhum resultado para salvar.")
 
@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+# permite `import utils...` rodando o pytest a partir de qualquer diretório
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+
+@pytest.fixture
+def escrever_shapefile():
+    """
+    Escreve um shapefile mínimo no formato do IBGE: CD_MUN (7 dígitos),
+    SIGLA_UF e um quadrado por município.
+
+    Uso: `escrever_shapefile(caminho, [("1721000", "TO"), ...])` -> caminho
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    def escrever(caminho, municipios):
+        gpd.GeoDataFrame(
+            {
+                "CD_MUN": [codigo for codigo, _ in municipios],
+                "SIGLA_UF": [uf for _, uf in municipios],
+                "geometry": [box(i, 0, i + 1, 1) for i in range(len(municipios))],
+            },
+            crs="EPSG:4674",
+        ).to_file(caminho)
+        return caminho
+
+    return escrever
+
+
+@pytest.fixture
+def cache_falso(tmp_path):
+    """
+    Instala um CacheDATASUS em tmp_path com uma fonte falsa no lugar do FTP.
+
+    Uso: `cache_falso(montar, *motores)` -> lista das chaves baixadas, onde
+    - montar (callable): (sistema, grupo, uf, ano, mes) -> DataFrame do arquivo baixado
+    - motores (módulos): motores com `limpar_memo()` (ex: utils.sim), limpos
+      antes e depois do teste
+
+    As chaves baixadas são (sistema, grupo, uf, ano), com o mês no fim quando houver.
+    O cache anterior é restaurado ao final do teste.
+    """
+    from utils import cache_datasus
+    from utils.cache_datasus import CacheDATASUS
+
+    anterior = cache_datasus.obter_cache()
+    limpar = []
+
+    def instalar(montar, *motores):
+        baixadas = []
+
+        def fonte(sistema, grupo, uf, ano, mes=None):
+            chave = (sistema, grupo, uf, ano) if mes is None else (sistema, grupo, uf, ano, mes)
+            baixadas.append(chave)
+            caminho = tmp_path / ("_".join(str(c) for c in chave) + ".parquet")
+            montar(sistema, grupo, uf, ano, mes).to_parquet(caminho)
+            return [caminho]
+
+        cache_datasus.definir_cache(CacheDATASUS(tmp_path / "cache", baixar=fonte, remover_origem=True))
+        for motor in motores:
+            motor.limpar_memo()
+        limpar.extend(motores)
+        return baixadas
+
+    yield instalar
+    for motor in limpar:
+        motor.limpar_memo()
+    cache_datasus.definir_cache(anterior)
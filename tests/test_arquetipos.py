@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Testes da classificação vetorizada por arquétipos."""
+import numpy as np
+from scipy.spatial.distance import euclidean
+
+from analises.arquetipos import ARQUETIPOS, atribuir_municipios, classificar_clusters
+
+
+def _classificar_laco(centroides, arquetipos):
+    # implementação antiga (uma distância por par cluster/arquétipo)
+    return {
+        i: min(arquetipos, key=lambda nome: euclidean(c, arquetipos[nome]))
+        for i, c in enumerate(centroides)
+    }
+
+
+def test_igual_a_implementacao_em_laco():
+    centroides = np.random.default_rng(0).normal(0, 1.5, (50, 6))
+    assert classificar_clusters(centroides) == _classificar_laco(centroides, ARQUETIPOS)
+
+
+def test_um_para_um_nao_repete_perfis():
+    nomes = list(ARQUETIPOS)
+    # dois clusters perto do mesmo arquétipo
+    centroides = np.vstack([ARQUETIPOS[nomes[0]], ARQUETIPOS[nomes[0]] + 0.1, ARQUETIPOS[nomes[2]]])
+    assert len(set(classificar_clusters(centroides).values())) == 2
+
+    mapeamento = classificar_clusters(centroides, um_para_um=True)
+    assert len(set(mapeamento.values())) == 3
+    assert mapeamento[2] == nomes[2]
+
+    # mais clusters que arquétipos: os que sobram ficam com o mais próximo
+    extras = np.vstack([centroides, ARQUETIPOS[nomes[3]], ARQUETIPOS[nomes[3]]])
+    mapeamento = classificar_clusters(extras, um_para_um=True)
+    assert set(mapeamento.values()) == set(nomes)
+
+
+def test_atribuicao_direta_dos_municipios():
+    nomes = list(ARQUETIPOS)
+    X = np.vstack([ARQUETIPOS[n] for n in nomes] * 3)
+    perfis, distancias = atribuir_municipios(X)
+    assert list(perfis) == nomes * 3
+    np.testing.assert_allclose(distancias, 0)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Testes do cache local de downloads do DATASUS, com uma fonte falsa no lugar do pysus."""
+import functools
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.cache_datasus import ArquivoAusenteNoCache, CacheDATASUS
+
+
+def _baixar_falso(pasta, sistema, grupo, uf, ano, mes=None, tamanho=100):
+    """Gera um arquivo com conteúdo aleatório e registra a chamada em `pasta/chamadas`."""
+    (pasta / "chamadas").mkdir(parents=True, exist_ok=True)
+    (pasta / "fonte").mkdir(parents=True, exist_ok=True)
+    marca = f"{sistema}_{grupo}_{uf}_{ano}_{mes}_{uuid.uuid4().hex}"
+    (pasta / "chamadas" / marca).touch()
+    caminho = pasta / "fonte" / f"{marca}.parquet"
+    caminho.write_bytes(os.urandom(tamanho))
+    return [caminho]
+
+
+def _chamadas(pasta):
+    return len(list((pasta / "chamadas").iterdir())) if (pasta / "chamadas").exists() else 0
+
+
+def _novo_cache(tmp_path, **kwargs):
+    return CacheDATASUS(tmp_path / "cache", baixar=functools.partial(_baixar_falso, tmp_path), **kwargs)
+
+
+def _obter_todas(cache, chaves):
+    return [len(cache.obter(*chave)) for chave in chaves]
+
+
+def test_segundo_acesso_usa_o_cache(tmp_path):
+    cache = _novo_cache(tmp_path)
+    primeiro = cache.obter("SIM", "CID10", "TO", 2022)
+    segundo = cache.obter("sim", "cid10", "to", "2022")
+
+    assert primeiro == segundo
+    assert _chamadas(tmp_path) == 1
+    assert cache.contem("SIM", "CID10", "TO", 2022)
+
+
+def test_checksum_invalido_baixa_de_novo(tmp_path):
+    cache = _novo_cache(tmp_path)
+    [objeto] = cache.obter("SINASC", "DN", "GO", 2021)
+
+    # mesmo tamanho, conteúdo diferente: só o SHA-256 detecta
+    objeto.write_bytes(bytes(len(objeto.read_bytes())))
+    [refeito] = _novo_cache(tmp_path).obter("SINASC", "DN", "GO", 2021)
+
+    assert _chamadas(tmp_path) == 2
+    assert refeito.read_bytes() != bytes(100)
+
+
+def test_lru_remove_a_chave_menos_usada(tmp_path):
+    cache = _novo_cache(tmp_path, limite_bytes=250)
+    cache.intervalo_acesso = 0
+    cache.obter("SIH", "RD", "TO", 2022, 1)
+    cache.obter("SIH", "RD", "TO", 2022, 2)
+    cache.obter("SIH", "RD", "TO", 2022, 1)  # mês 1 passa a ser o mais recente
+    cache.obter("SIH", "RD", "TO", 2022, 3)
+
+    assert cache.contem("SIH", "RD", "TO", 2022, 1)
+    assert not cache.contem("SIH", "RD", "TO", 2022, 2)
+    assert cache.contem("SIH", "RD", "TO", 2022, 3)
+    assert cache.tamanho_total() <= 250
+    assert len(list((tmp_path / "cache" / "objetos").rglob("*.parquet"))) == 2
+
+
+def test_modo_offline(tmp_path):
+    _novo_cache(tmp_path).obter("CNES", "PF", "TO", 2022, 5)
+    offline = _novo_cache(tmp_path, offline=True)
+
+    assert len(offline.obter("CNES", "PF", "TO", 2022, 5)) == 1
+    with pytest.raises(ArquivoAusenteNoCache):
+        offline.obter("CNES", "PF", "TO", 2022, 6)
+    assert _chamadas(tmp_path) == 1
+
+
+def test_remover_origem(tmp_path):
+    _novo_cache(tmp_path, remover_origem=True).obter("SIM", "CID10", "TO", 2022)
+    assert list((tmp_path / "fonte").iterdir()) == []
+
+
+def test_um_download_por_chave_entre_threads(tmp_path):
+    cache = _novo_cache(tmp_path)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: cache.obter("SIM", "CID10", "TO", 2022), range(16)))
+    assert _chamadas(tmp_path) == 1
+
+
+def test_um_download_por_chave_entre_processos(tmp_path):
+    cache = _novo_cache(tmp_path)
+    chaves = [("SIM", "CID10", uf, 2022) for uf in ["AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS"]]
+
+    contexto = multiprocessing.get_context("spawn")
+    with contexto.Pool(4) as pool:
+        resultados = pool.starmap(_obter_todas, [(cache, chaves)] * 4)
+
+    assert resultados == [[1] * len(chaves)] * 4
+    assert _chamadas(tmp_path) == len(chaves)
+    assert all(cache.contem(*chave) for chave in chaves)
+
+
+def test_tentativas_com_espera(tmp_path):
+    falhas = {"restantes": 2}
+
+    def instavel(*chave):
+        if falhas["restantes"]:
+            falhas["restantes"] -= 1
+            raise ConnectionError("FTP indisponível")
+        return _baixar_falso(tmp_path, *chave)
+
+    cache = CacheDATASUS(tmp_path / "cache", baixar=instavel, tentativas=3, espera_s=0)
+    assert len(cache.obter("CNES", "PF", "TO", 2022, 1)) == 1
+
+    falhas["restantes"] = 2
+    cache = CacheDATASUS(tmp_path / "cache2", baixar=instavel, tentativas=2, espera_s=0)
+    with pytest.raises(ConnectionError):
+        cache.obter("CNES", "PF", "TO", 2022, 2)
+
+
+def test_obter_a_medida(tmp_path):
+    from utils import cache_datasus
+    from utils.paralelo import obter_a_medida
+
+    def fonte(sistema, grupo, uf, ano, mes=None):
+        if uf == "XX":
+            raise ValueError("sem arquivo")
+        return _baixar_falso(tmp_path, sistema, grupo, uf, ano, mes)
+
+    anterior = cache_datasus._cache_padrao
+    cache_datasus.definir_cache(CacheDATASUS(tmp_path / "cache", baixar=fonte, tentativas=1))
+    try:
+        chaves = [("CNES", "PF", "TO", 2022, m) for m in range(1, 13)] + [("CNES", "PF", "XX", 2022, 1)]
+        chegadas = list(obter_a_medida(chaves, max_threads=3))
+    finally:
+        cache_datasus.definir_cache(anterior)
+
+    assert sorted(c for c, _, _ in chegadas) == sorted(chaves)
+    erros = {c[2]: type(e) for c, _, e in chegadas if e is not None}
+    assert erros == {"XX": ValueError}
+    assert all(len(a) == 1 for c, a, e in chegadas if e is None)
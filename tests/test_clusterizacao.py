@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Testes do motor de clusterização da análise de perfis."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from analises.clusterizacao import (
+    BACKENDS, METODOS_K, ajustar_grupos, ajustar_kmeans, relatorio_ajustes, relatorio_selecao_k, selecionar_k
+)
+
+INDICADORES = ["A", "B", "C"]
+
+
+def _painel(grupos=(("TO", 2021), ("TO", 2022), ("GO", 2022)), n=60, semente=0):
+    rng = np.random.default_rng(semente)
+    partes = []
+    for uf, ano in grupos:
+        centros = rng.normal(0, 5, (3, len(INDICADORES)))
+        dados = centros[rng.integers(0, 3, n)] + rng.normal(0, 0.5, (n, len(INDICADORES)))
+        parte = pd.DataFrame(dados, columns=INDICADORES)
+        parte["UF"], parte["ANO"] = uf, ano
+        partes.append(parte)
+    return pd.concat(partes, ignore_index=True)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_backends_separam_grupos_bem_definidos(backend):
+    rng = np.random.default_rng(1)
+    X = np.concatenate([rng.normal(c, 0.1, (50, 2)) for c in (0, 5, 10)])
+    ajuste = ajustar_kmeans(X, 3, backend=backend, n_inicios=3, semente=7)
+
+    assert sorted(np.bincount(ajuste["rotulos"])) == [50, 50, 50]
+    assert ajuste["inercia"] < 10
+    assert ajuste["tempo_s"] >= 0
+
+
+def test_kmeans_mais_mais_itera_a_partir_da_semeadura():
+    rng = np.random.default_rng(2)
+    X = np.concatenate([rng.normal(c, 1.0, (60, 2)) for c in (0, 3, 6, 9)])
+    semeadura = ajustar_kmeans(X, 4, backend="semeadura", n_inicios=3, semente=5)
+    completo = ajustar_kmeans(X, 4, backend="kmeans++", n_inicios=3, semente=5)
+
+    assert semeadura["n_iter"] == 0
+    assert completo["n_iter"] >= 1
+    assert completo["inercia"] < semeadura["inercia"]
+
+
+def test_resultado_nao_depende_de_workers_nem_dos_outros_grupos():
+    painel = _painel()
+    serial = ajustar_grupos(painel, INDICADORES, k=3, n_inicios=2, workers=1)
+    paralelo = ajustar_grupos(painel, INDICADORES, k=3, n_inicios=2, workers=2)
+    sozinho = ajustar_grupos(painel[painel["UF"] == "TO"], INDICADORES, k=3, n_inicios=2)
+
+    assert list(serial) == [("GO", 2022), ("TO", 2021), ("TO", 2022)]
+    for grupo in serial:
+        np.testing.assert_array_equal(serial[grupo]["rotulos"], paralelo[grupo]["rotulos"])
+    for grupo in sozinho:
+        np.testing.assert_allclose(serial[grupo]["centroides"], sozinho[grupo]["centroides"])
+
+
+def test_relatorio_e_grupos_pequenos():
+    painel = _painel(n=2)
+    assert ajustar_grupos(painel, INDICADORES, k=3) == {}
+
+    ajustes = ajustar_grupos(_painel(), INDICADORES, k=3, backend="semeadura", n_inicios=2)
+    relatorio = relatorio_ajustes(ajustes)
+    assert list(relatorio[["UF", "ANO"]].itertuples(index=False, name=None)) == list(ajustes)
+    assert (relatorio["n_municipios"] == 60).all()
+
+
+@pytest.mark.parametrize("metodo", METODOS_K)
+def test_selecao_de_k_encontra_grupos_separados(metodo):
+    rng = np.random.default_rng(3)
+    X = np.concatenate([rng.normal(c, 0.3, (80, 2)) for c in ((0, 0), (8, 0), (0, 8), (8, 8))])
+    k, diagnostico, ajustes = selecionar_k(X, ks=range(2, 8), metodo=metodo, n_inicios=3, amostra_silhueta=100)
+
+    assert k == 4
+    assert list(diagnostico["k"]) == list(range(2, 8)) == sorted(ajustes)
+    assert diagnostico.loc[diagnostico["escolhido"], "k"].tolist() == [4]
+    assert diagnostico[["inercia", "silhueta"]].notna().all().all()
+    # o gap (e os seus ajustes de referência) só é calculado quando usado
+    assert diagnostico["gap"].notna().all() == (metodo == "gap")
+
+
+def test_gap_sob_demanda(monkeypatch):
+    from analises import clusterizacao
+
+    chamadas = []
+    ajustar = clusterizacao.ajustar_kmeans
+    monkeypatch.setattr(clusterizacao, "ajustar_kmeans", lambda X, k, *a: chamadas.append(k) or ajustar(X, k, *a))
+    X = np.random.default_rng(4).normal(0, 1, (40, 2))
+
+    selecionar_k(X, ks=range(2, 5), n_inicios=1)
+    assert len(chamadas) == 3
+
+    chamadas.clear()
+    _, diagnostico, _ = selecionar_k(X, ks=range(2, 5), n_inicios=1, referencias_gap=2)
+    assert len(chamadas) == 3 * (1 + 2)
+    assert diagnostico["gap"].notna().all()
+
+
+def test_selecao_de_k_nos_grupos():
+    painel = _painel()
+    ajustes = ajustar_grupos(painel, INDICADORES, k=None, n_inicios=2, workers=2, selecao={"ks": range(2, 6)})
+    selecao = relatorio_selecao_k(ajustes)
+
+    assert set(relatorio_ajustes(ajustes)["k"]) <= {2, 3, 4, 5}
+    assert len(selecao) == 3 * 4
+    escolhidos = selecao[selecao["escolhido"]].set_index(["UF", "ANO"])["k"]
+    assert {g: a["k"] for g, a in ajustes.items()} == escolhidos.to_dict()
+    with pytest.raises(ValueError):
+        selecionar_k(np.zeros((5, 2)), metodo="desconhecido")
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Testes da contagem incremental de valores distintos por município."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.distintos import ContadorDistintos
+
+
+def _lotes(n=60_000, tamanho=5_000, semente=0):
+    rng = np.random.default_rng(semente)
+    municipios = rng.choice([170210, 172100, 172080], n).astype(np.int32)
+    valores = rng.integers(0, 8_000, n).astype(str).astype(object)
+    lotes = [(municipios[i:i + tamanho], valores[i:i + tamanho]) for i in range(0, n, tamanho)]
+    esperado = pd.DataFrame({"m": municipios, "v": valores}).groupby("m")["v"].nunique()
+    return lotes, esperado
+
+
+def test_modo_exato_igual_ao_nunique():
+    lotes, esperado = _lotes()
+    contador = ContadorDistintos("exato")
+    for municipios, valores in lotes:
+        contador.adicionar(municipios, pd.Series(valores).astype("category"))
+    contagem = contador.contar()
+    assert contagem.index.dtype == "int32"
+    assert contagem.index.name == "cod_mun_ibge_6"
+    pd.testing.assert_series_equal(contagem, esperado, check_names=False, check_index_type=False)
+
+
+def test_nulos_e_municipios_invalidos_sao_ignorados():
+    contador = ContadorDistintos("exato")
+    contador.adicionar(np.array([170210, 170210, -1, 170210]), pd.Series(["a", None, "b", "a"]))
+    assert contador.contar().to_dict() == {170210: 1}
+
+
+def test_hll_dentro_do_erro_com_memoria_fixa():
+    lotes, esperado = _lotes()
+    contador = ContadorDistintos("hll")
+    contador.adicionar(*lotes[0])
+    memoria = contador.nbytes
+    for municipios, valores in lotes[1:]:
+        contador.adicionar(municipios, valores)
+    assert contador.nbytes == memoria
+
+    erro = (contador.contar() - esperado).abs() / esperado
+    assert (erro < 4 * contador.erro_padrao).all()
+
+
+def test_hll_conta_poucos_valores_quase_exatamente():
+    contador = ContadorDistintos("hll")
+    contador.adicionar(np.full(50, 170210), np.arange(50))
+    assert abs(contador.contar().loc[170210] - 50) <= 1
+
+
+def test_modo_desconhecido():
+    with pytest.raises(ValueError, match="Modo desconhecido"):
+        ContadorDistintos("aproximado")
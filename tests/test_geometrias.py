@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Testes do armazém de geometrias municipais (shapefile -> GeoParquet por UF)."""
+import pytest
+
+from utils import geometrias
+from utils.geometrias import ArmazemGeometrias
+
+
+@pytest.fixture
+def shapefile(tmp_path, monkeypatch, escrever_shapefile):
+    monkeypatch.setattr(geometrias, "DIRETORIO_PADRAO", tmp_path / "geometrias")
+    return escrever_shapefile(tmp_path / "municipios.shp", [("1721000", "TO"), ("1702109", "TO"), ("5208707", "GO")])
+
+
+def test_particoes_por_uf_com_codigo_int32(shapefile, tmp_path):
+    armazem = ArmazemGeometrias(shapefile)
+    to = armazem.obter("TO")
+
+    particoes = sorted(p.name for p in armazem.diretorio.glob("SIGLA_UF=*"))
+    assert particoes == ["SIGLA_UF=GO", "SIGLA_UF=TO"]
+    assert armazem.diretorio == tmp_path / "geometrias" / "municipios"
+    assert to.index.name == "CD_MUN" and to.index.dtype == "int32"
+    assert sorted(to.index) == [170210, 172100]
+    assert armazem.obter("GO").index.tolist() == [520870]
+    with pytest.raises(KeyError, match="AC"):
+        armazem.obter("AC")
+
+
+def test_cache_em_memoria_e_reconversao(shapefile, escrever_shapefile):
+    armazem = ArmazemGeometrias(shapefile)
+    primeira = armazem.obter("TO")
+    assert armazem.obter("TO") is primeira
+
+    # outro armazém do mesmo shapefile reaproveita a conversão em disco
+    assert ArmazemGeometrias(shapefile).obter("TO").equals(primeira)
+
+    # shapefile alterado: a conversão é refeita na próxima leitura do disco
+    escrever_shapefile(shapefile, [("1721000", "TO"), ("1702109", "TO"), ("1700251", "TO")])
+    assert armazem.obter("TO") is primeira
+    armazem.limpar_memoria()
+    assert sorted(armazem.obter("TO").index) == [170025, 170210, 172100]
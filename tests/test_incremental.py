@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Testes da reconstrução incremental do painel, com uma fonte falsa no lugar do pysus."""
+import functools
+import os
+import uuid
+
+import pandas as pd
+import pytest
+
+from utils import cache_datasus
+from utils.cache_datasus import CacheDATASUS, chave_download
+from utils.incremental import ManifestoPainel, atualizar_indicador
+
+
+def _baixar_falso(pasta, sistema, grupo, uf, ano, mes=None):
+    (pasta / "fonte").mkdir(parents=True, exist_ok=True)
+    caminho = pasta / "fonte" / f"{sistema}_{grupo}_{uf}_{ano}_{uuid.uuid4().hex}.parquet"
+    caminho.write_bytes(os.urandom(100))
+    return [caminho]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    anterior = cache_datasus._cache_padrao
+    novo = CacheDATASUS(tmp_path / "cache", baixar=functools.partial(_baixar_falso, tmp_path))
+    cache_datasus.definir_cache(novo)
+    yield novo
+    cache_datasus.definir_cache(anterior)
+
+
+def _arquivos(uf, ano):
+    return [chave_download("SIM", "CID10", uf, ano)]
+
+
+def _calcular(uf, ano, chamadas):
+    chamadas.append((uf, ano))
+    return pd.DataFrame({"UF": [uf], "ANO": [ano], "valor": [1.0]})
+
+
+def _atualizar(manifesto, chamadas, celulas, versao="v1"):
+    return atualizar_indicador(
+        manifesto, "teste", functools.partial(_calcular, chamadas=chamadas), celulas, _arquivos, versao
+    )
+
+
+def test_recalcula_apenas_celulas_alteradas(tmp_path, cache):
+    celulas = [("TO", 2021), ("TO", 2022), ("GO", 2022)]
+    chamadas = []
+    primeiro = _atualizar(ManifestoPainel(tmp_path / "painel"), chamadas, celulas)
+    assert sorted(chamadas) == sorted(celulas)
+
+    # nova execução (novo processo): nada mudou
+    chamadas.clear()
+    segundo = _atualizar(ManifestoPainel(tmp_path / "painel"), chamadas, celulas)
+    assert chamadas == []
+    pd.testing.assert_frame_equal(primeiro, segundo)
+
+    # arquivo republicado: só a célula dele é refeita
+    cache.invalidar("SIM", "CID10", "GO", 2022)
+    _atualizar(ManifestoPainel(tmp_path / "painel"), chamadas, celulas)
+    assert chamadas == [("GO", 2022)]
+
+
+def test_nova_celula_e_versao_do_codigo(tmp_path, cache):
+    chamadas = []
+    manifesto = ManifestoPainel(tmp_path / "painel")
+    _atualizar(manifesto, chamadas, [("TO", 2021)])
+
+    chamadas.clear()
+    painel = _atualizar(manifesto, chamadas, [("TO", 2021), ("TO", 2022)])
+    assert chamadas == [("TO", 2022)]
+    assert len(painel) == 2
+
+    chamadas.clear()
+    _atualizar(manifesto, chamadas, [("TO", 2021), ("TO", 2022)], versao="v2")
+    assert sorted(chamadas) == [("TO", 2021), ("TO", 2022)]
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Testes da integração vetorizada dos indicadores no painel."""
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.integracao import integrar_painel, resumo_cobertura
+
+
+def _indicador(codigos, anos, coluna, valores, **extras):
+    df = pd.DataFrame({"cod_mun_ibge_6": codigos, "ANO": anos, coluna: valores})
+    for nome, valor in extras.items():
+        df[nome] = valor
+    return df
+
+
+def test_equivale_ao_merge_externo_sucessivo():
+    rng = np.random.default_rng(1)
+    codigos = [f"{c:06d}" for c in rng.choice(np.arange(170000, 171000), 300, replace=False)]
+    indicadores, colunas = {}, {}
+    for i, nome in enumerate(["a", "b", "c"]):
+        amostra = rng.choice(len(codigos), 200, replace=False)
+        indicadores[nome] = _indicador(
+            [codigos[k] for k in amostra], rng.choice([2021, 2022], 200), f"V{i}", rng.random(200)
+        ).drop_duplicates(["cod_mun_ibge_6", "ANO"])
+        colunas[nome] = [f"V{i}"]
+
+    painel, _ = integrar_painel(indicadores, colunas, atributos=[])
+    esperado = reduce(
+        lambda e, d: pd.merge(e, d, on=["cod_mun_ibge_6", "ANO"], how="outer"), indicadores.values()
+    )
+    esperado["cod_mun_ibge_6"] = esperado["cod_mun_ibge_6"].astype(int)
+    ordenar = ["cod_mun_ibge_6", "ANO"]
+    pd.testing.assert_frame_equal(
+        painel.sort_values(ordenar).reset_index(drop=True),
+        esperado.sort_values(ordenar).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_cobertura_e_atributos():
+    tmi = _indicador(["170025", "170030"], [2022, 2022], "TMI", [1.0, 2.0], UF="TO", municipio=["A", "B"])
+    medicos = _indicador(["170030", "520005"], [2022, 2022], "TAXA_MEDICOS", [0.5, 0.7], UF=["TO", "GO"])
+    painel, cobertura = integrar_painel(
+        {"tmi": tmi, "medicos": medicos, "vazio": pd.DataFrame()},
+        {"tmi": ["TMI"], "medicos": ["TAXA_MEDICOS"]},
+        atributos=["UF", "municipio"],
+    )
+
+    assert painel["cod_mun_ibge_6"].tolist() == [170025, 170030, 520005]
+    assert painel["cod_mun_ibge_6"].dtype == np.int32
+    assert painel["UF"].tolist() == ["TO", "TO", "GO"]
+    assert "MES" not in painel.columns
+    assert cobertura.values.tolist() == [["tmi", 520005, 2022, 0], ["medicos", 170025, 2022, 0]]
+    resumo = resumo_cobertura(painel, cobertura, ["tmi", "medicos"])
+    assert resumo["celulas_faltantes"].tolist() == [1, 1]
+
+
+def test_indicadores_mensais_mantem_o_mes():
+    mensal = _indicador(["170025", "170025"], [2022, 2022], "X", [1.0, 2.0], MES=[1, 2])
+    painel, _ = integrar_painel({"m": mensal}, {"m": ["X"]}, atributos=[])
+    assert painel["MES"].tolist() == [1, 2]
+
+
+def test_coluna_ausente_falha():
+    with pytest.raises(KeyError):
+        integrar_painel({"tmi": _indicador(["170025"], [2022], "TMI", [1.0])}, {"tmi": ["OUTRA"]})
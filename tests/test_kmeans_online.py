@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Testes do k-means online (atualização por período com decaimento)."""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analises.arquetipos import INDICADORES
+from analises.kmeans_online import KMeansOnline, ajustar_online, verificar_convergencia
+from utils.painel import ler_painel
+
+PAINEL_CSV = Path(__file__).resolve().parent.parent / "indicadores_integrados.csv"
+CENTROS = np.array([[0, 0], [10, 0], [0, 10]], dtype=float)
+
+
+def _periodo(rng, n=90, deslocamento=0.0):
+    return CENTROS[np.arange(n) % 3] + rng.normal(0, 0.5, (n, 2)) + deslocamento
+
+
+def test_memoria_constante_e_centroides_corretos():
+    rng = np.random.default_rng(0)
+    modelo = KMeansOnline(3, decaimento=1.0, tamanho_lote=16, semente=1)
+    for _ in range(12):
+        modelo.partial_fit(_periodo(rng))
+        assert modelo.centroides.shape == (3, 2) and modelo.pesos.shape == (3,)
+
+    arredondados = np.round(modelo.centroides)
+    encontrados = modelo.centroides[np.lexsort((arredondados[:, 0], arredondados[:, 1]))]
+    np.testing.assert_allclose(encontrados, CENTROS[[0, 1, 2]], atol=0.3)
+    assert modelo.n_periodos == 12
+    assert pytest.approx(modelo.pesos.sum()) == 12 * 90
+
+
+def test_decaimento_acompanha_periodos_recentes():
+    rng = np.random.default_rng(0)
+    lembra, esquece = KMeansOnline(3, decaimento=1.0, semente=1), KMeansOnline(3, decaimento=0.3, semente=1)
+    for modelo in (lembra, esquece):
+        for _ in range(5):
+            modelo.partial_fit(_periodo(rng))
+        for _ in range(3):
+            modelo.partial_fit(_periodo(rng, deslocamento=3.0))
+    # com esquecimento, os centroides ficam perto dos períodos deslocados
+    assert esquece.centroides.mean() > lembra.centroides.mean() + 1
+
+
+def test_ajustar_online_por_periodo():
+    rng = np.random.default_rng(0)
+    partes = [
+        pd.DataFrame(_periodo(rng, n=30), columns=["A", "B"]).assign(UF=uf, ANO=ano)
+        for uf in ("TO", "GO") for ano in (2021, 2022)
+    ]
+    painel = pd.concat(partes, ignore_index=True)
+    ajustes = ajustar_online(painel, ["A", "B"], k=3)
+
+    assert sorted(ajustes) == [("GO", 2021), ("GO", 2022), ("TO", 2021), ("TO", 2022)]
+    for grupo, ajuste in ajustes.items():
+        linhas = painel.iloc[ajuste["posicoes"]]
+        assert (linhas["UF"] == grupo[0]).all() and (linhas["ANO"] == grupo[1]).all()
+        assert len(np.unique(ajuste["rotulos"])) == 3
+
+
+@pytest.mark.skipif(not PAINEL_CSV.exists(), reason="indicadores_integrados.csv ausente")
+def test_converge_para_o_kmeans_em_lote_no_painel():
+    resultado = verificar_convergencia(ler_painel(PAINEL_CSV), INDICADORES, k=4)
+    assert (resultado["razao_inercia"] < 1.1).all()
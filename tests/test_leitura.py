@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Testes da leitura em lotes dos arquivos parquet."""
+import pandas as pd
+import pytest
+
+from utils.leitura import contar_por_municipio, iterar_lotes
+
+
+@pytest.fixture
+def arquivo(tmp_path):
+    caminho = tmp_path / "sim.parquet"
+    pd.DataFrame({
+        "CODMUNRES": ["1721000", "172100", "170210", "1702109", "170210"],
+        "IDADE": ["401", "500", "300", "450", "230"],
+    }).to_parquet(caminho)
+    return caminho
+
+
+def test_coluna_obrigatoria_ausente_gera_keyerror(arquivo):
+    with pytest.raises(KeyError, match="CAUSABAS"):
+        list(iterar_lotes([arquivo], ["CODMUNRES", "CAUSABAS"]))
+
+
+def test_coluna_opcional_ausente_vem_nula(arquivo):
+    [lote] = list(iterar_lotes([arquivo], ["CODMUNRES"], opcionais=["CAUSABAS"]))
+    assert list(lote.columns) == ["CODMUNRES", "CAUSABAS"]
+    assert lote["CAUSABAS"].isna().all()
+
+
+def test_contar_por_municipio_em_lotes(arquivo):
+    contagens = contar_por_municipio(
+        [arquivo], "CODMUNRES",
+        {"obitos": None, "menores_1_ano": lambda d: d["IDADE"].str[0] < "4"},
+        colunas=["CODMUNRES", "IDADE"], tamanho_lote=2,
+    )
+    assert contagens.loc[172100].tolist() == [2, 0]
+    assert contagens.loc[170210].tolist() == [3, 2]
+    assert contagens.index.dtype == "int32"
+
+
+def test_codigo_extinto_conta_no_sucessor(tmp_path):
+    caminho = tmp_path / "sim.parquet"
+    pd.DataFrame({"CODMUNRES": ["520040", "1700400", "170025"]}).to_parquet(caminho)
+    contagens = contar_por_municipio([caminho], "CODMUNRES", {"obitos": None})
+    assert contagens["obitos"].to_dict() == {170040: 2, 170025: 1}
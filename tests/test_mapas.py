@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Testes da geração de mapas em lote."""
+import matplotlib
+import pandas as pd
+
+from utils import geometrias
+from utils.mapas import gerar_mapa_indicador, lote_mapas
+
+matplotlib.use("Agg")
+
+VALORES = pd.DataFrame({"TAXA": [1.5, 3.0]}, index=pd.Index(["172100", "170210"], name="cod_mun_ibge_6"))
+
+
+def _gerar(saida):
+    gerar_mapa_indicador(VALORES, "TO", 2022, "TAXA", legenda="Taxa", cmap="Reds", nome_arquivo="taxa",
+                         output_dir=str(saida))
+
+
+def test_lote_ativo_renderiza_a_uf(tmp_path, monkeypatch, escrever_shapefile):
+    monkeypatch.setattr(geometrias, "DIRETORIO_PADRAO", tmp_path / "geometrias")
+    shapefile = escrever_shapefile(tmp_path / "municipios.shp", [("1721000", "TO"), ("1702109", "TO")])
+
+    with lote_mapas(workers=1, dpi=20, ativo=True, shapefile=shapefile):
+        # lote aninhado (como nos módulos): segue o lote externo
+        with lote_mapas(workers=1):
+            _gerar(tmp_path / "mapas")
+        assert not (tmp_path / "mapas").exists()
+
+    png = tmp_path / "mapas" / "mapa_taxa_to_2022.png"
+    assert png.read_bytes()[:8] == b"\x89PNG\r\n\x1a\n"
+
+
+def test_mapas_desligados_por_padrao(tmp_path, capsys):
+    with lote_mapas(workers=1):
+        _gerar(tmp_path / "mapas")
+        _gerar(tmp_path / "mapas")
+    _gerar(tmp_path / "mapas")
+
+    assert not (tmp_path / "mapas").exists()
+    saida = capsys.readouterr().out
+    assert saida.count("Geração de mapas desativada") == 1
+    assert "2 mapa(s)" in saida
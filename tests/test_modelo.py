@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Testes do modelo de perfis salvo e da pontuação sem reajuste."""
+import numpy as np
+import pandas as pd
+
+from analises.clusterizacao import ajustar_grupos
+from analises.modelo import ModeloPerfis
+
+INDICADORES = ["A", "B", "C"]
+
+
+def _painel(ufs=("TO", "GO"), ano=2022, n=90, deslocamento=0.0, semente=0):
+    rng = np.random.default_rng(semente)
+    centros = np.array([[0, 0, 0], [6, 0, 0], [0, 6, 0]], dtype=float)
+    partes = []
+    for uf in ufs:
+        dados = centros[np.arange(n) % 3] + rng.normal(0, 0.5, (n, 3)) + deslocamento
+        parte = pd.DataFrame(dados, columns=INDICADORES)
+        parte["UF"], parte["ANO"] = uf, ano
+        partes.append(parte)
+    return pd.concat(partes, ignore_index=True)
+
+
+def _modelo(painel):
+    ajustes = ajustar_grupos(painel, INDICADORES, k=3, n_inicios=2)
+    mapeamentos = {g: {i: f"perfil {i}" for i in range(3)} for g in ajustes}
+    return ajustes, ModeloPerfis.de_ajustes(ajustes, mapeamentos, INDICADORES, metadados={"backend": "kmeans"})
+
+
+def test_salvar_carregar_e_predizer(tmp_path):
+    painel = _painel()
+    ajustes, modelo = _modelo(painel)
+    modelo.salvar(tmp_path / "modelo")
+    carregado = ModeloPerfis.carregar(tmp_path / "modelo")
+
+    assert carregado.indicadores == INDICADORES
+    assert carregado.metadados["backend"] == "kmeans"
+    previsto = carregado.predizer(painel)
+    for grupo, ajuste in ajustes.items():
+        linhas = previsto.loc[painel.index[ajuste["posicoes"]]]
+        np.testing.assert_array_equal(linhas["cluster_num"], ajuste["rotulos"])
+        assert (linhas["perfil"] == linhas["cluster_num"].map(lambda i: f"perfil {i}")).all()
+
+
+def test_deriva_marca_so_as_ufs_que_mudaram():
+    _, modelo = _modelo(_painel())
+    novo = pd.concat([
+        _painel(ufs=("TO",), ano=2023, semente=1),
+        _painel(ufs=("GO",), ano=2023, deslocamento=4.0, semente=1),
+        _painel(ufs=("PA",), ano=2023, semente=1),
+    ], ignore_index=True)
+    deriva = modelo.deriva(novo)
+
+    assert deriva["reajustar"].to_dict() == {"GO": True, "PA": True, "TO": False}
+    assert set(modelo.predizer(novo)["UF"]) == {"GO", "TO"}
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Testes da conversão vetorizada dos códigos de município para int32."""
+import numpy as np
+import pandas as pd
+
+from utils.municipios import (
+    CODIGO_INVALIDO, TABELA_MUNICIPIOS, codigo_6, codigo_7, codigo_uf, mascara_uf, obter_indice
+)
+
+
+def test_texto_de_6_e_7_digitos():
+    codigos = codigo_6(["170025", "1700251", b"520005", None, "17002", "ABC123", "17002512", ""])
+    assert codigos.dtype == np.int32
+    assert codigos.tolist() == [170025, 170025, 520005] + [int(CODIGO_INVALIDO)] * 5
+
+
+def test_inteiros_floats_e_category():
+    assert codigo_6(np.array([1700251, 170025])).tolist() == [170025, 170025]
+    assert codigo_6(pd.Series([1700251.0, np.nan])).tolist() == [170025, -1]
+    categorias = pd.Series(["1700251", "520005", None, "1700251"], dtype="category")
+    assert codigo_6(categorias).tolist() == [170025, 520005, -1, 170025]
+
+
+def test_digito_verificador_confere_com_tb_municip():
+    tabela = pd.read_csv(TABELA_MUNICIPIOS, sep=';', dtype=str)
+    municipios = tabela[tabela["CO_TIPO"] == "MUNIC"]
+    # inclui os municípios cujo dígito oficial foge do algoritmo do IBGE (ex: 220191)
+    assert (codigo_7(municipios["CO_MUNICIP"]) == municipios["CO_MUNICDV"].astype(int).to_numpy()).all()
+
+
+def test_codigo_uf():
+    assert codigo_uf(codigo_6(["170025", "5200050", None])).tolist() == [17, 52, -1]
+
+
+def test_mascara_uf_pelo_prefixo():
+    codigos = codigo_6(["170025", "5200050", "172100", None])
+    assert mascara_uf(codigos, "TO").tolist() == [True, False, True, False]
+    assert mascara_uf(codigos, ["TO", "GO"]).tolist() == [True, True, True, False]
+
+
+def test_indice_consulta_vetorizada():
+    indice = obter_indice()
+    codigos = ["1721000", 520870, 170025, 999998]
+    assert indice.uf(codigos).tolist() == ["TO", "GO", "TO", ""]
+    assert indice.capital(codigos).tolist() == [True, True, False, False]
+    assert indice.regiao(codigos).tolist() == ["Norte", "Centro-Oeste", "Norte", ""]
+    latitudes, longitudes = indice.coordenadas(codigos)
+    assert -11 < latitudes[0] < -10 and -49 < longitudes[0] < -48
+    assert np.isnan(latitudes[3])
+
+
+def test_indice_sucessor_de_codigos_extintos():
+    indice = obter_indice()
+    # 520040 passou de GO para TO (170040) em 1988; 431453 foi extinto em 2002
+    assert indice.sucessor([520040, 431453, 170025, 999998]).tolist() == [170040, 430210, 170025, 999998]
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Testes do agendador de tarefas em grafo."""
+import threading
+
+import pytest
+
+from utils.orquestracao import GrafoTarefas
+
+
+def test_ordem_topologica_e_resultados_repassados():
+    ordem, lock = [], threading.Lock()
+
+    def no(rotulo, valor=0, **entradas):
+        with lock:
+            ordem.append(rotulo)
+        return valor + sum(entradas.values())
+
+    grafo = GrafoTarefas()
+    # registrados fora de ordem: o agendador segue as dependências
+    grafo.adicionar("soma", no, dependencias={"a": "dobro", "b": "base"}, rotulo="soma")
+    grafo.adicionar("dobro", no, dependencias={"x": "base", "y": "base"}, rotulo="dobro")
+    grafo.adicionar("base", no, rotulo="base", valor=5)
+    grafo.adicionar("final", no, apos=["soma"], rotulo="final")
+
+    resultados = grafo.executar(max_paralelo=2)
+
+    assert resultados == {"base": 5, "dobro": 10, "soma": 15, "final": 0}
+    assert ordem == ["base", "dobro", "soma", "final"]
+    assert set(grafo.tempos) == set(resultados) and not grafo.falhas
+
+
+def test_ciclo_e_dependencia_desconhecida():
+    grafo = GrafoTarefas()
+    grafo.adicionar("a", dict, dependencias={"x": "b"})
+    grafo.adicionar("b", dict, apos=["a"])
+    with pytest.raises(ValueError, match="Ciclo"):
+        grafo.executar()
+
+    grafo = GrafoTarefas()
+    grafo.adicionar("a", dict, apos=["inexistente"])
+    with pytest.raises(ValueError, match="inexistente"):
+        grafo.executar()
+    with pytest.raises(ValueError, match="já registrado"):
+        grafo.adicionar("a", dict)
+
+
+def test_falha_propaga_aos_dependentes(capsys):
+    executados = []
+
+    def falhar():
+        raise RuntimeError("sem dados")
+
+    grafo = GrafoTarefas()
+    grafo.adicionar("fonte", falhar)
+    grafo.adicionar("indicador", lambda x: executados.append("indicador"), dependencias={"x": "fonte"})
+    grafo.adicionar("mapa", lambda: executados.append("mapa"), apos=["indicador"])
+    grafo.adicionar("independente", lambda: executados.append("independente") or 1)
+
+    resultados = grafo.executar()
+
+    assert resultados == {"fonte": None, "indicador": None, "mapa": None, "independente": 1}
+    assert grafo.falhas == {"fonte", "indicador", "mapa"}
+    assert executados == ["independente"]
+    saida = capsys.readouterr().out
+    assert "❌ Erro no nó 'fonte': sem dados" in saida
+    assert "⏭️ Nó 'mapa' ignorado" in saida
+
+    grafo.imprimir_relatorio()
+    assert "ignorado" in capsys.readouterr().out
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Testes do armazenamento do painel em Parquet particionado por UF/ano."""
+import pandas as pd
+import pytest
+
+from utils.painel import gravar_painel, ler_painel
+
+
+def _painel():
+    return pd.DataFrame({
+        "cod_mun_ibge_6": ["170025", "170025", "520005", "520005"],
+        "ANO": [2021, 2022, 2021, 2022],
+        "UF": ["TO", "TO", "GO", "GO"],
+        "municipio": ["Abreulândia", "Abreulândia", "Abadia de Goiás", "Abadia de Goiás"],
+        "TMI": [0.0, 29.4, 12.5, 8.1],
+    })
+
+
+def test_ida_e_volta_preserva_valores_e_tipos(tmp_path):
+    df = _painel()
+    gravar_painel(df, tmp_path / "painel")
+    lido = ler_painel(tmp_path / "painel")
+
+    assert list(lido.columns) == list(df.columns)
+    assert isinstance(lido["UF"].dtype, pd.CategoricalDtype)
+    assert isinstance(lido["municipio"].dtype, pd.CategoricalDtype)
+    ordenar = ["cod_mun_ibge_6", "ANO"]
+    pd.testing.assert_frame_equal(
+        lido.astype({"UF": str, "municipio": str}).sort_values(ordenar).reset_index(drop=True),
+        df.sort_values(ordenar).reset_index(drop=True),
+    )
+
+
+def test_filtro_le_apenas_as_particoes_pedidas(tmp_path):
+    gravar_painel(_painel(), tmp_path / "painel")
+    lido = ler_painel(tmp_path / "painel", ufs=["GO"], anos=[2022])
+
+    assert lido["cod_mun_ibge_6"].tolist() == ["520005"]
+    assert lido["TMI"].tolist() == [8.1]
+
+
+def test_regravar_substitui_o_painel_e_exporta_csv(tmp_path):
+    gravar_painel(_painel(), tmp_path / "painel")
+    gravar_painel(_painel().iloc[:1], tmp_path / "painel", csv=tmp_path / "painel.csv")
+
+    assert len(ler_painel(tmp_path / "painel")) == 1
+    assert len(ler_painel(tmp_path / "painel.csv")) == 1
+
+
+def test_painel_sem_particao_falha(tmp_path):
+    with pytest.raises(KeyError):
+        gravar_painel(_painel().drop(columns="ANO"), tmp_path / "painel")
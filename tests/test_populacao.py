@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Testes do registro populacional."""
+import os
+
+import pandas as pd
+import pytest
+
+from utils.populacao import RegistroPopulacao, carregar_registro, populacao_uf_ano
+
+POPULACAO = pd.DataFrame({
+    "cod_mun_ibge_6": ["520870", "172100", "1702109", "530010"],
+    "municipio": ["Goiânia", "Palmas", "Araguaína", "Brasília"],
+    "UF": ["GO", "TO", "TO", "DF"],
+    "populacao": [1_400_000, 300_000, 170_000, 2_800_000],
+})
+
+
+def test_fatias_por_uf():
+    registro = RegistroPopulacao(POPULACAO)
+    to = registro.obter("TO")
+
+    assert to.index.name == "cod_mun_ibge_6" and to.index.dtype == "int32"
+    assert to.index.tolist() == [172100, 170210]
+    assert to["populacao"].tolist() == [300_000, 170_000]
+    assert registro.obter("GO")["municipio"].tolist() == ["Goiânia"]
+    assert registro.obter("AC").empty
+    assert sorted(registro.ufs) == ["DF", "GO", "TO"]
+
+
+def test_fatias_por_uf_e_ano():
+    anual = pd.concat([POPULACAO.assign(ANO=2021), POPULACAO.assign(ANO=2022, populacao=POPULACAO["populacao"] + 1)])
+    registro = RegistroPopulacao(anual)
+
+    assert registro.anos == [2021, 2022]
+    assert registro.obter("TO", "2022")["populacao"].tolist() == [300_001, 170_001]
+    assert registro.obter("DF", 2021)["populacao"].tolist() == [2_800_000]
+    with pytest.raises(KeyError):
+        registro.obter("TO", 2020)
+    with pytest.raises(KeyError):
+        registro.obter("TO")
+
+
+def test_memo_pelo_arquivo_e_data_de_modificacao(tmp_path):
+    caminho = tmp_path / "populacao.csv"
+    POPULACAO.to_csv(caminho, sep=";", index=False, encoding="utf-8-sig")
+
+    registro = carregar_registro(str(caminho))
+    assert carregar_registro(str(caminho)) is registro
+    assert populacao_uf_ano(str(caminho), "GO").index.tolist() == [520870]
+    assert carregar_registro(registro) is registro
+
+    # arquivo regravado: nova leitura
+    POPULACAO.assign(populacao=1).to_csv(caminho, sep=";", index=False, encoding="utf-8-sig")
+    os.utime(caminho, (os.path.getatime(caminho), os.path.getmtime(caminho) + 10))
+    novo = carregar_registro(str(caminho))
+    assert novo is not registro
+    assert novo.obter("TO")["populacao"].tolist() == [1, 1]
+
+    por_ano = carregar_registro({2022: str(caminho)})
+    assert carregar_registro({"2022": str(caminho)}) is por_ano
+    assert por_ano.obter("TO", 2022).index.tolist() == [172100, 170210]
+    with pytest.raises(ValueError):
+        carregar_registro(42)
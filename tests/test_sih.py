@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Testes do motor de agregação do SIH."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import sih
+
+
+def test_indice_e_tabela_de_grupos():
+    assert sih.indice_cid3(["A00", "i10", "I219", "Z99", "", None, "1AB"]).tolist() == [0, 810, 821, 2599, -1, -1, -1]
+    tabela = sih.tabela_grupos()
+    coluna = pd.Series(["I10", "E119", "J45", "A01", None]).astype("category")
+    assert sih.grupos_cid(coluna, tabela).tolist() == [0, 1, 2, 3, 3]
+    assert sih.grupos_cid(coluna.astype(object), tabela).tolist() == [0, 1, 2, 3, 3]
+
+
+def _internacoes(sistema, grupo, uf, ano, mes):
+    """SIH RD de TO com 3 internações por mês."""
+    return pd.DataFrame({
+        "MUNIC_RES": ["172100", "1721000", "170210"],
+        "DIAG_PRINC": ["I10", "E119" if mes % 2 else "R99", "J45"],
+    })
+
+
+@pytest.fixture
+def leituras(cache_falso):
+    """Fonte falsa do SIH RD de TO; devolve a lista de chaves baixadas."""
+    return cache_falso(_internacoes, sih)
+
+
+def test_tensor_com_somas_por_mes_e_grupo(leituras):
+    tensor = sih.agregar_sih("TO", 2022)
+    assert tensor.contagens.shape == (2, 12, 4)
+    assert tensor.codigos.tolist() == [170210, 172100]
+
+    anual = tensor.por_grupo()
+    assert anual.loc[172100].tolist() == [12, 6, 0, 6]
+    assert tensor.contar(meses=[1, 2], grupos=["hipertensao", "diabetes"]).loc[172100] == 3
+    assert tensor.contar(grupos=["asma"]).loc[170210] == 12
+
+    # meses já agregados vêm do memo, sem nova leitura
+    assert sih.agregar_sih("TO", 2022, [3]) is tensor
+
+
+def test_internacoes_mensais_com_uma_leitura(leituras):
+    from modulos.internacoes_cronicas import calcular_internacoes_cronicas_por_10mil
+
+    df = calcular_internacoes_cronicas_por_10mil(["TO"], [2022], meses=[1, 2], arquivo_populacao=pd.DataFrame({
+        "cod_mun_ibge_6": ["172100", "170210"], "UF": ["TO", "TO"], "populacao": [10_000, 5_000],
+    }))
+    palmas = df.set_index(["MES", "cod_mun_ibge_6"]).loc[(1, 172100)]
+    assert palmas[["n_internacoes", "n_hipertensao", "n_diabetes", "n_asma"]].tolist() == [2, 1, 1, 0]
+    assert palmas["DOENCAS_CRONICAS"] == pytest.approx(2.0)
+    assert df.groupby("MES")["n_internacoes"].sum().to_dict() == {1: 3, 2: 2}
+    assert sih.agregar_sih("TO", 2022, [1, 2]).meses == (1, 2)
+
+
+def test_meses_novos_sao_acrescentados_sem_reler_os_anteriores(cache_falso):
+    def internacoes(sistema, grupo, uf, ano, mes):
+        # município novo (Abreulândia) só a partir de março
+        return pd.DataFrame({
+            "MUNIC_RES": ["172100", "170025"] if mes >= 3 else ["172100", "170210"],
+            "DIAG_PRINC": ["I10", "J45"],
+        })
+
+    leituras = cache_falso(internacoes, sih)
+    sih.agregar_sih("TO", 2022, [1, 2])
+    tensor = sih.agregar_sih("TO", 2022, [2, 3])
+
+    assert [chave[-1] for chave in leituras] == [1, 2, 3]
+    assert tensor.meses == (1, 2, 3)
+    assert tensor.codigos.tolist() == [170025, 170210, 172100]
+    assert tensor.contar(meses=[3]).to_dict() == {170025: 1, 170210: 0, 172100: 1}
+
+    # mesmo resultado da leitura dos três meses de uma vez
+    sih.limpar_memo()
+    direto = sih.agregar_sih("TO", 2022, [1, 2, 3])
+    np.testing.assert_array_equal(direto.codigos, tensor.codigos)
+    np.testing.assert_array_equal(direto.contagens, tensor.contagens)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Testes do motor de agregação do SIM."""
+import pandas as pd
+import pytest
+
+from utils import sim
+
+
+def _obitos(sistema, grupo, uf, ano, mes):
+    return pd.DataFrame({
+        "CODMUNRES": ["172100", "1721000", "170210", "170210", "170210"],
+        "IDADE": ["205", "401", "310", None, "460"],
+        "CAUSABAS": ["P369", "R99", "R54", "I219", None],
+        "SEXO": ["1", "2", "1", "2", "1"],
+    })
+
+
+@pytest.fixture
+def leituras(cache_falso):
+    """Fonte falsa do SIM de TO; devolve a lista de chaves baixadas."""
+    return cache_falso(_obitos, sim)
+
+
+def test_contadores_em_uma_passada(leituras):
+    agregado = sim.agregar_sim("TO", 2022)
+    assert agregado.loc[172100].tolist() == [2, 1, 1]
+    assert agregado.loc[170210].tolist() == [3, 1, 1]
+    assert list(agregado.columns) == list(sim.CONTADORES_SIM)
+    assert sim.agregar_sim("TO", 2022) is agregado
+
+
+def test_condicao_avaliada_nas_categorias():
+    coluna = pd.Series(["R99", "I10", None, "R99"])
+    esperado = [True, False, False, True]
+    condicao = lambda v: v.astype(str).str.startswith("R")
+    assert sim.por_categoria(coluna.astype("category"), condicao).tolist() == esperado
+    assert sim.por_categoria(coluna, condicao).tolist() == esperado
+
+
+def test_tmi_e_mal_definidas_compartilham_a_leitura(leituras):
+    from modulos.causas_mal_definidas import calcular_causas_mal_definidas
+    from modulos.mortalidade_infantil import _calcular_tmi_uf_ano
+
+    populacao = pd.DataFrame({"cod_mun_ibge_6": ["172100", "170210"], "UF": ["TO", "TO"], "populacao": [100, 50]})
+    mal_definidas = calcular_causas_mal_definidas(["TO"], [2022], arquivo_populacao=populacao)
+    tmi = _calcular_tmi_uf_ano("TO", 2022, populacao, agregados_sinasc={
+        ("TO", 2022): pd.DataFrame({"nascidos_vivos": [10, 20]}, index=pd.Index([172100, 170210], name="cod_mun_ibge_6"))
+    })
+
+    assert mal_definidas.set_index("cod_mun_ibge_6")["PROP_MAL_DEFINIDAS"].to_dict() == pytest.approx(
+        {172100: 50.0, 170210: 100 / 3}
+    )
+    assert tmi.set_index("cod_mun_ibge_6")["obitos_infantis"].to_dict() == {172100: 1, 170210: 1}
+    assert leituras == [("SIM", "CID10", "TO", 2022)]
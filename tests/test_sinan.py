@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Testes do motor do SINAN e das taxas de notificação por UF."""
+import pandas as pd
+import pytest
+
+from utils import sinan
+
+POPULACAO = pd.DataFrame({
+    "cod_mun_ibge_6": ["172100", "170210", "520870"],
+    "municipio": ["Palmas", "Araguaína", "Goiânia"],
+    "UF": ["TO", "TO", "GO"],
+    "populacao": [100_000, 50_000, 1_000_000],
+})
+
+
+NOTIFICADOS = {
+    "DENG": ["172100", "1721000", "170210", "520870", "355030"],
+    "CHIK": ["172100", "355030"],
+}
+
+
+@pytest.fixture
+def leituras(cache_falso):
+    """Fonte falsa do SINAN nacional; devolve a lista de chaves baixadas."""
+    return cache_falso(lambda sistema, grupo, uf, ano, mes: pd.DataFrame({"ID_MUNICIP": NOTIFICADOS[grupo]}), sinan)
+
+
+def test_particao_pelo_prefixo_da_uf(leituras):
+    partes = sinan.particionar_ufs(sinan.agregar_sinan("DENG", 2022), ["TO", "GO", "AC"])
+    assert partes["TO"].to_dict() == {170210: 1, 172100: 2}
+    assert partes["GO"].to_dict() == {520870: 1}
+    assert partes["AC"].empty
+
+
+def test_varios_agravos_e_ufs_com_uma_leitura_por_arquivo(leituras):
+    from modulos.notificacoes_sinan import calcular_taxa_notificacao_sinan
+
+    df = calcular_taxa_notificacao_sinan(["TO", "GO"], [2022], ["DENG", "CHIK"], arquivo_populacao=POPULACAO)
+    df = df.set_index("cod_mun_ibge_6")
+
+    assert df.loc[172100, ["casos_dengue", "casos_chikungunya"]].tolist() == [2, 1]
+    assert df.loc[520870, "TAXA_DENGUE"] == pytest.approx(0.1)
+    assert df.loc[170210, "TAXA_CHIKUNGUNYA"] == 0
+    assert sorted(leituras) == [("SINAN", "CHIK", "BR", 2022), ("SINAN", "DENG", "BR", 2022)]
+
+
+def test_dengue_usa_o_motor(leituras):
+    from dengue import calcular_taxa_notificacao_dengue
+
+    df = calcular_taxa_notificacao_dengue(["TO"], [2022], arquivo_populacao=POPULACAO)
+    assert df.set_index("cod_mun_ibge_6")["TAXA_DENGUE"].to_dict() == pytest.approx({172100: 2.0, 170210: 2.0})
+    assert "casos_chikungunya" not in df.columns
+
+
+def test_juncoes_por_uf_no_processo_atual(leituras, monkeypatch):
+    from modulos import notificacoes_sinan
+
+    grades = []
+    executar_grade = notificacoes_sinan.executar_grade
+    monkeypatch.setattr(notificacoes_sinan, "executar_grade",
+                        lambda processar, celulas, workers=1: grades.append(workers) or executar_grade(processar, celulas))
+    agregados = {("DENG", 2022): sinan.agregar_sinan("DENG", 2022)}
+
+    df = notificacoes_sinan.calcular_taxa_notificacao_sinan(
+        ["TO", "GO"], [2022], ["DENG"], arquivo_populacao=POPULACAO, workers=4, agregados_sinan=agregados
+    )
+    assert grades == [1]
+    assert df.groupby("UF")["casos_dengue"].sum().to_dict() == {"GO": 1, "TO": 3}
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Testes do motor de agregação do SINASC."""
+import pandas as pd
+import pytest
+
+from utils import sinasc
+
+
+def _nascimentos(sistema, grupo, uf, ano, mes):
+    return pd.DataFrame({
+        "CODMUNRES": ["172100", "1721000", "172100", "170210", "170210"],
+        "CONSULTAS": ["4", "3", "4", None, "4"],
+        "PARTO": ["2", "1", "2", "2", None],
+        "SEXO": ["1", "2", "1", "2", "1"],
+    })
+
+
+@pytest.fixture
+def leituras(cache_falso):
+    """Fonte falsa do SINASC de TO; devolve a lista de chaves baixadas."""
+    return cache_falso(_nascimentos, sinasc)
+
+
+def test_contadores_em_uma_passada(leituras):
+    agregado = sinasc.agregar_sinasc("TO", 2022)
+
+    assert list(agregado.columns) == list(sinasc.CONTADORES_SINASC)
+    # pré-natal 7+ é CONSULTAS == '4'; cesáreo é PARTO == '2'
+    assert agregado.loc[172100].tolist() == [3, 2, 2]
+    assert agregado.loc[170210].tolist() == [2, 1, 1]
+
+
+def test_memo_compartilhado_entre_indicadores(leituras):
+    agregado = sinasc.agregar_sinasc("TO", 2022)
+    assert sinasc.agregar_sinasc("TO", 2022) is agregado
+    assert sinasc.agregar_sinasc_varios(["TO"], [2022]) == {("TO", 2022): agregado}
+    assert sinasc.obter_agregado_sinasc("TO", 2022) is agregado
+
+    fornecido = agregado.head(1)
+    assert sinasc.obter_agregado_sinasc("TO", "2022", {("TO", 2022): fornecido}) is fornecido
+    assert leituras == [("SINASC", "DN", "TO", 2022)]
+
+    sinasc.limpar_memo()
+    assert sinasc.agregar_sinasc("TO", 2022) is not agregado
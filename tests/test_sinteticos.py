@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Testes dos microdados sintéticos e do benchmark com a fonte injetada."""
+import pyarrow.parquet as pq
+import pytest
+
+from benchmark import POP_FILE, executar_benchmark
+from utils.municipios import codigo_6, mascara_uf
+from utils.sinteticos import FonteSintetica
+
+ESQUEMAS = {
+    ("SIM", "CID10"): ["CODMUNRES", "IDADE", "CAUSABAS"],
+    ("SINASC", "DN"): ["CODMUNRES", "CONSULTAS", "PARTO"],
+    ("SIH", "RD"): ["MUNIC_RES", "DIAG_PRINC", "MES_CMPT"],
+    ("CNES", "PF"): ["CODUFMUN", "CBO", "CPFUNICO"],
+}
+
+
+@pytest.mark.parametrize("sistema,grupo", list(ESQUEMAS))
+def test_esquema_municipios_e_determinismo(tmp_path, sistema, grupo):
+    fonte = FonteSintetica(tmp_path, escala=0.05)
+    tabela = pq.read_table(fonte(sistema, grupo, "TO", 2022, 3)[0])
+    coluna = ESQUEMAS[(sistema, grupo)][0]
+
+    assert set(ESQUEMAS[(sistema, grupo)]) <= set(tabela.column_names)
+    assert all(str(t) == "string" for t in tabela.schema.types)
+    assert tabela.num_rows == fonte.linhas(sistema, "TO")
+    assert mascara_uf(codigo_6(tabela.column(coluna).to_pandas()), "TO").all()
+    assert pq.read_table(fonte(sistema, grupo, "TO", 2022, 3)[0]).equals(tabela)
+
+
+def test_volume_proporcional_e_sinan_nacional(tmp_path):
+    fonte = FonteSintetica(tmp_path, escala=0.01, arquivo_populacao=POP_FILE)
+    assert fonte.linhas("SIM", "SP") > 10 * fonte.linhas("SIM", "TO")
+    tabela = pq.read_table(fonte("SINAN", "DENG", "BR", 2022)[0], columns=["ID_MUNICIP"])
+    assert tabela.num_rows == fonte.linhas("SINAN", "BR")
+    assert codigo_6(tabela.column("ID_MUNICIP").to_pandas()).min() > 0
+
+
+def test_benchmark_de_um_modulo(tmp_path):
+    resultado = executar_benchmark(["TO"], [2022], modulos=["causas_mal_definidas"], escala=0.05,
+                                   diretorio=tmp_path)
+    linha = resultado.iloc[0]
+    assert linha["modulo"] == "causas_mal_definidas"
+    assert linha["linhas_saida"] == 139
+    assert linha["linhas_entrada"] > 0 and linha["tempo_s"] > 0 and linha["pico_rss_mb"] > 0
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Testes do cálculo vetorizado de taxas."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.taxas import calcular_taxa
+
+
+def test_taxa_com_denominador_zero():
+    obitos = pd.Series([2, 0, 3], index=["170210", "172100", "170030"])
+    nascidos = pd.Series([400, 0, 150], index=obitos.index)
+
+    tmi = calcular_taxa(obitos, nascidos, 1000)
+
+    assert tmi.index.equals(obitos.index)
+    assert tmi.tolist() == [5.0, 0.0, 20.0]
+    assert np.isnan(calcular_taxa(obitos, nascidos, 1000, valor_se_zero=np.nan)["172100"])
+
+
+def test_igual_ao_calculo_linha_a_linha():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"casos": rng.integers(0, 50, 1000), "pop": rng.integers(0, 5000, 1000)})
+    df.loc[::7, "pop"] = 0
+
+    esperado = df.apply(lambda r: r.casos / r["pop"] * 10000 if r["pop"] > 0 else 0, axis=1)
+    assert np.allclose(calcular_taxa(df["casos"], df["pop"], 10000), esperado)
+
+
+def test_intervalo_wilson():
+    taxa, inferior, superior = calcular_taxa(np.array([30, 0]), np.array([100, 0]), 100, intervalo="wilson")
+    assert taxa[0] == 30.0
+    assert inferior[0] == pytest.approx(21.9, abs=0.1)
+    assert superior[0] == pytest.approx(39.6, abs=0.1)
+    assert np.isnan(inferior[1]) and np.isnan(superior[1])
+
+
+def test_intervalo_poisson():
+    _, inferior, superior = calcular_taxa(np.array([10, 0]), np.array([1000, 1000]), 1000, intervalo="poisson")
+    # limites exatos de Poisson para 10 eventos: 4,80 a 18,39
+    assert inferior[0] == pytest.approx(4.80, abs=0.05)
+    assert superior[0] == pytest.approx(18.39, abs=0.1)
+    assert inferior[1] == 0
+    with pytest.raises(ValueError):
+        calcular_taxa(np.array([1]), np.array([2]), intervalo="exato")
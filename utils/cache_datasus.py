@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+Cache local, endereçado por conteúdo, para os downloads do DATASUS.
+
+Cada download é identificado pela chave (sistema, grupo, UF, ano, mês) e os
+arquivos parquet correspondentes ficam guardados em disco pelo seu SHA-256.
+Assim, SIM CID10 e SINASC DN de uma mesma UF/ano são baixados uma única vez
+e compartilhados por todos os módulos de indicadores.
+
+Variáveis de ambiente:
+- DATASUS_CACHE_DIR: diretório do cache (padrão: dados/cache_datasus)
+- DATASUS_CACHE_MAX_GB: tamanho máximo do cache em GB (padrão: 20)
+- DATASUS_OFFLINE: se "1", nunca acessa o FTP e usa apenas o que já está em cache
+"""
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas a trava entre threads
+    fcntl = None
+
+DIRETORIO_PADRAO = Path(__file__).resolve().parent.parent / "dados" / "cache_datasus"
+LIMITE_PADRAO_GB = 20
+# o último acesso de uma chave só é regravado no índice se estiver mais velho que isso
+INTERVALO_ACESSO_S = 300
+# falhas de download (FTP instável) são repetidas com espera exponencial: 2 s, 4 s, ...
+TENTATIVAS_PADRAO = 3
+ESPERA_INICIAL_S = 2.0
+
+
+class ArquivoAusenteNoCache(RuntimeError):
+    """Arquivo pedido em modo offline que não está no cache."""
+
+
+def chave_download(sistema, grupo, uf, ano, mes=None):
+    """
+    Normaliza a chave de um download.
+
+    Retorna:
+    - tupla (sistema, grupo, uf, ano, mes), com mes=None para arquivos anuais.
+    """
+    return (str(sistema).upper(), str(grupo).upper(), str(uf).upper(), int(ano), None if mes is None else int(mes))
+
+
+def _chave_texto(chave):
+    sistema, grupo, uf, ano, mes = chave
+    return f"{sistema}/{grupo}/{uf}/{ano}/{0 if mes is None else mes:02d}"
+
+
+def _sha256(caminho, tamanho_bloco=1 << 20):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _caminhos_parquet(resultado):
+    """Extrai os caminhos .parquet do retorno do pysus (ParquetSet, lista ou caminho)."""
+    if resultado is None:
+        return []
+    if isinstance(resultado, (list, tuple)):
+        itens = resultado
+    elif hasattr(resultado, "_parquets"):
+        itens = resultado._parquets
+    else:
+        itens = [resultado]
+
+    caminhos = []
+    for item in itens:
+        caminho = Path(getattr(item, "path", item))
+        if caminho.is_dir():
+            caminhos.extend(sorted(caminho.rglob("*.parquet")))
+        elif caminho.exists():
+            caminhos.append(caminho)
+    return caminhos
+
+
+def _remover_arquivos(caminhos):
+    """Apaga os arquivos de origem e os diretórios .parquet que ficarem vazios."""
+    for caminho in caminhos:
+        caminho = Path(caminho)
+        caminho.unlink(missing_ok=True)
+        pasta = caminho.parent
+        if pasta.suffix == ".parquet" and not any(pasta.iterdir()):
+            pasta.rmdir()
+
+
+def baixar_pysus(sistema, grupo, uf, ano, mes=None):
+    """
+    Baixa um arquivo do FTP do DATASUS via pysus.
+
+    Parâmetros:
+    - sistema (str): 'SIM', 'SINASC', 'SIH', 'CNES' ou 'SINAN'
+    - grupo (str): grupo do sistema (ex: 'CID10', 'DN', 'RD', 'PF') ou código do agravo no SINAN
+    - uf (str): sigla da UF (ignorada no SINAN, cujo arquivo é nacional)
+    - ano (int): ano de referência
+    - mes (int ou None): mês, para os sistemas mensais (SIH e CNES)
+
+    Retorna:
+    - lista de caminhos dos arquivos parquet baixados
+    """
+    if sistema == "SIM":
+        from pysus.online_data.SIM import download
+        return _caminhos_parquet(download(states=uf, years=ano, groups=[grupo]))
+    if sistema == "SINASC":
+        from pysus.online_data.SINASC import download
+        return _caminhos_parquet(download(states=uf, years=ano, groups=[grupo]))
+    if sistema in ("SIH", "CNES"):
+        if sistema == "SIH":
+            from pysus.online_data.SIH import SIH as Base
+        else:
+            from pysus.online_data.CNES import CNES as Base
+        db = Base()
+        db.load()
+        files = db.get_files(group=grupo, uf=uf, year=ano, month=mes)
+        if not files:
+            return []
+        return _caminhos_parquet(db.download(files))
+    if sistema == "SINAN":
+        from pysus.online_data.SINAN import SINAN
+        sinan = SINAN().load()
+        files = sinan.get_files(dis_code=grupo, year=ano)
+        if not files:
+            return []
+        return _caminhos_parquet(sinan.download(files))
+    raise ValueError(f"Sistema DATASUS desconhecido: {sistema}")
+
+
+class CacheDATASUS:
+    """
+    Camada única de download do DATASUS com armazenamento local.
+
+    Os arquivos são guardados em `objetos/<sha256>.parquet` e um índice JSON
+    associa cada chave (sistema, grupo, UF, ano, mês) à lista de objetos,
+    com tamanho, checksum e último acesso. Quando o total ultrapassa o limite,
+    as chaves usadas há mais tempo são removidas (LRU).
+
+    O cache pode ser usado por vários processos ao mesmo tempo: toda alteração
+    do índice (e a coleta de lixo) acontece sob uma trava de arquivo
+    (`indice.lock`), e cada chave tem sua própria trava em `travas/`, de modo
+    que um arquivo é baixado uma única vez mesmo entre processos.
+
+    Parâmetros:
+    - diretorio (str ou Path): onde o cache fica em disco
+    - limite_bytes (int): tamanho máximo total dos objetos
+    - offline (bool): se True, nunca chama `baixar`; chaves ausentes geram ArquivoAusenteNoCache
+    - baixar (callable): função (sistema, grupo, uf, ano, mes) -> lista de caminhos parquet.
+      Por padrão usa o pysus; pode ser trocada por uma fonte local (testes, benchmarks).
+    - remover_origem (bool): apaga os arquivos devolvidos por `baixar` depois de
+      copiados para o cache. Por padrão, apenas quando `baixar` é o pysus, para que
+      a cópia em ~/pysus não ocupe o disco uma segunda vez, fora do limite do cache.
+    - tentativas (int): número de tentativas de cada download (padrão: 3)
+    - espera_s (float): espera antes da 2ª tentativa; dobra a cada nova falha (com variação aleatória)
+    """
+
+    def __init__(self, diretorio=None, limite_bytes=None, offline=None, baixar=None, remover_origem=None,
+                 tentativas=None, espera_s=ESPERA_INICIAL_S):
+        if diretorio is None:
+            diretorio = os.environ.get("DATASUS_CACHE_DIR", DIRETORIO_PADRAO)
+        if limite_bytes is None:
+            limite_bytes = int(float(os.environ.get("DATASUS_CACHE_MAX_GB", LIMITE_PADRAO_GB)) * 1024 ** 3)
+        if offline is None:
+            offline = os.environ.get("DATASUS_OFFLINE", "0") == "1"
+        if tentativas is None:
+            tentativas = int(os.environ.get("DATASUS_TENTATIVAS", TENTATIVAS_PADRAO))
+
+        self.diretorio = Path(diretorio)
+        self.limite_bytes = int(limite_bytes)
+        self.offline = bool(offline)
+        self.baixar = baixar or baixar_pysus
+        self.remover_origem = baixar is None if remover_origem is None else bool(remover_origem)
+        self.tentativas = max(1, int(tentativas))
+        self.espera_s = float(espera_s)
+        self._dir_objetos = self.diretorio / "objetos"
+        self._arquivo_indice = self.diretorio / "indice.json"
+        self._dir_travas = self.diretorio / "travas"
+        self.intervalo_acesso = INTERVALO_ACESSO_S
+        self._lock = threading.RLock()
+        self._profundidade_trava = 0
+        self._fd_trava = None
+        self._locks_chave = {}
+        self._verificados = set()
+
+    # locks não são serializáveis: recriados ao enviar o cache para outro processo
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        del estado["_lock"], estado["_locks_chave"]
+        estado["_profundidade_trava"], estado["_fd_trava"] = 0, None
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.RLock()
+        self._locks_chave = {}
+
+    # --- travas ---
+    @contextmanager
+    def _travar_indice(self):
+        """Trava exclusiva do índice, entre threads e entre processos (reentrante)."""
+        with self._lock:
+            if self._profundidade_trava == 0:
+                self.diretorio.mkdir(parents=True, exist_ok=True)
+                self._fd_trava = os.open(self.diretorio / "indice.lock", os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    fcntl.flock(self._fd_trava, fcntl.LOCK_EX)
+            self._profundidade_trava += 1
+            try:
+                yield
+            finally:
+                self._profundidade_trava -= 1
+                if self._profundidade_trava == 0:
+                    os.close(self._fd_trava)  # fechar o descritor libera o flock
+                    self._fd_trava = None
+
+    @contextmanager
+    def _travar_chave(self, k):
+        """Garante um único download por chave, entre threads e entre processos."""
+        with self._lock:
+            lock_chave = self._locks_chave.setdefault(k, threading.Lock())
+        with lock_chave:
+            self._dir_travas.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self._dir_travas / (k.replace("/", "_") + ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    # --- índice ---
+    def _ler_indice(self):
+        try:
+            with open(self._arquivo_indice, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _gravar_indice(self, indice):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.diretorio, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(indice, f, indent=1)
+        os.replace(tmp, self._arquivo_indice)
+
+    def _caminho_objeto(self, sha):
+        return self._dir_objetos / sha[:2] / f"{sha}.parquet"
+
+    # --- integridade ---
+    def _objeto_valido(self, obj):
+        caminho = self._caminho_objeto(obj["sha256"])
+        try:
+            if caminho.stat().st_size != obj["tamanho"]:
+                return False
+        except FileNotFoundError:
+            return False
+        # checksum completo apenas uma vez por processo
+        if obj["sha256"] not in self._verificados:
+            if _sha256(caminho) != obj["sha256"]:
+                caminho.unlink(missing_ok=True)
+                return False
+            self._verificados.add(obj["sha256"])
+        return True
+
+    def _armazenar(self, origem):
+        sha = _sha256(origem)
+        destino = self._caminho_objeto(sha)
+        if not destino.exists():
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=destino.parent, suffix=".tmp")
+            os.close(fd)
+            shutil.copyfile(origem, tmp)
+            os.replace(tmp, destino)
+        self._verificados.add(sha)
+        return {"sha256": sha, "tamanho": destino.stat().st_size}
+
+    # --- LRU ---
+    def _aplicar_limite(self, indice, proteger=None):
+        def total():
+            objetos = {o["sha256"]: o["tamanho"] for e in indice.values() for o in e["objetos"]}
+            return sum(objetos.values())
+
+        candidatas = sorted((e["ultimo_acesso"], k) for k, e in indice.items() if k != proteger)
+        while candidatas and total() > self.limite_bytes:
+            _, k = candidatas.pop(0)
+            del indice[k]
+        self._coletar_lixo(indice)
+
+    def _coletar_lixo(self, indice):
+        referenciados = {o["sha256"] for e in indice.values() for o in e["objetos"]}
+        if not self._dir_objetos.exists():
+            return
+        for caminho in self._dir_objetos.rglob("*.parquet"):
+            if caminho.stem not in referenciados:
+                caminho.unlink(missing_ok=True)
+
+    # --- API ---
+    def obter(self, sistema, grupo, uf, ano, mes=None):
+        """
+        Retorna os caminhos locais dos arquivos parquet para a chave, baixando se necessário.
+
+        Retorna:
+        - lista de Path (vazia se o DATASUS não tiver o arquivo)
+        """
+        chave = chave_download(sistema, grupo, uf, ano, mes)
+        k = _chave_texto(chave)
+
+        # um único download por chave, mesmo com vários processos/threads pedindo o mesmo arquivo
+        with self._travar_chave(k):
+            return self._obter(chave, k)
+
+    def _obter(self, chave, k):
+        with self._travar_indice():
+            indice = self._ler_indice()
+            entrada = indice.get(k)
+            if entrada is not None and all(self._objeto_valido(o) for o in entrada["objetos"]):
+                # o índice só é regravado quando o último acesso fica desatualizado
+                agora = time.time()
+                if agora - entrada["ultimo_acesso"] >= self.intervalo_acesso:
+                    entrada["ultimo_acesso"] = agora
+                    self._gravar_indice(indice)
+                return [self._caminho_objeto(o["sha256"]) for o in entrada["objetos"]]
+
+        if self.offline:
+            raise ArquivoAusenteNoCache(f"{k} não está no cache (modo offline)")
+
+        arquivos = self._baixar_com_tentativas(chave, k)
+        if not arquivos:
+            return []
+
+        # armazenar e indexar sob a mesma trava: a coleta de lixo de outro
+        # processo não pode remover um objeto ainda não referenciado no índice
+        with self._travar_indice():
+            objetos = [self._armazenar(Path(p)) for p in arquivos]
+            indice = self._ler_indice()
+            indice[k] = {"objetos": objetos, "ultimo_acesso": time.time()}
+            self._aplicar_limite(indice, proteger=k)
+            self._gravar_indice(indice)
+        if self.remover_origem:
+            _remover_arquivos(arquivos)
+        return [self._caminho_objeto(o["sha256"]) for o in objetos]
+
+    def _baixar_com_tentativas(self, chave, k):
+        for tentativa in range(1, self.tentativas + 1):
+            print(f"⬇️ Baixando {k}..." + (f" (tentativa {tentativa}/{self.tentativas})" if tentativa > 1 else ""))
+            try:
+                return self.baixar(*chave)
+            except Exception as e:
+                if tentativa == self.tentativas:
+                    raise
+                espera = self.espera_s * 2 ** (tentativa - 1) * random.uniform(1.0, 1.5)
+                print(f"⚠️ Falha ao baixar {k} ({e}); nova tentativa em {espera:.1f} s")
+                time.sleep(espera)
+
+    def contem(self, sistema, grupo, uf, ano, mes=None):
+        k = _chave_texto(chave_download(sistema, grupo, uf, ano, mes))
+        with self._travar_indice():
+            return k in self._ler_indice()
+
+    def invalidar(self, sistema, grupo, uf, ano, mes=None):
+        """Remove uma chave do cache (ex: quando o DATASUS republica um arquivo)."""
+        k = _chave_texto(chave_download(sistema, grupo, uf, ano, mes))
+        with self._travar_indice():
+            indice = self._ler_indice()
+            if indice.pop(k, None) is not None:
+                self._coletar_lixo(indice)
+                self._gravar_indice(indice)
+
+    def tamanho_total(self):
+        with self._travar_indice():
+            indice = self._ler_indice()
+        return sum({o["sha256"]: o["tamanho"] for e in indice.values() for o in e["objetos"]}.values())
+
+    def carregar_dataframe(self, sistema, grupo, uf, ano, mes=None, colunas=None, opcionais=None):
+        """
+        Carrega em um DataFrame todos os arquivos parquet da chave.
+
+        Parâmetros:
+        - colunas (list ou None): se informado, lê apenas essas colunas; se alguma
+          faltar no arquivo, gera KeyError
+        - opcionais (list ou None): colunas lidas se existirem; as ausentes voltam
+          preenchidas com nulos
+        """
+        caminhos = self.obter(sistema, grupo, uf, ano, mes)
+        if not caminhos:
+            return pd.DataFrame(columns=None if colunas is None else list(colunas) + list(opcionais or []))
+        return pd.concat([_ler_parquet(p, colunas, opcionais) for p in caminhos], ignore_index=True)
+
+
+def _ler_parquet(caminho, colunas=None, opcionais=None):
+    if colunas is None:
+        return pd.read_parquet(caminho)
+    import pyarrow.parquet as pq
+    existentes = set(pq.read_schema(caminho).names)
+    faltando = [c for c in colunas if c not in existentes]
+    if faltando:
+        raise KeyError(f"Colunas ausentes em {caminho}: {faltando}")
+    todas = list(colunas) + [c for c in (opcionais or []) if c not in colunas]
+    df = pd.read_parquet(caminho, columns=[c for c in todas if c in existentes])
+    return df.reindex(columns=todas)
+
+
+_cache_padrao = None
+
+
+def obter_cache():
+    """Retorna o cache padrão do processo, configurado pelas variáveis de ambiente."""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = CacheDATASUS()
+    return _cache_padrao
+
+
+def definir_cache(cache):
+    """Substitui o cache padrão do processo (ex: por um cache com fonte local)."""
+    global _cache_padrao
+    _cache_padrao = cache
+
+
+def obter_arquivos(sistema, grupo, uf, ano, mes=None):
+    """Atalho para `obter_cache().obter(...)`."""
+    return obter_cache().obter(sistema, grupo, uf, ano, mes)
+
+
+def carregar_dataframe(sistema, grupo, uf, ano, mes=None, colunas=None, opcionais=None):
+    """Atalho para `obter_cache().carregar_dataframe(...)`."""
+    return obter_cache().carregar_dataframe(sistema, grupo, uf, ano, mes, colunas, opcionais)
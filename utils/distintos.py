@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Contagem incremental de valores distintos por município (ex: médicos por CPFUNICO).
+
+Os lotes são adicionados um a um e descartados; só a estrutura de contagem
+fica em memória, então a memória não cresce com o número de meses lidos.
+
+Dois modos:
+- 'exato': conjunto de chaves inteiras de 64 bits, com o município nos 20 bits
+  altos e o hash do valor nos 44 bits baixos. A contagem é exata, exceto por
+  colisões de hash dentro de um mesmo município (probabilidade ~n²/2⁴⁵; para
+  10 mil valores em um município, ~3 em 1 milhão). Memória: 8 bytes por par distinto.
+- 'hll': HyperLogLog por município, com 2^precisao registradores de 1 byte. O
+  erro padrão é 1,04/√(2^precisao) (1,6% com precisao=12), e a memória é fixa
+  por município, independente do número de valores.
+"""
+import numpy as np
+import pandas as pd
+
+MODOS = ("exato", "hll")
+PRECISAO_PADRAO = 12
+BITS_HASH = 44
+_MASCARA_HASH = np.uint64((1 << BITS_HASH) - 1)
+
+
+def hash64(valores):
+    """
+    Hash de 64 bits de cada valor (texto, número ou category).
+
+    Retorna:
+    - (array uint64 dos hashes, máscara dos valores não nulos)
+    """
+    if isinstance(valores, pd.Series):
+        valores = valores.array
+    if isinstance(valores, pd.Categorical):
+        # só as categorias distintas são hasheadas
+        hashes = pd.util.hash_array(np.asarray(valores.categories, dtype=object))
+        return hashes[np.maximum(valores.codes, 0)], valores.codes >= 0
+    valores = np.asarray(valores)
+    if valores.dtype.kind in "US":
+        valores = valores.astype(object)
+    return pd.util.hash_array(valores), ~pd.isna(valores)
+
+
+def _comprimento_bits(x):
+    """Número de bits significativos de cada uint64 (0 para 0), sem perda de precisão do float."""
+    alto = (x >> np.uint64(32)).astype(np.float64)
+    baixo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        bits_alto = np.where(alto > 0, np.floor(np.log2(np.maximum(alto, 1))) + 33, 0)
+        bits_baixo = np.where(baixo > 0, np.floor(np.log2(np.maximum(baixo, 1))) + 1, 0)
+    return np.where(alto > 0, bits_alto, bits_baixo).astype(np.int64)
+
+
+def _unir_ordenados(a, b):
+    """União de dois arrays ordenados e sem repetição, por inserção (sem reordenar `a`)."""
+    if len(a) == 0:
+        return b
+    posicoes = np.searchsorted(a, b)
+    existe = a[np.minimum(posicoes, len(a) - 1)] == b
+    return np.insert(a, posicoes[~existe], b[~existe])
+
+
+class ContadorDistintos:
+    """
+    Conta valores distintos por município, lote a lote.
+
+    Parâmetros:
+    - modo (str): 'exato' ou 'hll'
+    - precisao (int): no modo 'hll', log2 do número de registradores (4 a 16)
+    """
+
+    def __init__(self, modo="exato", precisao=PRECISAO_PADRAO):
+        if modo not in MODOS:
+            raise ValueError(f"Modo desconhecido: {modo} (use {', '.join(MODOS)})")
+        if modo == "hll" and not 4 <= precisao <= 16:
+            raise ValueError(f"precisao deve estar entre 4 e 16: {precisao}")
+        self.modo = modo
+        self.precisao = precisao
+        self._chaves = np.empty(0, dtype=np.uint64)
+        self._linhas = {}  # município -> linha dos registradores (modo hll)
+        self._registradores = np.zeros((0, 1 << precisao), dtype=np.uint8) if modo == "hll" else None
+
+    @property
+    def erro_padrao(self):
+        """Erro relativo padrão da estimativa (0 no modo exato)."""
+        return 0.0 if self.modo == "exato" else 1.04 / np.sqrt(1 << self.precisao)
+
+    @property
+    def nbytes(self):
+        """Memória ocupada pela estrutura de contagem."""
+        return self._chaves.nbytes if self.modo == "exato" else self._registradores.nbytes
+
+    def adicionar(self, municipios, valores):
+        """
+        Adiciona um lote de pares (município, valor).
+
+        Parâmetros:
+        - municipios (array int): códigos de 6 dígitos (`utils.municipios.codigo_6`);
+          códigos inválidos (< 0) são ignorados
+        - valores: valores contados (ex: CPFUNICO); nulos são ignorados
+        """
+        municipios = np.asarray(municipios)
+        hashes, validos = hash64(valores)
+        validos &= municipios >= 0
+        municipios, hashes = municipios[validos].astype(np.uint64), hashes[validos]
+        if len(hashes) == 0:
+            return
+        if self.modo == "exato":
+            chaves = np.unique((municipios << np.uint64(BITS_HASH)) | (hashes & _MASCARA_HASH))
+            self._chaves = _unir_ordenados(self._chaves, chaves)
+        else:
+            self._adicionar_hll(municipios.astype(np.int64), hashes)
+
+    def _adicionar_hll(self, municipios, hashes):
+        p = np.uint64(self.precisao)
+        novos = [m for m in pd.unique(municipios) if m not in self._linhas]
+        if novos:
+            for m in novos:
+                self._linhas[int(m)] = len(self._linhas)
+            self._registradores = np.vstack([
+                self._registradores, np.zeros((len(novos), 1 << self.precisao), dtype=np.uint8)
+            ])
+        linhas = pd.Series(self._linhas).reindex(municipios).to_numpy()
+        registrador = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        resto = hashes & np.uint64((1 << (64 - self.precisao)) - 1)
+        # posição do primeiro bit 1 nos 64-p bits restantes (64-p+1 se todos forem 0)
+        rho = (64 - self.precisao) - _comprimento_bits(resto) + 1
+        planos = self._registradores.reshape(-1)
+        np.maximum.at(planos, linhas * (1 << self.precisao) + registrador, rho.astype(np.uint8))
+
+    def contar(self):
+        """
+        Retorna:
+        - Series int64 indexada por 'cod_mun_ibge_6' (int32) com o número de valores distintos
+        """
+        indice_vazio = pd.Index([], dtype=np.int32, name="cod_mun_ibge_6")
+        if self.modo == "exato":
+            if len(self._chaves) == 0:
+                return pd.Series([], index=indice_vazio, dtype=np.int64)
+            municipios, contagens = np.unique(self._chaves >> np.uint64(BITS_HASH), return_counts=True)
+            return pd.Series(contagens.astype(np.int64), index=pd.Index(municipios.astype(np.int32), name="cod_mun_ibge_6"))
+
+        if not self._linhas:
+            return pd.Series([], index=indice_vazio, dtype=np.int64)
+        m = 1 << self.precisao
+        alfa = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        registradores = self._registradores.astype(np.float64)
+        estimativa = alfa * m * m / np.exp2(-registradores).sum(axis=1)
+        zeros = (self._registradores == 0).sum(axis=1)
+        # correção para poucos valores: contagem linear pelos registradores vazios
+        pequenos = (estimativa <= 2.5 * m) & (zeros > 0)
+        estimativa[pequenos] = m * np.log(m / zeros[pequenos])
+        municipios = np.fromiter(self._linhas, dtype=np.int64, count=len(self._linhas))
+        resultado = pd.Series(np.rint(estimativa).astype(np.int64), index=pd.Index(municipios.astype(np.int32), name="cod_mun_ibge_6"))
+        return resultado.sort_index()
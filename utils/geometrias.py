@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Armazém das geometrias municipais usadas nos mapas.
+
+O shapefile do IBGE (5.570 municípios) é lido uma única vez e convertido para
+GeoParquet, um arquivo por UF (`SIGLA_UF=XX/geometrias.parquet`), com os
+municípios indexados pelo código de 6 dígitos (int32). Depois disso cada mapa lê apenas
+a sua UF, e as UFs já carregadas ficam em memória no processo.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import geopandas as gpd
+
+from utils.municipios import codigo_6
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SHAPEFILE_PADRAO = BASE_DIR / "shapefiles" / "BR_Municipios_2022.shp"
+DIRETORIO_PADRAO = BASE_DIR / "dados" / "geometrias"
+# versão do formato das partições (2: CD_MUN como int32); outra versão força a reconversão
+FORMATO = 2
+
+
+class ArmazemGeometrias:
+    """
+    Geometrias municipais particionadas por UF.
+
+    Parâmetros:
+    - shapefile (str ou Path): shapefile de origem (colunas 'CD_MUN' e 'SIGLA_UF')
+    - diretorio (str ou Path): onde ficam as partições GeoParquet; por padrão um
+      subdiretório de dados/geometrias com o nome do shapefile
+    """
+
+    def __init__(self, shapefile=None, diretorio=None):
+        self.shapefile = Path(shapefile or SHAPEFILE_PADRAO)
+        self.diretorio = Path(diretorio or DIRETORIO_PADRAO / self.shapefile.stem)
+        self._memoria = {}
+        self._lock = threading.Lock()
+
+    # locks não são serializáveis: recriados ao enviar o armazém para outro processo
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        del estado["_lock"]
+        estado["_memoria"] = {}
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    def _origem(self):
+        info = self.shapefile.stat()
+        return {
+            "shapefile": str(self.shapefile.resolve()), "tamanho": info.st_size, "mtime": info.st_mtime,
+            "formato": FORMATO,
+        }
+
+    def _atualizado(self):
+        try:
+            with open(self.diretorio / "origem.json", encoding="utf-8") as f:
+                return json.load(f) == self._origem()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+    def preparar(self):
+        """Converte o shapefile para GeoParquet por UF, se ainda não convertido (ou se mudou)."""
+        if self._atualizado():
+            return
+        print(f"🗺️ Convertendo {self.shapefile.name} para GeoParquet por UF...")
+        gdf = gpd.read_file(self.shapefile)
+        gdf["CD_MUN"] = codigo_6(gdf["CD_MUN"])
+        gdf = gdf.set_index("CD_MUN")
+
+        # grava em um diretório temporário e troca de uma vez, para que outro
+        # processo nunca veja uma conversão pela metade
+        self.diretorio.parent.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=self.diretorio.parent, prefix=".geometrias_"))
+        try:
+            for uf, gdf_uf in gdf.groupby("SIGLA_UF"):
+                destino = tmp / f"SIGLA_UF={uf}"
+                destino.mkdir()
+                gdf_uf.to_parquet(destino / "geometrias.parquet")
+            with open(tmp / "origem.json", "w", encoding="utf-8") as f:
+                json.dump(self._origem(), f)
+
+            antigo = None
+            if self.diretorio.exists():
+                antigo = self.diretorio.with_name(f".{self.diretorio.name}.antigo.{os.getpid()}")
+                os.replace(self.diretorio, antigo)
+            os.replace(tmp, self.diretorio)
+            if antigo is not None:
+                shutil.rmtree(antigo, ignore_errors=True)
+        except OSError:
+            # outro processo terminou a conversão antes
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not self._atualizado():
+                raise
+        print(f"✅ Geometrias salvas em {self.diretorio}")
+
+    def obter(self, uf):
+        """
+        Geometrias dos municípios de uma UF.
+
+        Retorna:
+        - GeoDataFrame indexado por 'CD_MUN' (6 dígitos, int32); é o objeto mantido em
+          memória, então não o altere no lugar (use join/merge/copy)
+        """
+        with self._lock:
+            if uf in self._memoria:
+                return self._memoria[uf]
+            self.preparar()
+            caminho = self.diretorio / f"SIGLA_UF={uf}" / "geometrias.parquet"
+            if not caminho.exists():
+                raise KeyError(f"UF sem geometrias: {uf}")
+            gdf = gpd.read_parquet(caminho)
+            self._memoria[uf] = gdf
+            return gdf
+
+    def limpar_memoria(self):
+        with self._lock:
+            self._memoria.clear()
+
+
+_armazens = {}
+_lock_armazens = threading.Lock()
+
+
+def obter_armazem(shapefile=None):
+    """Retorna o armazém (um por shapefile e por processo)."""
+    chave = str(Path(shapefile or SHAPEFILE_PADRAO).resolve())
+    with _lock_armazens:
+        if chave not in _armazens:
+            _armazens[chave] = ArmazemGeometrias(shapefile)
+        return _armazens[chave]
+
+
+def obter_geometrias(uf, shapefile=None):
+    """Atalho para `obter_armazem(shapefile).obter(uf)`."""
+    return obter_armazem(shapefile).obter(uf)
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Reconstrução incremental do painel de indicadores.
+
+Cada indicador é calculado por células (UF/ano ou UF/ano/mês). Um manifesto
+guarda, para cada célula já calculada, a impressão digital das suas entradas:
+os SHA-256 dos arquivos do DATASUS lidos (vindos do cache), a versão do código
+e outras entradas fixas (ex: a base populacional). Numa nova execução, apenas
+as células com impressão diferente (ou ainda não calculadas) são recalculadas;
+as demais são lidas do disco e juntadas ao painel.
+"""
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from utils.cache_datasus import obter_cache
+from utils.paralelo import executar_grade
+
+DIRETORIO_PADRAO = Path(__file__).resolve().parent.parent / "dados" / "painel_incremental"
+
+
+def _sha256_arquivo(caminho, tamanho_bloco=1 << 20):
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def versao_codigo(*modulos):
+    """
+    Versão do código de um indicador: hash das fontes dos módulos informados.
+
+    Qualquer alteração nesses arquivos invalida as células já calculadas.
+    """
+    h = hashlib.sha256()
+    for modulo in modulos:
+        h.update(Path(inspect.getsourcefile(modulo)).read_bytes())
+    return h.hexdigest()[:16]
+
+
+def impressao_arquivo_local(caminho):
+    """Impressão de um arquivo de entrada fora do cache (ex: CSV de população)."""
+    return _sha256_arquivo(caminho)
+
+
+def impressao_chaves(chaves):
+    """
+    SHA-256 dos objetos do cache para cada chave (baixando as que faltarem).
+
+    Uma chave sem arquivo no DATASUS (ex: mês ainda não publicado) entra como
+    lista vazia, de modo que a célula muda de impressão quando ele for publicado.
+    """
+    cache = obter_cache()
+    impressoes = []
+    for chave in chaves:
+        try:
+            caminhos = cache.obter(*chave)
+        except Exception as e:
+            print(f"⚠️ Erro ao obter {'/'.join(str(c) for c in chave if c is not None)}: {e}")
+            caminhos = None
+        impressoes.append(None if caminhos is None else sorted(Path(c).stem for c in caminhos))
+    return impressoes
+
+
+def _nome_celula(celula):
+    return "_".join("00" if c is None else str(c) for c in celula)
+
+
+class ManifestoPainel:
+    """
+    Manifesto das células calculadas e os resultados de cada uma em parquet.
+
+    Estrutura em disco:
+    - manifesto.json: indicador -> célula -> impressão das entradas
+    - <indicador>/<célula>.parquet: resultado da célula
+
+    Parâmetros:
+    - diretorio (str ou Path): onde ficam o manifesto e as células
+    """
+
+    def __init__(self, diretorio=None):
+        self.diretorio = Path(diretorio or DIRETORIO_PADRAO)
+        self._arquivo = self.diretorio / "manifesto.json"
+        self._lock = threading.Lock()
+        try:
+            with open(self._arquivo, encoding="utf-8") as f:
+                self._dados = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._dados = {}
+
+    def _caminho(self, indicador, celula):
+        return self.diretorio / indicador / f"{_nome_celula(celula)}.parquet"
+
+    def _salvar(self):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.diretorio, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._dados, f, indent=1)
+        os.replace(tmp, self._arquivo)
+
+    def impressao(self, chaves, versao, extras=None):
+        """Impressão digital de uma célula: arquivos lidos + versão do código + extras."""
+        conteudo = {"arquivos": impressao_chaves(chaves), "codigo": versao, "extras": extras}
+        return hashlib.sha256(json.dumps(conteudo, sort_keys=True, default=str).encode()).hexdigest()
+
+    def pendentes(self, indicador, impressoes):
+        """
+        Células que precisam ser recalculadas.
+
+        Parâmetros:
+        - indicador (str): nome do indicador
+        - impressoes (dict): célula -> impressão atual
+
+        Retorna:
+        - lista das células cuja impressão mudou ou cujo resultado não existe
+        """
+        with self._lock:
+            registradas = self._dados.get(indicador, {})
+            return [
+                c for c, imp in impressoes.items()
+                if registradas.get(_nome_celula(c)) != imp or not self._caminho(indicador, c).exists()
+            ]
+
+    def gravar(self, indicador, resultados):
+        """
+        Grava o resultado das células recalculadas e atualiza o manifesto.
+
+        Parâmetros:
+        - resultados (dict): célula -> (impressão, DataFrame)
+        """
+        for celula, (_, df) in resultados.items():
+            caminho = self._caminho(indicador, celula)
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            df.to_parquet(caminho, index=False)
+        with self._lock:
+            registradas = self._dados.setdefault(indicador, {})
+            for celula, (imp, _) in resultados.items():
+                registradas[_nome_celula(celula)] = imp
+            self._salvar()
+
+    def carregar(self, indicador, celulas):
+        """Lê os resultados gravados das células (as ausentes são ignoradas)."""
+        partes = []
+        for celula in celulas:
+            caminho = self._caminho(indicador, celula)
+            if caminho.exists():
+                partes.append(pd.read_parquet(caminho))
+        return partes
+
+
+def celulas_pendentes(manifesto, indicador, celulas, arquivos, versao, extras=None):
+    """
+    Calcula a impressão atual de cada célula e quais delas estão desatualizadas.
+
+    Retorna:
+    - (dict célula -> impressão, lista das células pendentes)
+    """
+    impressoes = {tuple(c): manifesto.impressao(arquivos(*c), versao, extras) for c in celulas}
+    return impressoes, manifesto.pendentes(indicador, impressoes)
+
+
+def atualizar_indicador(manifesto, indicador, calcular, celulas, arquivos, versao, extras=None,
+                        workers=1, gerar_mapa=None):
+    """
+    Atualiza um indicador recalculando apenas as células cujas entradas mudaram.
+
+    Parâmetros:
+    - manifesto (ManifestoPainel): manifesto das células já calculadas
+    - indicador (str): nome do indicador (ex: 'tmi')
+    - calcular (callable): função da célula (ou partial), chamada como calcular(*celula)
+    - celulas (list): células do painel, ex: [(uf, ano), ...] ou [(uf, ano, mes), ...]
+    - arquivos (callable): celula -> chaves do cache lidas pela célula
+    - versao (str): versão do código (ver `versao_codigo`)
+    - extras: outras entradas da impressão (ex: impressão da base populacional)
+    - workers (int): processos usados no recálculo
+    - gerar_mapa (callable ou None): chamado com o resultado de cada célula recalculada
+
+    Retorna:
+    - DataFrame com todas as células (recalculadas + lidas do disco)
+    """
+    celulas = [tuple(c) for c in celulas]
+    impressoes, pendentes = celulas_pendentes(manifesto, indicador, celulas, arquivos, versao, extras)
+    print(f"🔁 {indicador}: {len(pendentes)} de {len(celulas)} célula(s) para recalcular")
+
+    if pendentes:
+        resultados = executar_grade(calcular, pendentes, workers=workers)
+        novos = {c: (impressoes[c], df) for c, df in zip(pendentes, resultados) if df is not None}
+        if novos:
+            manifesto.gravar(indicador, novos)
+        if gerar_mapa is not None:
+            for _, df in novos.values():
+                gerar_mapa(df)
+
+    partes = manifesto.carregar(indicador, celulas)
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
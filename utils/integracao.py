@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Integração vetorizada dos indicadores em um único painel.
+
+Em vez de juntar os indicadores dois a dois (cada `merge` copia de novo o
+painel que cresce e compara os códigos de município como texto), cada
+indicador é reduzido a uma chave inteira (município int32, ano, mês). Todas as
+chaves formam um único índice ordenado; cada indicador é posicionado nele com
+`searchsorted` e o painel é montado de uma vez, coluna a coluna. Na mesma
+passada sai o relatório de cobertura: quais células cada indicador não tem.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.municipios import codigo_6
+
+CHAVE = ["cod_mun_ibge_6", "ANO", "MES"]
+ATRIBUTOS = ["UF", "municipio", "populacao"]
+
+
+def _chave_inteira(municipio, ano, mes):
+    """Empacota (município de 6 dígitos, ano, mês) em um int64: MMMMMMAAAAmm."""
+    return (municipio.astype(np.int64) * 10_000 + ano.astype(np.int64)) * 100 + mes.astype(np.int64)
+
+
+def _chaves_do_indicador(nome, df):
+    municipio = codigo_6(df["cod_mun_ibge_6"])
+    validos = municipio >= 0
+    if not validos.all():
+        print(f"⚠️ {nome}: {int((~validos).sum())} linha(s) sem código de município válido descartadas")
+        df, municipio = df[validos], municipio[validos]
+    mes = df["MES"] if "MES" in df.columns else pd.Series(0, index=df.index)
+    chaves = _chave_inteira(municipio, df["ANO"].to_numpy(), mes.fillna(0).to_numpy())
+
+    # uma linha por célula; se houver repetição, vale a última (como um merge que sobrescreve)
+    _, ultimas = np.unique(chaves[::-1], return_index=True)
+    if len(ultimas) < len(chaves):
+        print(f"⚠️ {nome}: {len(chaves) - len(ultimas)} linha(s) repetida(s) por município/ano/mês; mantida a última")
+        manter = np.sort(len(chaves) - 1 - ultimas)
+        df, chaves = df.iloc[manter], chaves[manter]
+    return df, chaves
+
+
+def integrar_painel(indicadores, colunas, atributos=ATRIBUTOS):
+    """
+    Junta os indicadores em um painel com uma linha por (município, ano, mês).
+
+    Parâmetros:
+    - indicadores (dict): nome -> DataFrame do indicador, com 'cod_mun_ibge_6',
+      'ANO' e, nos mensais, 'MES' (0 = ano inteiro); vazios/None são ignorados
+    - colunas (dict): nome -> colunas de valores levadas ao painel (ex: {'tmi': ['TMI']})
+    - atributos (list): colunas descritivas (UF, município, população), tiradas
+      do primeiro indicador que as tiver para cada célula
+
+    Retorna:
+    - (painel, cobertura): o painel com as colunas-chave, os atributos e os
+      valores (NaN onde o indicador não tem a célula), e um DataFrame com as
+      colunas ['indicador', 'cod_mun_ibge_6', 'ANO', 'MES'] das células faltantes
+    """
+    preparados = {}
+    for nome, df in indicadores.items():
+        if df is None or df.empty:
+            print(f"⚠️ {nome}: sem resultados; fora do painel")
+            continue
+        faltando = [c for c in ["cod_mun_ibge_6", "ANO"] + list(colunas.get(nome, [])) if c not in df.columns]
+        if faltando:
+            raise KeyError(f"Colunas ausentes no indicador {nome}: {faltando}")
+        preparados[nome] = _chaves_do_indicador(nome, df)
+
+    if not preparados:
+        return pd.DataFrame(columns=CHAVE[:2] + list(atributos)), pd.DataFrame(columns=["indicador"] + CHAVE)
+
+    # índice único compartilhado por todos os indicadores
+    indice = np.unique(np.concatenate([chaves for _, chaves in preparados.values()]))
+    mes = indice % 100
+    ano = (indice // 100) % 10_000
+    municipio = indice // 1_000_000
+
+    saida = {
+        "cod_mun_ibge_6": municipio.astype(np.int32),
+        "ANO": ano,
+        "MES": mes,
+    }
+    for atributo in atributos:
+        saida[atributo] = np.full(len(indice), None, dtype=object)
+
+    faltantes = []
+    for nome, (df, chaves) in preparados.items():
+        posicoes = np.searchsorted(indice, chaves)
+        presentes = np.zeros(len(indice), dtype=bool)
+        presentes[posicoes] = True
+        if not presentes.all():
+            faltantes.append(pd.DataFrame({
+                "indicador": nome,
+                "cod_mun_ibge_6": saida["cod_mun_ibge_6"][~presentes],
+                "ANO": ano[~presentes],
+                "MES": mes[~presentes],
+            }))
+
+        for coluna in colunas.get(nome, []):
+            valores = np.full(len(indice), np.nan)
+            valores[posicoes] = pd.to_numeric(df[coluna], errors="coerce").to_numpy(dtype=float)
+            saida[coluna] = valores
+        for atributo in atributos:
+            if atributo in df.columns:
+                destino = saida[atributo]
+                vazios = pd.isna(destino[posicoes])
+                destino[posicoes[vazios]] = df[atributo].to_numpy(dtype=object)[vazios]
+
+    painel = pd.DataFrame(saida)
+    for atributo in atributos:
+        painel[atributo] = painel[atributo].infer_objects()
+    if not painel["MES"].any():
+        # painel anual: o mês não faz parte da chave
+        painel = painel.drop(columns="MES")
+
+    cobertura = (
+        pd.concat(faltantes, ignore_index=True) if faltantes
+        else pd.DataFrame(columns=["indicador"] + CHAVE)
+    )
+    return painel, cobertura
+
+
+def resumo_cobertura(painel, cobertura, indicadores):
+    """
+    Resume a cobertura por indicador.
+
+    Retorna:
+    - DataFrame com 'celulas_faltantes' e 'cobertura_%' por indicador
+    """
+    total = len(painel)
+    faltantes = cobertura["indicador"].value_counts().reindex(list(indicadores), fill_value=0)
+    return pd.DataFrame({
+        "celulas_faltantes": faltantes,
+        "cobertura_%": (1 - faltantes / total) * 100 if total else 0.0,
+    }).rename_axis("indicador")
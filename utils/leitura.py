@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura em lotes (streaming) dos microdados do DATASUS.
+
+Os arquivos parquet são lidos lote a lote, apenas com as colunas necessárias,
+e cada lote é reduzido a contagens parciais por município que vão sendo somadas.
+O pico de memória passa a depender do tamanho do lote, não do tamanho do arquivo.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.municipios import codigo_6, obter_indice
+
+TAMANHO_LOTE_PADRAO = 250_000
+
+
+def iterar_lotes(caminhos, colunas, tamanho_lote=TAMANHO_LOTE_PADRAO, opcionais=None, dicionario=None):
+    """
+    Percorre os arquivos parquet em lotes, lendo apenas as colunas pedidas.
+
+    Parâmetros:
+    - caminhos (list): arquivos parquet (ex: retorno de `CacheDATASUS.obter`)
+    - colunas (list): colunas obrigatórias; se alguma faltar no arquivo, gera KeyError
+    - tamanho_lote (int): número máximo de linhas por lote
+    - opcionais (list): colunas que podem não existir em todos os arquivos; as
+      ausentes vêm preenchidas com nulos
+    - dicionario (list): colunas lidas com codificação de dicionário (vêm como
+      category; ex: o código do município, que se repete em milhões de linhas)
+
+    Retorna:
+    - gerador de DataFrames com as colunas obrigatórias e as opcionais
+    """
+    opcionais = [c for c in (opcionais or []) if c not in colunas]
+    todas = list(colunas) + opcionais
+    for caminho in caminhos:
+        arquivo = pq.ParquetFile(caminho)
+        nomes = set(arquivo.schema_arrow.names)
+        faltando = [c for c in colunas if c not in nomes]
+        if faltando:
+            raise KeyError(f"Colunas ausentes em {caminho}: {faltando}")
+        if dicionario:
+            arquivo = pq.ParquetFile(caminho, read_dictionary=[c for c in dicionario if c in nomes])
+        existentes = [c for c in todas if c in nomes]
+        for lote in arquivo.iter_batches(batch_size=tamanho_lote, columns=existentes):
+            yield lote.to_pandas().reindex(columns=todas)
+
+
+def contar_lote(lote, coluna_municipio, contadores):
+    """
+    Conta, em uma única passada, os registros de um lote por município.
+
+    Parâmetros:
+    - lote (DataFrame): registros do lote
+    - coluna_municipio (str): coluna com o código do município (6 ou 7 dígitos),
+      convertido para int32 por `utils.municipios.codigo_6`; códigos extintos
+      ou transferidos são contados no município sucessor (`tb_municip.csv`)
+    - contadores (dict): nome -> função(lote) que devolve a máscara booleana dos
+      registros contados, ou None para contar todos os registros
+
+    Retorna:
+    - DataFrame indexado por 'cod_mun_ibge_6' (int32) com uma coluna inteira por contador
+    """
+    if lote.empty:
+        return pd.DataFrame(
+            columns=list(contadores), index=pd.Index([], dtype=np.int32, name="cod_mun_ibge_6"), dtype=np.int64
+        )
+
+    posicoes, codigos = pd.factorize(codigo_6(lote[coluna_municipio]))
+    n = len(codigos)
+
+    colunas = {}
+    for nome, mascara in contadores.items():
+        if mascara is None:
+            colunas[nome] = np.bincount(posicoes, minlength=n)
+        else:
+            m = np.asarray(mascara(lote), dtype=bool)
+            colunas[nome] = np.bincount(posicoes[m], minlength=n)
+    contagens = pd.DataFrame(colunas, index=pd.Index(obter_indice().sucessor(codigos), name="cod_mun_ibge_6"))
+    if contagens.index.has_duplicates:
+        contagens = contagens.groupby(level=0).sum()
+    return contagens
+
+
+def contar_por_municipio(caminhos, coluna_municipio, contadores, colunas=None, tamanho_lote=TAMANHO_LOTE_PADRAO,
+                         opcionais=None, dicionario=None):
+    """
+    Lê os arquivos em lotes e soma as contagens parciais por município.
+
+    Parâmetros:
+    - caminhos (list): arquivos parquet
+    - coluna_municipio (str): coluna com o código do município
+    - contadores (dict): ver `contar_lote`
+    - colunas (list): colunas obrigatórias; por padrão apenas a coluna do município
+    - tamanho_lote (int): número máximo de linhas por lote
+    - opcionais (list): colunas que podem faltar no arquivo (ver `iterar_lotes`)
+    - dicionario (list): outras colunas lidas com dicionário, além da do município
+      (os contadores recebem essas colunas como category)
+
+    Retorna:
+    - DataFrame indexado por 'cod_mun_ibge_6' (int32) com os totais de cada contador
+    """
+    colunas = list(colunas or [coluna_municipio])
+    if coluna_municipio not in colunas:
+        colunas.insert(0, coluna_municipio)
+
+    total = contar_lote(pd.DataFrame(), coluna_municipio, contadores)
+    dicionario = list(dict.fromkeys([coluna_municipio, *(dicionario or [])]))
+    for lote in iterar_lotes(caminhos, colunas, tamanho_lote, opcionais, dicionario=dicionario):
+        parcial = contar_lote(lote, coluna_municipio, contadores)
+        total = total.add(parcial, fill_value=0)
+    total = total.fillna(0).astype(np.int64)
+    total.index = total.index.astype(np.int32)
+    return total
@@ -1,19 +1,83 @@
-import geopandas as gpd
-import matplotlib.pyplot as plt
 import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from utils.geometrias import obter_armazem
+from utils.municipios import codigo_6
+from utils.paralelo import _contexto_processos
+
+TAMANHO_FIGURA = (12, 10)
+DPI_PADRAO = 300
+
+# matplotlib não é seguro entre threads (ex: nós do orquestrador)
+_lock_render = threading.Lock()
+
+# lote ativo: enquanto existir, gerar_mapa_indicador apenas enfileira o mapa
+# (ou o descarta, se o lote mais externo estiver com os mapas desligados)
+_lote = None
+_lote_ativo = False
+_descartados = 0
+_profundidade_lote = 0
+_lock_lote = threading.Lock()
+
+# geometrias simplificadas por (armazém, UF, dpi), mantidas no processo
+_simplificadas = {}
+
+
+@contextmanager
+def lote_mapas(workers=None, dpi=DPI_PADRAO, ativo=None, shapefile=None):
+    """
+    Agrupa os mapas gerados dentro do bloco e os renderiza de uma vez, no final.
+
+    Os cálculos dos indicadores não esperam pelo matplotlib: dentro do lote,
+    `gerar_mapa_indicador` apenas guarda a tarefa (valores + rótulos). Ao sair do
+    lote mais externo, todas as tarefas são renderizadas por `renderizar_mapas`.
+    Lotes aninhados (ex: os módulos dentro do orquestrador) entram no lote externo,
+    que decide se os mapas são gerados e com quais parâmetros.
+
+    Parâmetros:
+    - workers (int): processos usados na renderização (None = todos os núcleos)
+    - dpi (int): resolução dos PNGs
+    - ativo (bool ou None): liga a geração de mapas (opção `--mapas` dos scripts);
+      desligado (padrão), os mapas do lote são descartados com um único aviso
+    - shapefile (str ou None): shapefile das geometrias (padrão: o do armazém padrão)
+    """
+    global _lote, _lote_ativo, _descartados, _profundidade_lote
+    with _lock_lote:
+        externo = _profundidade_lote == 0
+        if externo:
+            _lote, _lote_ativo, _descartados = [], bool(ativo), 0
+        _profundidade_lote += 1
+    try:
+        yield
+    finally:
+        with _lock_lote:
+            _profundidade_lote -= 1
+            tarefas, descartados = None, 0
+            if _profundidade_lote == 0:
+                tarefas, descartados, _lote = _lote, _descartados, None
+        if descartados:
+            print(f"⚠️ Geração de mapas desativada: {descartados} mapa(s) não gerado(s) (use --mapas)")
+        if tarefas:
+            renderizar_mapas(tarefas, workers=workers, dpi=dpi, shapefile=shapefile)
+
 
 def gerar_mapa_indicador(
     df, uf: str, ano: int, coluna_valor: str,
     legenda: str, cmap: str, nome_arquivo: str,
     output_dir: str = "mapas",
     title: str = None,
-    ativo=False):
-    if not ativo:
-        print("Geração de mapa desativada.")
-        return
+    ativo=None):
     """
     Gera e salva um mapa temático para o indicador desejado.
 
+    Dentro de `lote_mapas` o mapa é enfileirado e renderizado no final do lote
+    (se o lote estiver com os mapas ligados); fora dele, só é renderizado na
+    hora com ativo=True.
+
     Parâmetros:
     - df: DataFrame com os valores do indicador indexado por código de município (6 dígitos).
     - uf (str): Sigla da UF (ex: 'TO').
@@ -24,46 +88,138 @@ def gerar_mapa_indicador(
     - nome_arquivo (str): Nome base do arquivo a ser salvo.
     - output_dir (str): Diretório de saída.
     - title (str): Título do mapa (opcional). Se não fornecido, será gerado automaticamente.
+    - ativo (bool ou None): força (True) ou impede (False) o mapa; None segue o lote
     """
+    global _descartados
+    with _lock_lote:
+        em_lote = _lote is not None
+        gerar = ativo if ativo is not None else (em_lote and _lote_ativo)
+        if not gerar:
+            if em_lote:
+                _descartados += 1
+            return
+
+    valores = df[coluna_valor].rename("valor")
+    # as geometrias são indexadas pelo código int32; aceita também o código em texto
+    valores.index = pd.Index(codigo_6(valores.index), name="cod_mun_ibge_6")
+    tarefa = {
+        "uf": uf,
+        "valores": valores,
+        "legenda": legenda,
+        "cmap": cmap,
+        "titulo": title or f"{uf} – {legenda} ({ano})",
+        "arquivo": f"{output_dir}/mapa_{nome_arquivo}_{uf.lower()}_{ano}.png",
+    }
+    with _lock_lote:
+        if _lote is not None:
+            _lote.append(tarefa)
+            return
+    renderizar_mapas([tarefa], workers=1)
+
+
+def renderizar_mapas(tarefas, workers=None, dpi=DPI_PADRAO, shapefile=None):
+    """
+    Renderiza as tarefas de mapa, uma UF por processo.
+
+    Parâmetros:
+    - tarefas (list): tarefas criadas por `gerar_mapa_indicador` dentro de `lote_mapas`
+    - workers (int): número de processos (1 = neste processo; None = todos os núcleos)
+    - dpi (int): resolução dos PNGs
+    - shapefile (str): shapefile de origem das geometrias (padrão: o do armazém padrão)
+    """
+    # conversão do shapefile feita aqui, uma vez, antes de distribuir as UFs
+    armazem = obter_armazem(shapefile)
     try:
-        # 1: carregar shapefile
-        shp = "shapefiles/BR_Municipios_2022.shp"
-        gdf = gpd.read_file(shp)
-        gdf = gdf[gdf["SIGLA_UF"] == uf].copy()
-        gdf["CD_MUN"] = gdf["CD_MUN"].astype(str).str[:6]
-
-        # 2: juntar com dados
-        gdf = (
-            gdf.set_index("CD_MUN")
-               .join(df[[coluna_valor]], how="left")
-               .fillna({coluna_valor: 0})
-        )
-
-        # 3: criar mapa
-        fig, ax = plt.subplots(figsize=(12, 10))
-        gdf.plot(
-            column=coluna_valor,
-            cmap=cmap,
-            linewidth=0.5,
-            edgecolor="black",
-            legend=True,
-            legend_kwds={'label': legenda},
-            ax=ax
-        )
-
-        # 4: título e layout
-        if not title:
-            title = f"{uf} – {legenda} ({ano})"
-        ax.set_title(title, fontsize=14)
-        ax.axis("off")
-        plt.tight_layout()
-
-        # 5: salvar arquivo
-        os.makedirs(output_dir, exist_ok=True)
-        fn = f"{output_dir}/mapa_{nome_arquivo}_{uf.lower()}_{ano}.png"
-        plt.savefig(fn, dpi=300)
-        plt.close(fig)
-        print(f"🗺️ Mapa salvo: {fn}")
+        armazem.preparar()
+    except Exception as e:
+        print(f"❌ Erro ao preparar as geometrias ({armazem.shapefile}): {e}")
+        return
+    por_uf = {}
+    for tarefa in tarefas:
+        por_uf.setdefault(tarefa["uf"], []).append(tarefa)
+
+    if not workers:
+        workers = os.cpu_count() or 1
+    workers = min(int(workers), len(por_uf))
+    print(f"🖼️ Renderizando {len(tarefas)} mapa(s) de {len(por_uf)} UF(s)...")
+
+    if workers <= 1:
+        for uf, tarefas_uf in por_uf.items():
+            with _lock_render:
+                _renderizar_uf(uf, tarefas_uf, dpi, armazem)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_contexto_processos()) as pool:
+        futuros = {pool.submit(_renderizar_uf, uf, t, dpi, armazem): uf for uf, t in por_uf.items()}
+        for futuro, uf in futuros.items():
+            try:
+                futuro.result()
+            except Exception as e:
+                print(f"❌ Erro ao gerar mapas de {uf}: {e}")
+
+
+def _geometrias_simplificadas(uf, dpi, armazem):
+    """
+    Geometrias da UF simplificadas para a resolução de saída.
+
+    A tolerância é meio pixel da figura: detalhes menores que isso não aparecem
+    no PNG e só deixam o desenho mais lento.
+    """
+    chave = (str(armazem.diretorio), uf, dpi)
+    if chave not in _simplificadas:
+        gdf = armazem.obter(uf)
+        minx, miny, maxx, maxy = gdf.total_bounds
+        tolerancia = max(maxx - minx, maxy - miny) / (max(TAMANHO_FIGURA) * dpi) / 2
+        simplificada = gdf[[]].copy()
+        simplificada = simplificada.set_geometry(gdf.geometry.simplify(tolerancia, preserve_topology=True))
+        _simplificadas[chave] = simplificada
+    return _simplificadas[chave]
+
+
+def _renderizar_uf(uf, tarefas, dpi, armazem):
+    """
+    Renderiza todos os mapas de uma UF reaproveitando a mesma figura e eixos.
+
+    Usa `Figure` diretamente (sem pyplot), que salva os PNGs pelo backend Agg.
+    """
+    from matplotlib.figure import Figure
 
+    try:
+        gdf = _geometrias_simplificadas(uf, dpi, armazem)
     except Exception as e:
-        print(f"❌ Erro ao gerar mapa {uf}/{ano}: {e}")
+        print(f"❌ Erro ao carregar geometrias de {uf}: {e}")
+        return
+
+    # figura e eixos únicos por UF; a cada mapa só a barra de cores e o conteúdo mudam
+    fig = Figure(figsize=TAMANHO_FIGURA)
+    ax = fig.add_subplot()
+    espaco = ax.get_subplotspec()
+
+    for tarefa in tarefas:
+        try:
+            dados = gdf.join(tarefa["valores"], how="left").fillna({"valor": 0})
+            dados.plot(
+                column="valor",
+                cmap=tarefa["cmap"],
+                linewidth=0.5,
+                edgecolor="black",
+                legend=True,
+                legend_kwds={'label': tarefa["legenda"]},
+                ax=ax
+            )
+            ax.set_title(tarefa["titulo"], fontsize=14)
+            ax.axis("off")
+            fig.tight_layout()
+
+            os.makedirs(os.path.dirname(tarefa["arquivo"]) or ".", exist_ok=True)
+            fig.savefig(tarefa["arquivo"], dpi=dpi)
+            print(f"🗺️ Mapa salvo: {tarefa['arquivo']}")
+        except Exception as e:
+            print(f"❌ Erro ao gerar mapa {tarefa['arquivo']}: {e}")
+        finally:
+            for extra in fig.axes:
+                if extra is not ax:
+                    extra.remove()
+            ax.clear()
+            ax.set_subplotspec(espaco)
+            ax.set_position(espaco.get_position(fig))
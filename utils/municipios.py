@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Códigos de município como inteiros compactos (int32).
+
+Os sistemas do DATASUS trazem o município como texto de 6 ou 7 dígitos
+(CODMUNRES, MUNIC_RES, CODUFMUN, ID_MUNICIP, CD_MUN...). Em vez de fatiar
+esse texto registro a registro (`.astype(str).str[:6]`), `codigo_6` converte a
+coluna inteira para o código de 6 dígitos em int32 com operações vetorizadas
+do NumPy sobre os bytes, e é esse inteiro que é usado nos groupbys e joins.
+Colunas com dicionário (category) são convertidas só nas categorias.
+
+O código de 7 dígitos tem um dígito verificador: `codigo_7` o calcula pelo
+algoritmo do IBGE e usa o dígito de `tb_municip.csv` para os municípios em que
+o dígito oficial não segue o algoritmo.
+
+`IndiceMunicipios` é o cadastro de municípios do DATASUS (`tb_municip.csv`)
+carregado uma vez por processo em arrays: UF, região, capital, coordenadas e
+município sucessor (para códigos extintos ou transferidos), consultados em
+O(1) por código e de forma vetorizada sobre arrays de códigos.
+"""
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TABELA_MUNICIPIOS = BASE_DIR / "tb_municip.csv"
+
+# código inválido ou ausente
+CODIGO_INVALIDO = np.int32(-1)
+
+_POTENCIAS = np.array([100000, 10000, 1000, 100, 10, 1], dtype=np.int32)
+_PESOS_DV = np.array([1, 2, 1, 2, 1, 2], dtype=np.int32)
+
+# códigos numéricos das UFs (dois primeiros dígitos do código do município)
+UFS = {
+    11: "RO", 12: "AC", 13: "AM", 14: "RR", 15: "PA", 16: "AP", 17: "TO",
+    21: "MA", 22: "PI", 23: "CE", 24: "RN", 25: "PB", 26: "PE", 27: "AL", 28: "SE", 29: "BA",
+    31: "MG", 32: "ES", 33: "RJ", 35: "SP",
+    41: "PR", 42: "SC", 43: "RS",
+    50: "MS", 51: "MT", 52: "GO", 53: "DF",
+}
+CODIGOS_UF = {sigla: codigo for codigo, sigla in UFS.items()}
+REGIOES = {1: "Norte", 2: "Nordeste", 3: "Sudeste", 4: "Sul", 5: "Centro-Oeste"}
+
+_excecoes_dv = None
+_lock = threading.Lock()
+_indices = {}
+
+
+def _de_texto(valores):
+    """Converte um array de textos ('170025', '1700251', b'170025'...) para int32."""
+    ausentes = pd.isna(valores)
+    if ausentes.any():
+        valores = np.where(ausentes, "", valores)
+    # cada código vira uma linha de 8 bytes (textos menores são completados com \x00);
+    # o oitavo byte só é ocupado por textos longos demais para um código
+    try:
+        bytes_ = np.asarray(valores).astype("S8")
+    except UnicodeEncodeError:
+        bytes_ = np.char.encode(np.asarray(valores).astype(str), "ascii", "replace").astype("S8")
+    digitos = bytes_.view(np.uint8).reshape(len(bytes_), 8).astype(np.int32) - ord("0")
+    primeiros = digitos[:, :6]
+    setimo = digitos[:, 6]
+    vazio = -ord("0")
+    validos = ((primeiros >= 0) & (primeiros <= 9)).all(axis=1)
+    # o sétimo caractere, se existir, é o dígito verificador
+    validos &= (setimo == vazio) | ((setimo >= 0) & (setimo <= 9))
+    validos &= digitos[:, 7] == vazio
+    return np.where(validos, primeiros @ _POTENCIAS, CODIGO_INVALIDO).astype(np.int32)
+
+
+def codigo_6(valores):
+    """
+    Converte códigos de município de 6 ou 7 dígitos para o código de 6 dígitos em int32.
+
+    Parâmetros:
+    - valores (Series, Index, array ou list): códigos como texto, bytes, inteiros
+      ou category
+
+    Retorna:
+    - np.ndarray int32; códigos ausentes ou inválidos viram CODIGO_INVALIDO (-1)
+    """
+    if isinstance(valores, (pd.Series, pd.Index)) and isinstance(valores.dtype, pd.CategoricalDtype):
+        # colunas com dicionário (ex: lidas do parquet): converte só as categorias
+        categorias = codigo_6(valores.cat.categories if isinstance(valores, pd.Series) else valores.categories)
+        codigos = np.asarray(valores.cat.codes if isinstance(valores, pd.Series) else valores.codes)
+        return np.where(codigos >= 0, categorias[codigos], CODIGO_INVALIDO).astype(np.int32)
+
+    if isinstance(valores, (pd.Series, pd.Index)):
+        valores = valores.to_numpy(dtype=object) if valores.dtype.kind not in "iuf" else valores.to_numpy()
+    valores = np.asarray(valores)
+    if valores.ndim == 0:
+        valores = valores.reshape(1)
+
+    if valores.dtype.kind in "iu":
+        inteiros = valores.astype(np.int64)
+    elif valores.dtype.kind == "f":
+        validos = np.isfinite(valores)
+        inteiros = np.where(validos, valores, -1).astype(np.int64)
+    else:
+        return _de_texto(valores)
+
+    # 7 dígitos: remove o dígito verificador
+    inteiros = np.where(inteiros >= 1_000_000, inteiros // 10, inteiros)
+    invalidos = (inteiros < 0) | (inteiros >= 1_000_000)
+    return np.where(invalidos, CODIGO_INVALIDO, inteiros).astype(np.int32)
+
+
+def _carregar_excecoes_dv():
+    """Dígitos verificadores de tb_municip.csv que diferem do algoritmo do IBGE."""
+    global _excecoes_dv
+    with _lock:
+        if _excecoes_dv is None:
+            tabela = pd.read_csv(
+                TABELA_MUNICIPIOS, sep=';', usecols=["CO_MUNICIP", "CO_MUNICDV"], dtype=str
+            ).dropna()
+            cod6 = codigo_6(tabela["CO_MUNICIP"])
+            dv = tabela["CO_MUNICDV"].str[-1].astype(int).to_numpy()
+            diferentes = _digito_algoritmo(cod6) != dv
+            _excecoes_dv = pd.Series(dv[diferentes], index=cod6[diferentes], dtype=np.int32)
+        return _excecoes_dv
+
+
+def _digito_algoritmo(codigos6):
+    """Dígito verificador pelo algoritmo do IBGE (pesos 1-2-1-2-1-2, módulo 10)."""
+    digitos = (codigos6.astype(np.int32)[:, None] // _POTENCIAS) % 10
+    produtos = digitos * _PESOS_DV
+    soma = (produtos // 10 + produtos % 10).sum(axis=1)
+    return ((10 - soma % 10) % 10).astype(np.int32)
+
+
+def digito_verificador(codigos6):
+    """
+    Dígito verificador dos códigos de 6 dígitos.
+
+    Parâmetros:
+    - codigos6 (array): códigos de 6 dígitos (int ou texto)
+
+    Retorna:
+    - np.ndarray int32 com o dígito de cada código
+    """
+    codigos6 = codigo_6(codigos6)
+    dv = _digito_algoritmo(codigos6)
+    excecoes = _carregar_excecoes_dv()
+    if len(excecoes):
+        posicoes = excecoes.index.get_indexer(codigos6)
+        achados = posicoes >= 0
+        dv[achados] = excecoes.to_numpy()[posicoes[achados]]
+    return dv
+
+
+def codigo_7(valores):
+    """
+    Converte códigos de município (6 ou 7 dígitos) para o código de 7 dígitos do IBGE em int32.
+
+    Retorna:
+    - np.ndarray int32; inválidos viram CODIGO_INVALIDO (-1)
+    """
+    codigos6 = codigo_6(valores)
+    validos = codigos6 >= 0
+    return np.where(validos, codigos6 * 10 + digito_verificador(np.where(validos, codigos6, 0)),
+                    CODIGO_INVALIDO).astype(np.int32)
+
+
+def codigo_uf(codigos6):
+    """Código numérico da UF (dois primeiros dígitos) de códigos de 6 dígitos em int32."""
+    codigos6 = np.asarray(codigos6)
+    return np.where(codigos6 >= 0, codigos6 // 10000, CODIGO_INVALIDO).astype(np.int32)
+
+
+def mascara_uf(codigos6, ufs):
+    """
+    Máscara dos códigos que pertencem às UFs, pelo prefixo numérico (sem comparar texto).
+
+    Parâmetros:
+    - codigos6 (array): códigos de 6 dígitos em int32 (ver `codigo_6`)
+    - ufs (str ou list): sigla(s) da(s) UF(s), ex: 'TO' ou ['TO', 'GO']
+
+    Retorna:
+    - np.ndarray booleano
+    """
+    ufs = [ufs] if isinstance(ufs, str) else list(ufs)
+    return np.isin(codigo_uf(codigos6), [CODIGOS_UF[uf] for uf in ufs])
+
+
+class IndiceMunicipios:
+    """
+    Cadastro de municípios em arrays, com consulta direta pelo código de 6 dígitos.
+
+    Um array de posições com uma entrada por código possível (1 milhão de int16,
+    2 MB) leva do código à linha do cadastro; os atributos ficam em arrays
+    compactos com uma posição por município. Códigos fora do cadastro dão -1,
+    NaN ou '' conforme o atributo.
+
+    Parâmetros:
+    - tabela (DataFrame): `tb_municip.csv` lido como texto
+    """
+
+    def __init__(self, tabela):
+        codigos = codigo_6(tabela["CO_MUNICIP"])
+        validos = codigos >= 0
+        tabela, codigos = tabela[validos], codigos[validos]
+
+        self.codigos = codigos
+        self._posicao = np.full(1_000_000, -1, dtype=np.int16)
+        self._posicao[codigos] = np.arange(len(codigos), dtype=np.int16)
+
+        self.nomes = tabela["DS_NOME"].fillna("").to_numpy(dtype=object)
+        self.codigos_uf = pd.to_numeric(tabela["CO_UF"], errors="coerce").fillna(-1).to_numpy(dtype=np.int8)
+        self.regioes = pd.to_numeric(tabela["CO_REGIAO"], errors="coerce").fillna(-1).to_numpy(dtype=np.int8)
+        self.capitais = (tabela["IN_CAPITAL"] == "S").to_numpy()
+        self.latitudes = self._decimal(tabela["NU_LATITUD"])
+        self.longitudes = self._decimal(tabela["NU_LONGIT"])
+        self.anos_extincao = pd.to_numeric(tabela["DT_EXTIN"], errors="coerce").fillna(0).to_numpy(dtype=np.int16)
+
+        # sucessor final de cada município (seguindo cadeias de extinções); ele mesmo se ativo
+        sucessores = codigo_6(tabela["CO_SUCESS"])
+        sucessores = np.where(sucessores >= 0, sucessores, codigos).astype(np.int32)
+        for _ in range(10):
+            proximos = self._posicao[sucessores]
+            seguintes = np.where(proximos >= 0, sucessores[np.maximum(proximos, 0)], sucessores)
+            if (seguintes == sucessores).all():
+                break
+            sucessores = seguintes
+        self.sucessores = sucessores
+
+        self._siglas = np.array([""] + [UFS.get(c, "") for c in range(1, 100)], dtype=object)
+
+    @staticmethod
+    def _decimal(coluna):
+        return pd.to_numeric(coluna.str.replace(",", ".", regex=False), errors="coerce").to_numpy(dtype=np.float32)
+
+    def posicoes(self, codigos):
+        """Linha do cadastro de cada código (6 ou 7 dígitos, texto ou int); -1 se ausente."""
+        codigos6 = codigo_6(codigos)
+        return np.where(codigos6 >= 0, self._posicao[np.maximum(codigos6, 0)], -1)
+
+    def _atributo(self, valores, codigos, ausente):
+        posicoes = self.posicoes(codigos)
+        return np.where(posicoes >= 0, valores[np.maximum(posicoes, 0)], ausente)
+
+    def contem(self, codigos):
+        return self.posicoes(codigos) >= 0
+
+    def uf(self, codigos):
+        """Sigla da UF de cada código ('' se ausente)."""
+        return self._siglas[np.maximum(self._atributo(self.codigos_uf, codigos, 0), 0)]
+
+    def regiao(self, codigos):
+        """Nome da grande região de cada código ('' se ausente)."""
+        numeros = self._atributo(self.regioes, codigos, -1)
+        return np.array([REGIOES.get(int(n), "") for n in range(6)], dtype=object)[np.clip(numeros, 0, 5)]
+
+    def nome(self, codigos):
+        return self._atributo(self.nomes, codigos, "")
+
+    def capital(self, codigos):
+        """True para as capitais."""
+        return self._atributo(self.capitais, codigos, False).astype(bool)
+
+    def coordenadas(self, codigos):
+        """
+        Latitude e longitude da sede de cada município.
+
+        Retorna:
+        - (latitudes, longitudes) como arrays float32 (NaN se ausente)
+        """
+        return self._atributo(self.latitudes, codigos, np.nan), self._atributo(self.longitudes, codigos, np.nan)
+
+    def sucessor(self, codigos):
+        """
+        Código atual de cada município: o sucessor, para códigos extintos ou
+        transferidos (ex: municípios de GO que passaram ao TO em 1988), ou o
+        próprio código. Códigos fora do cadastro são mantidos.
+
+        Retorna:
+        - np.ndarray int32 de códigos de 6 dígitos
+        """
+        codigos6 = codigo_6(codigos)
+        return self._atributo(self.sucessores, codigos6, codigos6).astype(np.int32)
+
+    def como_dataframe(self, codigos=None):
+        """Atributos dos códigos (todos do cadastro, por padrão) como DataFrame indexado por 'cod_mun_ibge_6'."""
+        codigos = self.codigos if codigos is None else codigo_6(codigos)
+        latitudes, longitudes = self.coordenadas(codigos)
+        return pd.DataFrame({
+            "municipio": self.nome(codigos),
+            "UF": self.uf(codigos),
+            "regiao": self.regiao(codigos),
+            "capital": self.capital(codigos),
+            "latitude": latitudes,
+            "longitude": longitudes,
+            "sucessor": self.sucessor(codigos),
+        }, index=pd.Index(codigos, name="cod_mun_ibge_6"))
+
+
+def obter_indice(arquivo=None):
+    """
+    Retorna o cadastro de municípios (lido uma vez por processo).
+
+    Parâmetros:
+    - arquivo (str ou Path): tabela no formato de `tb_municip.csv` (padrão: a do repositório)
+    """
+    chave = str(Path(arquivo or TABELA_MUNICIPIOS).resolve())
+    with _lock:
+        if chave not in _indices:
+            _indices[chave] = IndiceMunicipios(pd.read_csv(chave, sep=';', dtype=str))
+        return _indices[chave]
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Agendador simples de tarefas em grafo (DAG).
+
+Cada nó é uma função; as dependências são outros nós cujos resultados são
+passados como argumentos nomeados. Nós independentes rodam ao mesmo tempo
+em um pool de threads, e ao final é impresso o tempo gasto em cada nó.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class GrafoTarefas:
+    """
+    Grafo de tarefas com execução concorrente.
+
+    Exemplo:
+        grafo = GrafoTarefas()
+        grafo.adicionar("populacao", carregar_populacao)
+        grafo.adicionar("tmi", calcular_tmi, dependencias={"arquivo_populacao": "populacao"})
+        resultados = grafo.executar()
+    """
+
+    def __init__(self):
+        self._nos = {}
+        self.tempos = {}
+        self.falhas = set()
+        self.tempo_total = 0.0
+
+    def adicionar(self, nome, funcao, dependencias=None, apos=None, **kwargs):
+        """
+        Registra um nó.
+
+        Parâmetros:
+        - nome (str): identificador único do nó
+        - funcao (callable): função executada pelo nó
+        - dependencias (dict): nome do argumento -> nome do nó cujo resultado é passado nele
+        - apos (list): nós que precisam terminar antes, sem repassar o resultado
+          (ex: uma fonte que apenas popula o cache local)
+        - kwargs: argumentos fixos da função
+        """
+        if nome in self._nos:
+            raise ValueError(f"Nó '{nome}' já registrado")
+        self._nos[nome] = (funcao, dict(dependencias or {}), list(apos or []), kwargs)
+
+    def _predecessores(self, nome):
+        _, dependencias, apos, _ = self._nos[nome]
+        return list(dependencias.values()) + apos
+
+    def _ordem_topologica(self):
+        ordem, visitados, em_visita = [], set(), set()
+
+        def visitar(nome):
+            if nome in visitados:
+                return
+            if nome in em_visita:
+                raise ValueError(f"Ciclo no grafo de tarefas envolvendo '{nome}'")
+            if nome not in self._nos:
+                raise ValueError(f"Dependência desconhecida: '{nome}'")
+            em_visita.add(nome)
+            for dep in self._predecessores(nome):
+                visitar(dep)
+            em_visita.discard(nome)
+            visitados.add(nome)
+            ordem.append(nome)
+
+        for nome in self._nos:
+            visitar(nome)
+        return ordem
+
+    def executar(self, max_paralelo=None):
+        """
+        Executa todos os nós, respeitando as dependências.
+
+        Um nó que falha (ou cuja dependência falhou) fica com resultado None e
+        não interrompe os ramos independentes do grafo.
+
+        Parâmetros:
+        - max_paralelo (int ou None): número máximo de nós rodando ao mesmo tempo
+
+        Retorna:
+        - dict nome do nó -> resultado
+        """
+        ordem = self._ordem_topologica()
+        resultados, falhas = {}, set()
+        pendentes = list(ordem)
+        inicio_geral = time.perf_counter()
+
+        def rodar(nome, kwargs):
+            inicio = time.perf_counter()
+            try:
+                return self._nos[nome][0](**kwargs)
+            finally:
+                self.tempos[nome] = (inicio - inicio_geral, time.perf_counter() - inicio)
+
+        with ThreadPoolExecutor(max_workers=max_paralelo or len(ordem) or 1) as pool:
+            em_execucao = {}
+            while pendentes or em_execucao:
+                for nome in list(pendentes):
+                    predecessores = self._predecessores(nome)
+                    if any(d in falhas for d in predecessores):
+                        print(f"⏭️ Nó '{nome}' ignorado: dependência falhou")
+                        falhas.add(nome)
+                        resultados[nome] = None
+                        pendentes.remove(nome)
+                    elif all(d in resultados for d in predecessores):
+                        _, dependencias, _, fixos = self._nos[nome]
+                        kwargs = dict(fixos)
+                        kwargs.update({arg: resultados[d] for arg, d in dependencias.items()})
+                        em_execucao[pool.submit(rodar, nome, kwargs)] = nome
+                        pendentes.remove(nome)
+
+                if not em_execucao:
+                    continue
+                concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    nome = em_execucao.pop(futuro)
+                    try:
+                        resultados[nome] = futuro.result()
+                    except Exception as e:
+                        print(f"❌ Erro no nó '{nome}': {e}")
+                        falhas.add(nome)
+                        resultados[nome] = None
+
+        self.falhas = falhas
+        self.tempo_total = time.perf_counter() - inicio_geral
+        return resultados
+
+    def imprimir_relatorio(self):
+        """Imprime o início e a duração de cada nó executado."""
+        print("\n⏱️ Tempo por nó:")
+        print(f"{'nó':<28}{'início (s)':>12}{'duração (s)':>14}  status")
+        for nome in self._ordem_topologica():
+            if nome not in self.tempos:
+                print(f"{nome:<28}{'-':>12}{'-':>14}  ignorado")
+                continue
+            inicio, duracao = self.tempos[nome]
+            status = "erro" if nome in self.falhas else "ok"
+            print(f"{nome:<28}{inicio:>12.1f}{duracao:>14.1f}  {status}")
+        print(f"{'total':<28}{'':>12}{self.tempo_total:>14.1f}")
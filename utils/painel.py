@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Armazenamento do painel de indicadores em Parquet particionado.
+
+O painel integrado e as saídas de cada indicador são gravados como um dataset
+Parquet tipado, particionado por UF e ano (`UF=XX/ANO=AAAA/*.parquet`), com as
+colunas de texto repetitivas ('UF', 'municipio') em codificação de dicionário.
+Na leitura, os filtros de UF/ano são aplicados nas partições (predicate
+pushdown): só os arquivos da UF/ano pedidos são abertos. A exportação para o
+CSV antigo (`;`, utf-8-sig) continua disponível.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils.municipios import codigo_6
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DIRETORIO_PADRAO = BASE_DIR / "dados" / "painel"
+PARTICOES = ["UF", "ANO"]
+COLUNAS_DICIONARIO = ["UF", "municipio"]
+COLUNAS_CHAVE = ["cod_mun_ibge_6", "ANO", "UF"]
+
+
+def exportar_csv(df, arquivo):
+    """Exporta no formato CSV usado até aqui (`;`, utf-8-sig)."""
+    df.to_csv(arquivo, sep=';', encoding='utf-8-sig', index=False)
+
+
+def gravar_painel(df, destino=None, csv=None):
+    """
+    Grava um painel (ou a saída de um indicador) como Parquet particionado por UF/ano.
+
+    O dataset é escrito em um diretório temporário e trocado de uma vez, para
+    que um leitor nunca veja uma gravação pela metade.
+
+    Parâmetros:
+    - df (DataFrame): precisa ter as colunas 'UF' e 'ANO'
+    - destino (str ou Path): diretório do dataset (padrão: dados/painel)
+    - csv (str ou None): se informado, também exporta o CSV nesse caminho
+
+    Retorna:
+    - o Path do dataset
+    """
+    faltando = [c for c in PARTICOES if c not in df.columns]
+    if faltando:
+        raise KeyError(f"Colunas de partição ausentes no painel: {faltando}")
+
+    destino = Path(destino or DIRETORIO_PADRAO)
+    tabela = df.copy()
+    for coluna in COLUNAS_DICIONARIO:
+        if coluna in tabela.columns:
+            tabela[coluna] = tabela[coluna].astype("category")
+    tabela["ANO"] = tabela["ANO"].astype("int16")
+    tabela = pa.Table.from_pandas(tabela, preserve_index=False)
+
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(dir=destino.parent, prefix=f".{destino.name}_"))
+    try:
+        pq.write_to_dataset(tabela, tmp, partition_cols=PARTICOES)
+        antigo = None
+        if destino.exists():
+            antigo = destino.with_name(f".{destino.name}.antigo.{os.getpid()}")
+            os.replace(destino, antigo)
+        os.replace(tmp, destino)
+        if antigo is not None:
+            shutil.rmtree(antigo, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if csv:
+        exportar_csv(df, csv)
+    return destino
+
+
+def ler_painel(origem=None, ufs=None, anos=None, colunas=None):
+    """
+    Lê o painel, abrindo apenas as partições das UFs/anos pedidos.
+
+    Parâmetros:
+    - origem (str ou Path): diretório do dataset (padrão: dados/painel); um
+      arquivo .csv no formato antigo também é aceito
+    - ufs (list ou None): siglas das UFs (None = todas)
+    - anos (list ou None): anos (None = todos)
+    - colunas (list ou None): colunas a ler (None = todas)
+
+    Retorna:
+    - DataFrame com 'UF' e 'municipio' como category e 'ANO' inteiro
+    """
+    origem = Path(origem or DIRETORIO_PADRAO)
+    if origem.suffix.lower() == ".csv":
+        df = pd.read_csv(origem, sep=';', dtype={'cod_mun_ibge_6': str}, encoding='utf-8-sig')
+        df['cod_mun_ibge_6'] = codigo_6(df['cod_mun_ibge_6'])
+        if ufs is not None:
+            df = df[df['UF'].isin(ufs)]
+        if anos is not None:
+            df = df[df['ANO'].isin([int(a) for a in anos])]
+        return df[colunas].reset_index(drop=True) if colunas else df.reset_index(drop=True)
+
+    particionamento = ds.HivePartitioning.discover(infer_dictionary=True)
+    dataset = ds.dataset(origem, format="parquet", partitioning=particionamento)
+
+    filtro = None
+    if ufs is not None:
+        filtro = ds.field("UF").isin(list(ufs))
+    if anos is not None:
+        filtro_anos = ds.field("ANO").isin([int(a) for a in anos])
+        filtro = filtro_anos if filtro is None else filtro & filtro_anos
+
+    df = dataset.to_table(columns=colunas, filter=filtro).to_pandas()
+    if "ANO" in df.columns:
+        df["ANO"] = df["ANO"].astype(int)
+    # as colunas de partição voltam no fim: recoloca a chave do painel na frente
+    if colunas is None:
+        chave = [c for c in COLUNAS_CHAVE if c in df.columns]
+        df = df[chave + [c for c in df.columns if c not in chave]]
+    return df
+
+
+def salvar_saida(df, saida):
+    """
+    Salva a saída de um indicador: CSV se `saida` terminar em .csv, senão Parquet particionado.
+    """
+    if str(saida).lower().endswith(".csv"):
+        exportar_csv(df, saida)
+        print(f"\n📄 CSV salvo: '{saida}'")
+    else:
+        gravar_painel(df, saida)
+        print(f"\n📄 Parquet salvo: '{saida}'")
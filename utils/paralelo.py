@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Execução paralela da grade UF × ano × mês dos módulos de indicadores.
+
+Os downloads (limitados por I/O) são feitos antes, em um pool de threads, e
+ficam no cache local. Em seguida cada célula da grade é processada (pandas,
+limitado por CPU) em um pool de processos. Os resultados voltam sempre na
+ordem das células e a falha de uma célula não afeta as demais.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from utils.cache_datasus import definir_cache, obter_cache
+
+MAX_THREADS_DOWNLOAD = 8
+
+
+def _descrever(celula):
+    return "/".join(str(c) for c in celula if c is not None)
+
+
+def baixar_em_paralelo(chaves, max_threads=MAX_THREADS_DOWNLOAD):
+    """
+    Garante que as chaves (sistema, grupo, uf, ano, mes) estejam no cache, usando threads.
+
+    Erros são apenas reportados: a célula correspondente tentará de novo (e falhará
+    sozinha) na etapa de processamento.
+    """
+    chaves = list(dict.fromkeys(chaves))
+    if not chaves:
+        return
+    cache = obter_cache()
+    with ThreadPoolExecutor(max_workers=min(max_threads, len(chaves))) as pool:
+        futuros = {pool.submit(cache.obter, *chave): chave for chave in chaves}
+        for futuro in as_completed(futuros):
+            try:
+                futuro.result()
+            except Exception as e:
+                print(f"⚠️ Erro ao baixar {_descrever(futuros[futuro])}: {e}")
+
+
+def obter_a_medida(chaves, max_threads=MAX_THREADS_DOWNLOAD):
+    """
+    Obtém as chaves do cache em threads, devolvendo cada uma assim que fica pronta.
+
+    Permite reduzir um arquivo (ex: um mês do CNES) enquanto os seguintes ainda
+    estão sendo baixados, com no máximo `max_threads` conexões simultâneas; as
+    tentativas com espera ficam a cargo do cache (`CacheDATASUS`).
+
+    Retorna:
+    - gerador de (chave, lista de caminhos ou None, exceção ou None), na ordem de chegada
+    """
+    chaves = list(dict.fromkeys(chaves))
+    if not chaves:
+        return
+    cache = obter_cache()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_threads, len(chaves)))) as pool:
+        futuros = {pool.submit(cache.obter, *chave): chave for chave in chaves}
+        for futuro in as_completed(futuros):
+            try:
+                yield futuros[futuro], futuro.result(), None
+            except Exception as e:
+                yield futuros[futuro], None, e
+
+
+def _contexto_processos():
+    """
+    Contexto dos pools de processos.
+
+    Evita o `fork` puro: os pools podem ser criados a partir de threads (ex: nós
+    do orquestrador), e um fork de processo com várias threads pode herdar locks
+    travados e entrar em deadlock.
+    """
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+
+
+def _executar_celula(processar, celula):
+    try:
+        return processar(*celula)
+    except Exception as e:
+        print(f"❌ Erro ao processar {_descrever(celula)}: {e}")
+        return None
+
+
+def executar_grade(processar, celulas, workers=1, downloads=None, max_threads_download=MAX_THREADS_DOWNLOAD):
+    """
+    Processa as células da grade, opcionalmente em paralelo.
+
+    Parâmetros:
+    - processar (callable): função de nível de módulo (ou functools.partial dela),
+      chamada como processar(*celula); deve retornar um DataFrame ou None
+    - celulas (list): tuplas como (uf, ano) ou (uf, ano, mes), na ordem desejada
+    - workers (int): número de processos; 1 processa tudo no processo atual e
+      0 ou None usa todos os núcleos
+    - downloads (callable ou None): função celula -> lista de chaves do cache que a
+      célula vai ler; quando informada, essas chaves são baixadas antes, em threads
+    - max_threads_download (int): número máximo de downloads simultâneos
+
+    Retorna:
+    - lista com o resultado de cada célula, na mesma ordem de `celulas`
+      (None para as células que falharam)
+    """
+    celulas = [tuple(c) for c in celulas]
+    if downloads is not None:
+        baixar_em_paralelo([k for c in celulas for k in downloads(*c)], max_threads_download)
+
+    if not workers:
+        workers = os.cpu_count() or 1
+    workers = min(int(workers), len(celulas)) if celulas else 1
+
+    if workers <= 1:
+        return [_executar_celula(processar, c) for c in celulas]
+
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=_contexto_processos(), initializer=definir_cache, initargs=(obter_cache(),)
+    ) as pool:
+        futuros = [pool.submit(_executar_celula, processar, c) for c in celulas]
+        resultados = []
+        for celula, futuro in zip(celulas, futuros):
+            try:
+                resultados.append(futuro.result())
+            except Exception as e:
+                # ex: processo filho encerrado de forma abrupta
+                print(f"❌ Erro ao processar {_descrever(celula)}: {e}")
+                resultados.append(None)
+    return resultados
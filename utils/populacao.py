@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
 import io
+import os
+import threading
+
+from utils.municipios import codigo_6
 
 def limpar_e_formatar_censo_csv(input_filename):
     """
@@ -57,6 +61,122 @@ def limpar_e_formatar_censo_csv(input_filename):
         print(f"\n❌ Ocorreu um erro inesperado durante o processo: {e}")
         return None
 
-# Executa a função com o arquivo fornecido
-# (Assumindo que o nome do arquivo é 'input_file_8.csv' como no seu exemplo)
-df_resultado = limpar_e_formatar_censo_csv('tabela4714.csv')
+
+
+class RegistroPopulacao:
+    """
+    Base populacional indexada por UF (e por ano, quando houver a coluna 'ANO').
+
+    A tabela é ordenada uma única vez por UF/ano e indexada por 'cod_mun_ibge_6'
+    (int32, ver `utils.municipios`);
+    cada UF (ou UF/ano) ocupa um bloco contíguo, guardado como uma fatia de linhas.
+    `obter` devolve essa fatia sem copiar os dados (não altere o resultado no
+    lugar: use join/assign, que criam um novo DataFrame).
+
+    Parâmetros:
+    - df (DataFrame): colunas 'cod_mun_ibge_6', 'UF', 'populacao' (e opcionalmente 'ANO')
+    """
+
+    def __init__(self, df):
+        df = df.copy()
+        df['cod_mun_ibge_6'] = codigo_6(df['cod_mun_ibge_6'])
+        self.por_ano = 'ANO' in df.columns
+        if self.por_ano:
+            df['ANO'] = df['ANO'].astype(int)
+        chaves = ['UF', 'ANO'] if self.por_ano else ['UF']
+
+        self.tabela = df.sort_values(chaves, kind='stable').set_index('cod_mun_ibge_6')
+
+        # blocos contíguos após a ordenação: chave -> fatia de linhas
+        tamanhos = self.tabela.groupby(chaves, sort=False, dropna=False).size()
+        self._fatias = {}
+        inicio = 0
+        for chave, n in tamanhos.items():
+            self._fatias[chave] = slice(inicio, inicio + int(n))
+            inicio += int(n)
+        self.ufs = self.tabela['UF'].dropna().unique().tolist()
+        self.anos = sorted(self.tabela['ANO'].unique().tolist()) if self.por_ano else []
+
+    def obter(self, uf, ano=None):
+        """
+        Municípios de uma UF (no ano, se a base for anual).
+
+        Retorna:
+        - DataFrame indexado por 'cod_mun_ibge_6' (vazio se a UF não existir)
+        """
+        if self.por_ano:
+            if ano is None or int(ano) not in self.anos:
+                raise KeyError(f"Sem população para o ano {ano}")
+            chave = (uf, int(ano))
+        else:
+            chave = uf
+        return self.tabela.iloc[self._fatias.get(chave, slice(0, 0))]
+
+
+def _ler_csv_populacao(caminho):
+    return pd.read_csv(caminho, sep=';', dtype={'cod_mun_ibge_6': str}, encoding='utf-8-sig')
+
+
+_registros = {}
+_lock = threading.Lock()
+
+
+def _chave_arquivo(caminho):
+    caminho = os.path.abspath(caminho)
+    return (caminho, os.path.getmtime(caminho))
+
+
+def carregar_registro(arquivo_populacao):
+    """
+    Retorna o registro populacional, lendo cada CSV uma única vez por processo.
+
+    Parâmetros:
+    - arquivo_populacao (str, dict, DataFrame ou RegistroPopulacao): CSV, dict
+      ano -> CSV, DataFrame já carregado ou um registro já montado
+
+    Retorna:
+    - RegistroPopulacao
+    """
+    if isinstance(arquivo_populacao, RegistroPopulacao):
+        return arquivo_populacao
+    if isinstance(arquivo_populacao, pd.DataFrame):
+        return RegistroPopulacao(arquivo_populacao)
+
+    if isinstance(arquivo_populacao, str):
+        chave = _chave_arquivo(arquivo_populacao)
+    elif isinstance(arquivo_populacao, dict):
+        chave = tuple(sorted((int(ano), _chave_arquivo(c)) for ano, c in arquivo_populacao.items()))
+    else:
+        raise ValueError("Parâmetro 'arquivo_populacao' inválido")
+
+    with _lock:
+        if chave in _registros:
+            return _registros[chave]
+
+    if isinstance(arquivo_populacao, str):
+        registro = RegistroPopulacao(_ler_csv_populacao(arquivo_populacao))
+    else:
+        registro = RegistroPopulacao(pd.concat(
+            [_ler_csv_populacao(c).assign(ANO=int(ano)) for ano, c in arquivo_populacao.items()],
+            ignore_index=True
+        ))
+
+    with _lock:
+        _registros[chave] = registro
+    return registro
+
+
+def populacao_uf_ano(arquivo_populacao, uf, ano=None):
+    """
+    Atalho para `carregar_registro(arquivo_populacao).obter(uf, ano)`.
+
+    Retorna:
+    - DataFrame dos municípios da UF, indexado por 'cod_mun_ibge_6'
+    """
+    return carregar_registro(arquivo_populacao).obter(uf, ano)
+
+
+if __name__ == "__main__":
+    # Executa a função com o arquivo fornecido
+    # (Assumindo que o nome do arquivo é 'input_file_8.csv' como no seu exemplo)
+    df_resultado = limpar_e_formatar_censo_csv('tabela4714.csv')
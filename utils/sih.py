@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de agregação do SIH (AIH reduzida, RD).
+
+Lê os arquivos mensais de uma UF/ano uma única vez, em lotes e apenas com
+MUNIC_RES e DIAG_PRINC, e monta em uma só passada vetorizada um tensor de
+contagens município × mês × grupo de CID-3. O grupo de cada diagnóstico vem
+de uma tabela de consulta indexada pelo CID-3 (letra × 100 + dois dígitos),
+montada uma vez; como DIAG_PRINC é lido com dicionário, só as categorias de
+cada lote passam pela tabela. Somas por mês, pelo ano ou por grupo
+(hipertensão, diabetes, asma) saem do tensor sem nova leitura.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.cache_datasus import chave_download, obter_arquivos
+from utils.leitura import iterar_lotes
+from utils.municipios import codigo_6, obter_indice
+
+COLUNAS_SIH = ["MUNIC_RES", "DIAG_PRINC"]
+MESES = tuple(range(1, 13))
+
+# grupos de CID-3 das internações por doenças crônicas
+GRUPOS_CID = {
+    "hipertensao": ["I10", "I11", "I12", "I13", "I15"],
+    "diabetes": ["E10", "E11", "E12", "E13", "E14"],
+    "asma": ["J45", "J46"],
+}
+# demais diagnósticos (inclusive ausentes ou inválidos): último grupo do tensor
+OUTRAS = "outras"
+
+_memo = {}
+_lock = threading.Lock()
+
+
+def indice_cid3(valores):
+    """
+    Posição de cada CID na tabela de consulta: letra × 100 + dois dígitos (0 a 2599).
+
+    Parâmetros:
+    - valores (array): códigos CID-10 como texto ('I10', 'I219'...); só os 3
+      primeiros caracteres são usados
+
+    Retorna:
+    - np.ndarray int32; códigos ausentes ou inválidos viram -1
+    """
+    valores = np.asarray(valores, dtype=object)
+    valores = np.where(pd.isna(valores), "", valores)
+    bytes_ = np.char.upper(valores.astype("S3")).astype("S3")
+    caracteres = bytes_.view(np.uint8).reshape(len(bytes_), 3).astype(np.int32)
+    letra = caracteres[:, 0] - ord("A")
+    digitos = caracteres[:, 1:] - ord("0")
+    validos = (letra >= 0) & (letra < 26) & ((digitos >= 0) & (digitos <= 9)).all(axis=1)
+    return np.where(validos, letra * 100 + digitos[:, 0] * 10 + digitos[:, 1], -1).astype(np.int32)
+
+
+def tabela_grupos(grupos=GRUPOS_CID):
+    """
+    Tabela de consulta CID-3 -> número do grupo (na ordem de `grupos`).
+
+    Retorna:
+    - np.ndarray int8 com 2600 posições; CIDs fora dos grupos apontam para o
+      grupo 'outras' (número len(grupos))
+    """
+    tabela = np.full(26 * 100, len(grupos), dtype=np.int8)
+    for numero, cids in enumerate(grupos.values()):
+        tabela[indice_cid3(cids)] = numero
+    return tabela
+
+
+def grupos_cid(coluna, tabela):
+    """Número do grupo de cada diagnóstico da coluna (category: consulta só as categorias)."""
+    outras = tabela.max() if len(tabela) else 0
+    if isinstance(coluna.dtype, pd.CategoricalDtype):
+        indices = indice_cid3(coluna.cat.categories.to_numpy(dtype=object))
+        por_categoria = np.where(indices >= 0, tabela[np.maximum(indices, 0)], outras)
+        codigos = coluna.cat.codes.to_numpy()
+        return np.where(codigos >= 0, por_categoria[codigos], outras).astype(np.int64)
+    indices = indice_cid3(coluna.to_numpy(dtype=object))
+    return np.where(indices >= 0, tabela[np.maximum(indices, 0)], outras).astype(np.int64)
+
+
+class TensorSIH:
+    """
+    Internações por município × mês × grupo de CID-3 de uma UF/ano.
+
+    Parâmetros:
+    - codigos (array int32): município de residência ('cod_mun_ibge_6') de cada linha
+    - meses (tuple): meses do segundo eixo
+    - grupos (tuple): grupos do terceiro eixo (os de `GRUPOS_CID` e, por último, 'outras')
+    - contagens (array int64): tensor (municípios, meses, grupos)
+    """
+
+    def __init__(self, codigos, meses, grupos, contagens):
+        self.codigos = np.asarray(codigos, dtype=np.int32)
+        self.meses = tuple(meses)
+        self.grupos = tuple(grupos)
+        self.contagens = contagens
+
+    def _fatia(self, meses=None):
+        if meses is None:
+            return self.contagens.sum(axis=1)
+        faltando = [m for m in meses if m not in self.meses]
+        if faltando:
+            raise KeyError(f"Meses fora do tensor: {faltando}")
+        return self.contagens[:, [self.meses.index(m) for m in meses], :].sum(axis=1)
+
+    def por_grupo(self, meses=None):
+        """
+        Internações por município e grupo, somadas nos meses pedidos (None = todos).
+
+        Retorna:
+        - DataFrame indexado por 'cod_mun_ibge_6' com uma coluna por grupo
+        """
+        return pd.DataFrame(
+            self._fatia(meses), index=pd.Index(self.codigos, name="cod_mun_ibge_6"), columns=list(self.grupos)
+        )
+
+    def contar(self, meses=None, grupos=None):
+        """
+        Internações por município nos meses e grupos pedidos (None = todos).
+
+        Retorna:
+        - Series int64 indexada por 'cod_mun_ibge_6'
+        """
+        grupos = list(self.grupos) if grupos is None else list(grupos)
+        return self.por_grupo(meses)[grupos].sum(axis=1)
+
+
+def _ler_meses(uf, ano, meses):
+    """
+    Lê os arquivos mensais pedidos de uma UF/ano.
+
+    Retorna:
+    - (códigos dos municípios, tensor municípios × meses × grupos), ou None se
+      nenhum arquivo foi encontrado
+    """
+    tabela = tabela_grupos()
+    n_grupos = len(GRUPOS_CID) + 1
+    codigos_lotes, meses_lotes, parciais = [], [], []
+    for posicao_mes, mes in enumerate(meses):
+        arquivos = obter_arquivos("SIH", "RD", uf, ano, mes)
+        if not arquivos:
+            print(f"⚠️ Nenhum arquivo SIH encontrado para {uf}/{ano}/{mes:02d}")
+            continue
+        for lote in iterar_lotes(arquivos, COLUNAS_SIH, dicionario=COLUNAS_SIH):
+            posicoes, codigos = pd.factorize(codigo_6(lote["MUNIC_RES"]))
+            grupos = grupos_cid(lote["DIAG_PRINC"], tabela)
+            parcial = np.bincount(posicoes * n_grupos + grupos, minlength=len(codigos) * n_grupos)
+            codigos_lotes.append(codigos)
+            meses_lotes.append(np.full(len(codigos), posicao_mes))
+            parciais.append(parcial.reshape(len(codigos), n_grupos))
+    if not parciais:
+        return None
+
+    # soma as contagens parciais no município atual (sucessor), descartando códigos inválidos
+    codigos = obter_indice().sucessor(np.concatenate(codigos_lotes))
+    municipios, linhas = np.unique(codigos, return_inverse=True)
+    contagens = np.zeros((len(municipios), len(meses), n_grupos), dtype=np.int64)
+    np.add.at(contagens, (linhas, np.concatenate(meses_lotes)), np.concatenate(parciais))
+    validos = municipios >= 0
+    return municipios[validos], contagens[validos]
+
+
+def _acrescentar_meses(anterior, meses, codigos, contagens):
+    """
+    Junta ao tensor anterior os meses recém-lidos, no eixo dos meses.
+
+    Os municípios são alinhados pela união dos códigos; quem não aparece em
+    uma das partes fica com zero nos meses dela.
+    """
+    todos_codigos = np.union1d(anterior.codigos, codigos).astype(np.int32)
+    todos_meses = tuple(sorted(anterior.meses + tuple(meses)))
+    juntas = np.zeros((len(todos_codigos), len(todos_meses), len(anterior.grupos)), dtype=np.int64)
+    for parte_codigos, parte_meses, parte in ((anterior.codigos, anterior.meses, anterior.contagens),
+                                              (codigos, meses, contagens)):
+        linhas = np.searchsorted(todos_codigos, parte_codigos)
+        colunas = [todos_meses.index(m) for m in parte_meses]
+        juntas[linhas[:, None], colunas] = parte
+    return TensorSIH(todos_codigos, todos_meses, anterior.grupos, juntas)
+
+
+def agregar_sih(uf, ano, meses=None):
+    """
+    Lê o SIH RD de uma UF/ano e devolve o tensor de internações.
+
+    O mês de cada registro é o do arquivo (competência). O resultado é
+    memorizado no processo: um pedido com meses já agregados não relê nada, e
+    um pedido com meses novos lê só esses meses e os acrescenta ao tensor
+    memorizado.
+
+    Parâmetros:
+    - uf (str), ano (int): célula lida
+    - meses (list ou None): meses lidos (None = o ano inteiro)
+
+    Retorna:
+    - TensorSIH, ou None se nenhum arquivo foi encontrado
+    """
+    meses = MESES if not meses else tuple(sorted(set(int(m) for m in meses)))
+    chave = (uf, int(ano))
+    with _lock:
+        anterior = _memo.get(chave)
+    if anterior is not None:
+        meses = tuple(m for m in meses if m not in anterior.meses)
+        if not meses:
+            return anterior
+
+    lidos = _ler_meses(uf, ano, meses)
+    if anterior is None:
+        if lidos is None:
+            return None
+        tensor = TensorSIH(lidos[0], meses, (*GRUPOS_CID, OUTRAS), lidos[1])
+    else:
+        if lidos is None:
+            # meses sem arquivo entram zerados, como na leitura do ano inteiro
+            lidos = (np.empty(0, dtype=np.int32), np.zeros((0, len(meses), len(anterior.grupos)), dtype=np.int64))
+        tensor = _acrescentar_meses(anterior, meses, *lidos)
+
+    with _lock:
+        _memo[chave] = tensor
+    return tensor
+
+
+def arquivos_sih(uf, ano, meses=None):
+    """Chaves do cache lidas por `agregar_sih` (meses None = o ano inteiro)."""
+    return [chave_download("SIH", "RD", uf, ano, m) for m in (meses or MESES)]
+
+
+def limpar_memo():
+    """Descarta os tensores memorizados (ex: após invalidar o cache)."""
+    with _lock:
+        _memo.clear()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de agregação do SIM.
+
+Lê o arquivo CID10 de cada UF/ano uma única vez, em lotes e apenas com
+CODMUNRES, IDADE e CAUSABAS, e calcula em uma só passada vetorizada todos os
+contadores por município usados pelos indicadores de TMI e de causas mal
+definidas. IDADE e CAUSABAS são lidas com dicionário: as condições de cada
+contador são avaliadas só nas categorias distintas do lote.
+
+Um novo indicador baseado no SIM entra como mais um item de `CONTADORES_SIM`
+(e, se precisar de outra coluna, em `COLUNAS_SIM`), sem outra leitura do arquivo.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.cache_datasus import chave_download, obter_arquivos
+from utils.leitura import contar_por_municipio
+from utils.paralelo import executar_grade
+
+COLUNAS_SIM = ["CODMUNRES", "IDADE", "CAUSABAS"]
+
+
+def por_categoria(coluna, condicao):
+    """
+    Avalia `condicao` só nas categorias de uma coluna category e expande para as linhas.
+
+    Parâmetros:
+    - coluna (Series): coluna do lote (category, se lida com dicionário)
+    - condicao (callable): Series -> máscara booleana; nulos contam como False
+
+    Retorna:
+    - np.ndarray booleano com uma posição por linha
+    """
+    if isinstance(coluna.dtype, pd.CategoricalDtype):
+        categorias = np.asarray(condicao(pd.Series(coluna.cat.categories)), dtype=bool)
+        codigos = coluna.cat.codes.to_numpy()
+        return np.where(codigos >= 0, categorias[np.maximum(codigos, 0)], False)
+    return np.asarray(condicao(coluna), dtype=bool) & coluna.notna().to_numpy()
+
+
+# total de óbitos, óbitos infantis (IDADE < 401: menos de 1 ano) e por causas
+# mal definidas (CAUSABAS no capítulo R do CID-10)
+CONTADORES_SIM = {
+    "total_obitos": None,
+    "obitos_infantis": lambda d: por_categoria(d["IDADE"], lambda v: pd.to_numeric(v, errors="coerce") < 401),
+    "obitos_mal_definidas": lambda d: por_categoria(d["CAUSABAS"], lambda v: v.astype(str).str.startswith("R")),
+}
+
+_memo = {}
+_lock = threading.Lock()
+
+
+def agregar_sim(uf, ano):
+    """
+    Retorna os contadores do SIM por município para uma UF/ano.
+
+    O resultado é memorizado no processo: TMI e causas mal definidas da mesma
+    UF/ano compartilham a mesma leitura.
+
+    Retorna:
+    - DataFrame indexado por 'cod_mun_ibge_6' com uma coluna por contador de
+      `CONTADORES_SIM` ('total_obitos', 'obitos_infantis', 'obitos_mal_definidas')
+    """
+    chave = (uf, int(ano))
+    with _lock:
+        if chave in _memo:
+            return _memo[chave]
+
+    arquivos = obter_arquivos("SIM", "CID10", uf, ano)
+    if not arquivos:
+        raise FileNotFoundError(f"Nenhum arquivo SIM encontrado para {uf}/{ano}")
+    agregado = contar_por_municipio(
+        arquivos, "CODMUNRES", CONTADORES_SIM, colunas=COLUNAS_SIM, dicionario=COLUNAS_SIM
+    )
+
+    with _lock:
+        _memo[chave] = agregado
+    return agregado
+
+
+def _arquivos_uf_ano(uf, ano):
+    return [chave_download("SIM", "CID10", uf, ano)]
+
+
+def agregar_sim_varios(ufs, anos, workers=1):
+    """
+    Agrega o SIM de todas as combinações UF/ano.
+
+    Como em `utils.sinasc.agregar_sinasc_varios`, os módulos chamam esta
+    função antes de distribuir a grade e repassam o dict às células.
+
+    Parâmetros:
+    - ufs (list): siglas das UFs
+    - anos (list): anos de referência
+    - workers (int): número de processos (1 = sequencial)
+
+    Retorna:
+    - dict (uf, ano) -> DataFrame de `agregar_sim`, para ser repassado aos
+      módulos de indicadores pelo argumento `agregados_sim`; as UF/anos que
+      falharam ficam de fora
+    """
+    return agregar_sim_celulas([(uf, ano) for uf in ufs for ano in anos], workers=workers)
+
+
+def agregar_sim_celulas(celulas, workers=1):
+    """
+    Como `agregar_sim_varios`, mas para uma lista qualquer de células (uf, ano).
+
+    Usado na reconstrução incremental, em que só algumas UF/anos mudaram.
+    """
+    celulas = list(dict.fromkeys((uf, int(ano)) for uf, ano in celulas))
+    with _lock:
+        pendentes = [c for c in celulas if c not in _memo]
+
+    resultados = executar_grade(agregar_sim, pendentes, workers=workers, downloads=_arquivos_uf_ano)
+    with _lock:
+        for celula, agregado in zip(pendentes, resultados):
+            if agregado is not None:
+                _memo[celula] = agregado
+        return {c: _memo[c] for c in celulas if c in _memo}
+
+
+def obter_agregado_sim(uf, ano, agregados_sim=None):
+    """Usa o agregado já calculado, se fornecido; senão agrega a UF/ano."""
+    if agregados_sim is not None and (uf, int(ano)) in agregados_sim:
+        return agregados_sim[(uf, int(ano))]
+    return agregar_sim(uf, ano)
+
+
+def limpar_memo():
+    """Descarta os agregados memorizados (ex: após invalidar o cache)."""
+    with _lock:
+        _memo.clear()
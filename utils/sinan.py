@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de agregação do SINAN.
+
+O SINAN é distribuído em um arquivo nacional por agravo e ano (no cache, com
+UF 'BR'). Cada arquivo é lido uma única vez, em lotes e apenas com
+ID_MUNICIP, e contado por município do país inteiro. A divisão entre as UFs
+pedidas é uma partição vetorizada pelo prefixo numérico do código
+(`utils.municipios.codigo_uf`), sem nova leitura e sem comparar texto.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.cache_datasus import chave_download, obter_arquivos
+from utils.leitura import contar_por_municipio
+from utils.municipios import CODIGOS_UF, codigo_uf
+from utils.paralelo import executar_grade
+
+# código do agravo no SINAN -> nome usado nas colunas dos indicadores
+AGRAVOS = {
+    "DENG": "dengue",
+    "CHIK": "chikungunya",
+    "ZIKA": "zika",
+}
+
+_memo = {}
+_lock = threading.Lock()
+
+
+def nome_agravo(agravo):
+    """Nome do agravo nas colunas (ex: 'DENG' -> 'dengue'); códigos sem nome viram minúsculas."""
+    return AGRAVOS.get(agravo, agravo.lower())
+
+
+def agregar_sinan(agravo, ano):
+    """
+    Retorna as notificações do agravo por município do país inteiro.
+
+    O resultado é memorizado no processo: todas as UFs do mesmo agravo/ano
+    compartilham a mesma leitura do arquivo nacional.
+
+    Retorna:
+    - Series int64 'notificacoes' indexada por 'cod_mun_ibge_6'
+    """
+    chave = (agravo, int(ano))
+    with _lock:
+        if chave in _memo:
+            return _memo[chave]
+
+    arquivos = obter_arquivos("SINAN", agravo, "BR", ano)
+    if not arquivos:
+        raise FileNotFoundError(f"Nenhum arquivo SINAN encontrado para {agravo}/{ano}")
+    notificacoes = contar_por_municipio(arquivos, "ID_MUNICIP", {"notificacoes": None})["notificacoes"]
+
+    with _lock:
+        _memo[chave] = notificacoes
+    return notificacoes
+
+
+def particionar_ufs(notificacoes, ufs):
+    """
+    Divide as notificações nacionais entre as UFs, em uma única passada pelo prefixo do código.
+
+    Retorna:
+    - dict UF -> Series das notificações dos municípios da UF (vazia se não houver)
+    """
+    posicoes = pd.Series(np.arange(len(notificacoes))).groupby(codigo_uf(notificacoes.index.to_numpy())).indices
+    vazio = np.array([], dtype=np.int64)
+    return {uf: notificacoes.iloc[posicoes.get(CODIGOS_UF[uf], vazio)] for uf in ufs}
+
+
+def _arquivos_agravo_ano(agravo, ano):
+    return [chave_download("SINAN", agravo, "BR", ano)]
+
+
+def agregar_sinan_varios(agravos, anos, workers=1):
+    """
+    Agrega o SINAN de todas as combinações agravo/ano.
+
+    Como em `utils.sinasc.agregar_sinasc_varios`, os módulos chamam esta
+    função antes de distribuir a grade e repassam o dict às células.
+
+    Parâmetros:
+    - agravos (list): códigos dos agravos (ex: ['DENG', 'CHIK', 'ZIKA'])
+    - anos (list): anos de referência
+    - workers (int): número de processos (1 = sequencial)
+
+    Retorna:
+    - dict (agravo, ano) -> Series de `agregar_sinan`; os agravos/anos que
+      falharam ficam de fora
+    """
+    celulas = list(dict.fromkeys((agravo, int(ano)) for agravo in agravos for ano in anos))
+    with _lock:
+        pendentes = [c for c in celulas if c not in _memo]
+
+    resultados = executar_grade(agregar_sinan, pendentes, workers=workers, downloads=_arquivos_agravo_ano)
+    with _lock:
+        for celula, notificacoes in zip(pendentes, resultados):
+            if notificacoes is not None:
+                _memo[celula] = notificacoes
+        return {c: _memo[c] for c in celulas if c in _memo}
+
+
+def limpar_memo():
+    """Descarta os agregados memorizados (ex: após invalidar o cache)."""
+    with _lock:
+        _memo.clear()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Motor de agregação do SINASC.
+
+Lê o arquivo DN de cada UF/ano uma única vez, em lotes e apenas com as colunas
+necessárias, e calcula em uma só passada vetorizada todos os contadores por
+município usados pelos indicadores de TMI, pré-natal e partos cesáreos.
+"""
+import threading
+
+from utils.cache_datasus import chave_download, obter_arquivos
+from utils.leitura import contar_por_municipio
+from utils.paralelo import executar_grade
+
+COLUNAS_SINASC = ["CODMUNRES", "CONSULTAS", "PARTO"]
+
+# nascimentos, pré-natal 7+ (CONSULTAS=='4') e cesáreos (PARTO=='2')
+CONTADORES_SINASC = {
+    "nascidos_vivos": None,
+    "prenatal_7mais": lambda d: d["CONSULTAS"].astype(str) == "4",
+    "partos_cesareos": lambda d: d["PARTO"].astype(str) == "2",
+}
+
+_memo = {}
+_lock = threading.Lock()
+
+
+def agregar_sinasc(uf, ano):
+    """
+    Retorna os contadores do SINASC por município para uma UF/ano.
+
+    O resultado é memorizado no processo: TMI, pré-natal e cesáreos da mesma
+    UF/ano compartilham a mesma leitura.
+
+    Retorna:
+    - DataFrame indexado por 'cod_mun_ibge_6' com as colunas
+      ['nascidos_vivos', 'prenatal_7mais', 'partos_cesareos']
+    """
+    chave = (uf, int(ano))
+    with _lock:
+        if chave in _memo:
+            return _memo[chave]
+
+    agregado = contar_por_municipio(
+        obter_arquivos("SINASC", "DN", uf, ano), "CODMUNRES", CONTADORES_SINASC, colunas=COLUNAS_SINASC
+    )
+
+    with _lock:
+        _memo[chave] = agregado
+    return agregado
+
+
+def _arquivos_uf_ano(uf, ano):
+    return [chave_download("SINASC", "DN", uf, ano)]
+
+
+def agregar_sinasc_varios(ufs, anos, workers=1):
+    """
+    Agrega o SINASC de todas as combinações UF/ano.
+
+    Com workers > 1 a agregação roda em um pool de processos e os resultados
+    voltam para este processo (o memo dos processos filhos se perde quando o
+    pool termina). Por isso os módulos chamam esta função antes de distribuir
+    a grade e repassam o dict às células.
+
+    Parâmetros:
+    - ufs (list): siglas das UFs
+    - anos (list): anos de referência
+    - workers (int): número de processos (1 = sequencial)
+
+    Retorna:
+    - dict (uf, ano) -> DataFrame de `agregar_sinasc`, para ser repassado aos
+      módulos de indicadores pelo argumento `agregados_sinasc`; as UF/anos que
+      falharam ficam de fora
+    """
+    return agregar_sinasc_celulas([(uf, ano) for uf in ufs for ano in anos], workers=workers)
+
+
+def agregar_sinasc_celulas(celulas, workers=1):
+    """
+    Como `agregar_sinasc_varios`, mas para uma lista qualquer de células (uf, ano).
+
+    Usado na reconstrução incremental, em que só algumas UF/anos mudaram.
+    """
+    celulas = list(dict.fromkeys((uf, int(ano)) for uf, ano in celulas))
+    with _lock:
+        pendentes = [c for c in celulas if c not in _memo]
+
+    resultados = executar_grade(agregar_sinasc, pendentes, workers=workers, downloads=_arquivos_uf_ano)
+    with _lock:
+        for celula, agregado in zip(pendentes, resultados):
+            if agregado is not None:
+                _memo[celula] = agregado
+        return {c: _memo[c] for c in celulas if c in _memo}
+
+
+def obter_agregado_sinasc(uf, ano, agregados_sinasc=None):
+    """Usa o agregado já calculado, se fornecido; senão agrega a UF/ano."""
+    if agregados_sinasc is not None and (uf, int(ano)) in agregados_sinasc:
+        return agregados_sinasc[(uf, int(ano))]
+    return agregar_sinasc(uf, ano)
+
+
+def limpar_memo():
+    """Descarta os agregados memorizados (ex: após invalidar o cache)."""
+    with _lock:
+        _memo.clear()
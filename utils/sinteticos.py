@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Microdados sintéticos no formato do DATASUS, para benchmarks e testes sem rede.
+
+`FonteSintetica` é uma função de download (mesma assinatura de `baixar_pysus`)
+que, em vez de baixar, gera um parquet com o esquema do sistema pedido:
+
+- SIM (CID10): CODMUNRES, IDADE (código de 3 dígitos, unidade + valor), CAUSABAS, ...
+- SINASC (DN): CODMUNRES, CONSULTAS, PARTO, ...
+- SIH (RD): MUNIC_RES, DIAG_PRINC, ANO_CMPT, MES_CMPT, ...
+- CNES (PF): CODUFMUN, CBO, CPFUNICO, ...
+- SINAN (agravo, arquivo nacional 'BR'): ID_MUNICIP, DT_NOTIFIC, ...
+
+Todas as colunas são texto, como nos arquivos do pysus. O volume de cada
+arquivo é o volume nacional aproximado de `VOLUMES_BRASIL` vezes a fração da
+população na UF, vezes `escala`. Os municípios são sorteados com peso pela
+população. O gerador é determinístico: a mesma chave (sistema, grupo, UF, ano,
+mês) e a mesma semente geram sempre o mesmo arquivo.
+
+Uso:
+    cache = CacheDATASUS(diretorio, baixar=FonteSintetica(pasta_fonte, escala=0.1))
+    definir_cache(cache)
+"""
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from utils.municipios import CODIGOS_UF, codigo_6, obter_indice
+
+# registros por arquivo no Brasil inteiro (SIH e CNES: por mês; os demais: por ano)
+VOLUMES_BRASIL = {
+    "SIM": 1_500_000,
+    "SINASC": 2_600_000,
+    "SIH": 1_000_000,
+    "CNES": 2_000_000,
+    "SINAN": 1_500_000,
+}
+LINHAS_POR_GRUPO = 500_000
+
+
+def _texto(rng, valores, n, p=None):
+    """Coluna de texto sorteada de `valores` (codificada por dicionário e convertida em string)."""
+    valores = pa.array([str(v) for v in valores], type=pa.string())
+    indices = rng.choice(len(valores), size=n, p=p).astype(np.int32)
+    return pa.DictionaryArray.from_arrays(pa.array(indices), valores).cast(pa.string())
+
+
+def _digitos(rng, n, largura, maximo=None):
+    """Coluna de texto com inteiros aleatórios completados com zeros à esquerda."""
+    numeros = rng.integers(0, maximo or 10 ** largura, size=n)
+    return pc.utf8_lpad(pa.array(numeros).cast(pa.string()), width=largura, padding="0")
+
+
+def _datas(rng, n, ano, mes=None):
+    """Datas DDMMAAAA do ano (ou do mês)."""
+    dia = rng.integers(1, 29, size=n)
+    meses = np.full(n, mes) if mes else rng.integers(1, 13, size=n)
+    return pc.utf8_lpad(pa.array(dia * 1_000_000 + meses * 10_000 + ano).cast(pa.string()), width=8, padding="0")
+
+
+def _cids(rng, tamanho=2000):
+    """Catálogo de códigos CID-10 de 4 caracteres (ex: 'I219'), sorteado uma vez por arquivo."""
+    letras = np.array(list("ABCDEFGHIJKLMNOPQRSTVWXYZ"))
+    codigos = np.char.add(rng.choice(letras, tamanho), np.char.zfill(rng.integers(0, 1000, tamanho).astype(str), 3))
+    # garante os grupos usados pelos indicadores (crônicas e mal definidas)
+    fixos = ["I10", "I110", "I219", "I64", "E119", "E149", "J440", "J45", "N189", "R99", "R54", "R688"]
+    return np.concatenate([fixos, codigos])
+
+
+class FonteSintetica:
+    """
+    Gerador de arquivos sintéticos do DATASUS, usado como `baixar` do CacheDATASUS.
+
+    Parâmetros:
+    - diretorio (str ou Path): onde os parquets gerados são escritos
+    - escala (float): fração do volume real (1.0 = volume aproximado do DATASUS)
+    - semente (int): semente global
+    - arquivo_populacao (str ou None): CSV de população (cod_mun_ibge_6, UF,
+      populacao) usado nos pesos; None = municípios ativos com peso igual
+    """
+
+    def __init__(self, diretorio, escala=1.0, semente=0, arquivo_populacao=None):
+        self.diretorio = Path(diretorio)
+        self.escala = escala
+        self.semente = semente
+        if arquivo_populacao is not None:
+            pop = pd.read_csv(arquivo_populacao, sep=';', dtype={'cod_mun_ibge_6': str}, encoding='utf-8-sig')
+            codigos = codigo_6(pop['cod_mun_ibge_6'])
+            pesos = pd.to_numeric(pop['populacao'], errors='coerce').fillna(0).to_numpy(dtype=float)
+        else:
+            indice = obter_indice()
+            ativos = (indice.anos_extincao == 0) & (indice.codigos % 10_000 != 0)
+            codigos, pesos = indice.codigos[ativos], np.ones(int(ativos.sum()))
+        validos = codigos >= 0
+        self.codigos, self.pesos = codigos[validos], pesos[validos]
+        self._ufs = self.codigos // 10_000
+
+    def _municipios(self, uf):
+        if uf == "BR":
+            mascara = np.ones(len(self.codigos), dtype=bool)
+        else:
+            mascara = self._ufs == CODIGOS_UF[uf]
+        pesos = self.pesos[mascara]
+        return self.codigos[mascara], pesos / pesos.sum(), pesos.sum() / self.pesos.sum()
+
+    def linhas(self, sistema, uf):
+        """Número de registros gerados para um arquivo do sistema na UF."""
+        _, _, fracao = self._municipios(uf)
+        return max(1, int(round(VOLUMES_BRASIL[sistema] * fracao * self.escala)))
+
+    def _gerar(self, rng, sistema, ano, mes, municipios, pesos, n):
+        codigo_municipio = _texto(rng, municipios, n, pesos)
+        if sistema == "SIM":
+            # ~2,5% de óbitos infantis: unidades 0 (min), 1 (h), 2 (dias) e 3 (meses)
+            infantil = rng.random(n) < 0.025
+            unidade = np.where(infantil, rng.integers(0, 4, n), np.where(rng.random(n) < 0.01, 5, 4))
+            idade = unidade * 100 + np.where(unidade == 4, rng.integers(1, 100, n), rng.integers(0, 24, n))
+            cids = _cids(rng)
+            p = np.full(len(cids), 0.94 / (len(cids) - 3))
+            p[-3:] = 0.02  # R99, R54, R688: ~6% de causas mal definidas
+            p = p / p.sum()
+            return {
+                "CODMUNRES": codigo_municipio,
+                "CODMUNOCOR": codigo_municipio,
+                "DTOBITO": _datas(rng, n, ano),
+                "IDADE": pc.utf8_lpad(pa.array(idade).cast(pa.string()), width=3, padding="0"),
+                "SEXO": _texto(rng, ["1", "2", "0"], n, [0.55, 0.449, 0.001]),
+                "RACACOR": _texto(rng, ["1", "2", "3", "4", "5"], n),
+                "LOCOCOR": _texto(rng, ["1", "2", "3", "4", "5", "9"], n),
+                "CAUSABAS": _texto(rng, cids, n, p),
+            }
+        if sistema == "SINASC":
+            return {
+                "CODMUNRES": codigo_municipio,
+                "CODMUNNASC": codigo_municipio,
+                "DTNASC": _datas(rng, n, ano),
+                "SEXO": _texto(rng, ["1", "2"], n),
+                "PESO": _digitos(rng, n, 4, 5000),
+                "IDADEMAE": _digitos(rng, n, 2, 50),
+                "GESTACAO": _texto(rng, ["1", "2", "3", "4", "5", "6", "9"], n),
+                "CONSULTAS": _texto(rng, ["1", "2", "3", "4", "9"], n, [0.02, 0.08, 0.25, 0.63, 0.02]),
+                "PARTO": _texto(rng, ["1", "2", "9"], n, [0.43, 0.56, 0.01]),
+            }
+        if sistema == "SIH":
+            return {
+                "MUNIC_RES": codigo_municipio,
+                "ANO_CMPT": pa.array(np.full(n, str(ano))),
+                "MES_CMPT": pa.array(np.full(n, f"{mes or 1:02d}")),
+                "DIAG_PRINC": _texto(rng, _cids(rng), n),
+                "PROC_REA": _digitos(rng, n, 10),
+                "IDADE": _digitos(rng, n, 2, 100),
+                "SEXO": _texto(rng, ["1", "3"], n),
+                "DIAS_PERM": _digitos(rng, n, 2, 30),
+                "VAL_TOT": pa.array(rng.gamma(2.0, 600.0, n).round(2).astype(str)),
+            }
+        if sistema == "CNES":
+            # cada profissional aparece em ~2 vínculos; ~15% dos vínculos são de médicos (CBO 225xxx)
+            cbos = ["225125", "225142", "225170", "225250", "322205", "223505", "515105", "251510", "223208"]
+            p = np.array([0.05, 0.04, 0.03, 0.03, 0.35, 0.15, 0.2, 0.08, 0.07])
+            return {
+                "CNES": _digitos(rng, n, 7),
+                "CODUFMUN": codigo_municipio,
+                "COMPETEN": pa.array(np.full(n, f"{ano}{mes or 1:02d}")),
+                "CBO": _texto(rng, cbos, n, p / p.sum()),
+                "CPFUNICO": _digitos(rng, n, 11, max(2, n // 2)),
+                "HORAOUTR": _digitos(rng, n, 2, 40),
+                "HORAHOSP": _digitos(rng, n, 2, 40),
+                "HORA_AMB": _digitos(rng, n, 2, 40),
+            }
+        if sistema == "SINAN":
+            return {
+                "ID_MUNICIP": codigo_municipio,
+                "DT_NOTIFIC": _datas(rng, n, ano),
+                "NU_ANO": pa.array(np.full(n, str(ano))),
+                "SG_UF_NOT": pc.utf8_slice_codeunits(codigo_municipio, 0, 2),
+                "CS_SEXO": _texto(rng, ["M", "F", "I"], n, [0.47, 0.52, 0.01]),
+                "CLASSI_FIN": _texto(rng, ["10", "11", "12", "5", "8"], n),
+            }
+        raise ValueError(f"Sistema sem gerador sintético: {sistema}")
+
+    def __call__(self, sistema, grupo, uf, ano, mes=None):
+        """Gera o arquivo da chave e devolve [caminho] (assinatura de `baixar_pysus`)."""
+        chave = [self.semente, int(ano), int(mes or 0), zlib.crc32(f"{sistema}/{grupo}/{uf}".encode())]
+        rng = np.random.default_rng(np.random.SeedSequence(chave))
+        municipios, pesos, _ = self._municipios(uf)
+        total = self.linhas(sistema, uf)
+
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        destino = self.diretorio / f"{sistema}_{grupo}_{uf}_{ano}{'' if mes is None else f'_{int(mes):02d}'}.parquet"
+        tmp = destino.with_suffix(f".{rng.integers(1 << 62)}.tmp")
+        escritor = None
+        try:
+            for inicio in range(0, total, LINHAS_POR_GRUPO):
+                n = min(LINHAS_POR_GRUPO, total - inicio)
+                # municípios em texto de 6 dígitos, como nos arquivos do pysus
+                colunas = self._gerar(rng, sistema, int(ano), mes, municipios.astype(str), pesos, n)
+                tabela = pa.table(colunas)
+                if escritor is None:
+                    escritor = pq.ParquetWriter(tmp, tabela.schema)
+                escritor.write_table(tabela)
+        finally:
+            if escritor is not None:
+                escritor.close()
+        tmp.replace(destino)
+        return [destino]
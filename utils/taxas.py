@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Cálculo vetorizado de taxas e proporções.
+
+Todos os indicadores são do tipo numerador / denominador × escala (TMI por mil
+nascidos vivos, proporções em %, taxas por 10 mil ou 100 mil habitantes).
+`calcular_taxa` faz essa conta de uma vez para todos os municípios, trata
+explicitamente o denominador zero e, se pedido, devolve o intervalo de confiança.
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+INTERVALOS = ("wilson", "poisson")
+
+
+def _como_array(valores):
+    return np.asarray(valores, dtype=float)
+
+
+def _intervalo_wilson(x, n, z):
+    """Intervalo de Wilson para a proporção x/n (numerador contido no denominador)."""
+    p = x / n
+    z2 = z * z
+    denom = 1 + z2 / n
+    centro = (p + z2 / (2 * n)) / denom
+    margem = z * np.sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / denom
+    return np.clip(centro - margem, 0, 1), np.clip(centro + margem, 0, 1)
+
+
+def _intervalo_poisson(x, n, z):
+    """Intervalo para a taxa x/n com x ~ Poisson (aproximação de Byar)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inferior = np.where(
+            x > 0, x * (1 - 1 / (9 * x) - z / (3 * np.sqrt(x))) ** 3, 0.0
+        )
+    superior = (x + 1) * (1 - 1 / (9 * (x + 1)) + z / (3 * np.sqrt(x + 1))) ** 3
+    return inferior / n, superior / n
+
+
+def calcular_taxa(numerador, denominador, escala=1, valor_se_zero=0.0, intervalo=None, confianca=0.95):
+    """
+    Calcula numerador / denominador × escala para todos os elementos de uma vez.
+
+    Parâmetros:
+    - numerador (Series ou array): contagens (ex: óbitos infantis)
+    - denominador (Series ou array): base (ex: nascidos vivos, população)
+    - escala (float): multiplicador (100 para %, 1000, 10000, 100000...)
+    - valor_se_zero (float): resultado quando o denominador é zero ou ausente
+      (0 por padrão, como nos indicadores; use np.nan para deixar indefinido)
+    - intervalo (str ou None): 'wilson' para proporções (numerador ⊂ denominador),
+      'poisson' para taxas de eventos raros; None não calcula intervalo
+    - confianca (float): nível de confiança do intervalo
+
+    Retorna:
+    - a taxa, como Series (com o índice do numerador) se o numerador for Series,
+      senão como array
+    - com `intervalo`, a tupla (taxa, inferior, superior); os limites ficam NaN
+      onde o denominador é zero
+    """
+    indice = numerador.index if isinstance(numerador, pd.Series) else None
+    x = _como_array(numerador)
+    n = _como_array(denominador)
+
+    validos = np.isfinite(n) & (n > 0)
+    taxa = np.full(x.shape, valor_se_zero, dtype=float)
+    np.divide(x, n, out=taxa, where=validos)
+    taxa[validos] *= escala
+
+    def _saida(valores):
+        return pd.Series(valores, index=indice) if indice is not None else valores
+
+    if intervalo is None:
+        return _saida(taxa)
+    if intervalo not in INTERVALOS:
+        raise ValueError(f"Intervalo desconhecido: {intervalo} (use {', '.join(INTERVALOS)})")
+
+    z = NormalDist().inv_cdf(1 - (1 - confianca) / 2)
+    inferior = np.full(x.shape, np.nan)
+    superior = np.full(x.shape, np.nan)
+    calcular = _intervalo_wilson if intervalo == "wilson" else _intervalo_poisson
+    li, ls = calcular(x[validos], n[validos], z)
+    inferior[validos] = li * escala
+    superior[validos] = ls * escala
+    return _saida(taxa), _saida(inferior), _saida(superior)